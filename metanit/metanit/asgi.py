@@ -3,6 +3,12 @@ ASGI config for metanit project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Живая панель (/live/events/) работает только под ASGI, поэтому сайт запускается так:
+
+    gunicorn metanit.asgi:application -k uvicorn_worker.UvicornWorker
+
+Число воркеров gunicorn берёт из WEB_CONCURRENCY.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -55,6 +55,28 @@ MIDDLEWARE = [
     'django.middleware.locale.LocaleMiddleware',
 ]
 
+# Замер времени и SQL-запросов по каждому view (Server-Timing, /metrics/)
+REQUEST_METRICS_ENABLED = os.getenv('REQUEST_METRICS_ENABLED', 'False') == 'True'
+# Запросы к БД дольше порога пишутся в лог pupils.sql (мс, 0 - не писать)
+SLOW_QUERY_THRESHOLD_MS = int(os.getenv('SLOW_QUERY_THRESHOLD_MS', 200))
+
+if REQUEST_METRICS_ENABLED:
+    MIDDLEWARE.insert(0, 'pupils.middleware.RequestMetricsMiddleware')
+
+# Профилирование запросов под cProfile по ?_profile (сотрудники), заголовку X-Profile-Token
+# (см. команду profiling_token) или случайной выборке; профили смотрятся в админке
+REQUEST_PROFILING_ENABLED = os.getenv('REQUEST_PROFILING_ENABLED', 'False') == 'True'
+# Доля случайно профилируемых запросов, 0 - только по запросу
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0))
+# Срок действия подписанного заголовка X-Profile-Token, секунды
+PROFILING_TOKEN_MAX_AGE = int(os.getenv('PROFILING_TOKEN_MAX_AGE', 3600))
+# Сколько последних профилей хранить: старые удаляются вместе с файлами .prof, 0 - без ограничения
+PROFILING_MAX_PROFILES = int(os.getenv('PROFILING_MAX_PROFILES', 1000))
+
+if REQUEST_PROFILING_ENABLED:
+    MIDDLEWARE.insert(MIDDLEWARE.index('django.contrib.auth.middleware.AuthenticationMiddleware') + 1,
+                      'pupils.middleware.ProfilingMiddleware')
+
 ROOT_URLCONF = 'metanit.urls'
 
 TEMPLATES = [
@@ -94,6 +116,101 @@ if DATABASE_URL:
         default=DATABASE_URL
     )
 
+# Реплика для отчётных чтений (статистика, экспорт, отчёты, итоги для кухни),
+# см. pupils.routers. Без DATABASE_REPLICA_URL всё читается из default.
+DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+REPORTING_DATABASE = None
+if DATABASE_REPLICA_URL:
+    DATABASES['replica'] = dj_database_url.config(
+        default=DATABASE_REPLICA_URL
+    )
+    REPORTING_DATABASE = 'replica'
+    DATABASE_ROUTERS = ['pupils.routers.ReportingRouter']
+
+
+def _configure_connections(alias, prefix):
+    """CONN_MAX_AGE и пул psycopg для алиаса из переменных {prefix}_CONN_MAX_AGE и {prefix}_POOL.
+
+    Пул (нужен пакет psycopg_pool) работает только с postgresql и несовместим
+    с постоянными соединениями, поэтому при включённом пуле CONN_MAX_AGE = 0.
+    """
+    database = DATABASES[alias]
+    database['CONN_MAX_AGE'] = int(os.getenv(f'{prefix}_CONN_MAX_AGE', 0))
+    database['CONN_HEALTH_CHECKS'] = database['CONN_MAX_AGE'] > 0
+    if os.getenv(f'{prefix}_POOL', 'False') == 'True' and database['ENGINE'] == 'django.db.backends.postgresql':
+        database['CONN_MAX_AGE'] = 0
+        database.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': int(os.getenv(f'{prefix}_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.getenv(f'{prefix}_POOL_MAX_SIZE', 10)),
+        }
+
+
+_configure_connections('default', 'DB')
+if 'replica' in DATABASES:
+    _configure_connections('replica', 'REPLICA')
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# locmem - отдельный кэш на каждый процесс, file - общий для всех воркеров одного сервера.
+# В кэше лежат версии данных, от которых зависят ETag /api/kitchen-totals/ и кэш формы /pool/,
+# поэтому при нескольких воркерах кэш обязан быть общим (проверка pupils.E001)
+
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+# Число процессов веб-сервера (та же переменная, что читает gunicorn; запуск под ASGI - в asgi.py)
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', 1))
+
+if CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'pupils',
+        }
+    }
+
+# Страховочный TTL кэша статистики (секунды); основная инвалидация - по версии данных
+STATISTICS_CACHE_TIMEOUT = int(os.getenv('STATISTICS_CACHE_TIMEOUT', 60))
+# TTL кэша классов и меню для формы /pool/ (секунды)
+POOL_CACHE_TIMEOUT = int(os.getenv('POOL_CACHE_TIMEOUT', 600))
+
+# Фоновые выгрузки в Excel: потоков на процесс и через сколько секунд незавершённая задача считается зависшей
+EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', 2))
+EXPORT_JOB_TIMEOUT = int(os.getenv('EXPORT_JOB_TIMEOUT', 600))
+
+# Отложенная запись /pool/: форма только кладёт проверенную отправку в очередь,
+# а команда drain_submissions применяет её пачками
+POOL_WRITE_BEHIND = os.getenv('POOL_WRITE_BEHIND', 'False') == 'True'
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv('WRITE_BEHIND_BATCH_SIZE', 500))
+
+# Каникулы и праздники, на которые планировщик не создаёт меню: даты ГГГГ-ММ-ДД
+# или диапазоны ГГГГ-ММ-ДД..ГГГГ-ММ-ДД через запятую
+MENU_HOLIDAYS = [value for value in os.getenv('MENU_HOLIDAYS', '').split(',') if value.strip()]
+
+# Logging
+# https://docs.djangoproject.com/en/5.2/topics/logging/
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'pupils': {
+            'handlers': ['console'],
+            'level': os.getenv('PUPILS_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -138,6 +255,10 @@ STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Готовые выгрузки хранятся здесь и отдаются через админку, а не напрямую по MEDIA_URL
+MEDIA_URL = 'media/'
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -15,11 +15,19 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path
+from django.urls import path, re_path
 from pupils import views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('pool/', views.pooling, name='pool'),
+    path('metrics/', views.metrics, name='metrics'),
+    path('api/pupils/', views.pupil_names, name='pupil_names'),
+    path('live/events/', views.live_events, name='live_events'),
+    path('api/kitchen-totals/', views.kitchen_totals, name='kitchen_totals'),
+    path('api/weeks/<str:week>/statistics/', views.week_statistics, name='week_statistics'),
+    path('api/weeks/<str:week>/workbook/', views.week_workbook, name='week_workbook'),
+    re_path(r'^api/snapshots/(?P<sha256>[0-9a-f]{64})(?P<suffix>\.json|\.xlsx)$', views.snapshot_file,
+            name='snapshot_file'),
     path('', views.index, name='index')
 ]
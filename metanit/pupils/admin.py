@@ -1,21 +1,120 @@
-import urllib
-
-from django.shortcuts import render
-import openpyxl
-from openpyxl.styles import Font, Alignment, PatternFill
-from django.http import HttpResponse
+from django.shortcuts import render, redirect, get_object_or_404
 from datetime import datetime, timedelta
-from django.contrib import admin
-from openpyxl.utils import get_column_letter
-
-from .models import Class, Pupil, Dish, DailyMenu, WeeklyBreakfasts
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.core.exceptions import PermissionDenied
+from django.db.models import Case, When, Value
+from django.http import FileResponse, Http404
+from django.urls import reverse
+
+from .cache import cached_weekly_statistics, get_statistics_cache_info
+from .choices import ChoiceError, class_week_grid, parse_class_grid, save_class_week
+from .excel import XLSX_CONTENT_TYPE
+from .menus import SKIP, MenuPlanError, parse_holidays, plan_menus, rotation_from_menus
+from .exports import request_export
+from .models import (Class, Pupil, Dish, DailyMenu, WeeklyBreakfasts, ExportJob, PendingSubmission, RequestProfile,
+                     WeekSnapshot, WEEKDAYS)
+from .paginators import EstimatedCountPaginator
+from .reports import report_context
+from .roster import RosterError, import_roster, read_roster
+from .snapshots import SnapshotError, freeze_week, unfreeze_week
+from .writebehind import requeue_failed
+from .routers import reporting_reads
 
 
 @admin.register(Class)
 class ClassAdmin(admin.ModelAdmin):
-    list_display = ['name', 'number_of_pupils']
+    list_display = ['name', 'number_of_pupils', 'week_grid_link']
     list_filter = ['name']
 
+    def get_urls(self):
+        urls = super().get_urls()
+        from django.urls import path
+        custom_urls = [
+            path('import-roster/', self.admin_site.admin_view(self.import_roster_view),
+                 name='pupils_class_import_roster'),
+            path('<int:class_id>/week/', self.admin_site.admin_view(self.week_grid_view),
+                 name='pupils_class_week_grid'),
+        ]
+        return custom_urls + urls
+
+    def week_grid_link(self, obj):
+        from django.utils.html import format_html
+
+        return format_html('<a href="{}">Ввести выбор</a>', reverse('admin:pupils_class_week_grid', args=[obj.pk]))
+
+    week_grid_link.short_description = 'Выбор на неделю'
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = extra_context or {}
+        extra_context['show_import_roster_link'] = self.has_add_permission(request)
+        return super().changelist_view(request, extra_context=extra_context)
+
+    def import_roster_view(self, request):
+        """Загрузка списка классов и учеников из CSV/XLSX, с пробным запуском"""
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+
+        result = None
+        if request.method == 'POST' and request.FILES.get('roster'):
+            roster = request.FILES['roster']
+            dry_run = bool(request.POST.get('dry_run'))
+            try:
+                result = import_roster(read_roster(roster, roster.name), dry_run=dry_run)
+            except RosterError as e:
+                messages.error(request, str(e))
+            else:
+                if not dry_run:
+                    self.message_user(request, f"Добавлено классов: {len(result['new_classes'])}, "
+                                               f"учеников: {len(result['new_pupils'])}", messages.SUCCESS)
+                    return redirect('admin:pupils_class_changelist')
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Загрузка списка учеников',
+            'opts': self.model._meta,
+            'result': result,
+        }
+        return render(request, 'admin/import_roster.html', context)
+
+    def week_grid_view(self, request, class_id):
+        """Ввод выбора всего класса на неделю одной таблицей, например с бумажного списка"""
+        class_obj = get_object_or_404(Class, pk=class_id)
+        if not self.has_change_permission(request, class_obj):
+            raise PermissionDenied
+
+        today = datetime.now().date()
+        try:
+            day = datetime.strptime(request.GET['week'], '%Y-%m-%d').date() if request.GET.get('week') else today
+        except ValueError:
+            messages.error(request, 'Неверная дата, ожидается ГГГГ-ММ-ДД')
+            day = today
+        week_start = day - timedelta(days=day.weekday())
+
+        grid = None
+        if request.method == 'POST':
+            try:
+                grid = parse_class_grid(request.POST)
+                result = save_class_week(class_obj.id, week_start, grid)
+            except ChoiceError as e:
+                messages.error(request, str(e))
+            else:
+                self.message_user(request, f"Сохранено: новых {result['created']}, изменено {result['updated']}, "
+                                           f"без изменений {result['unchanged']}", messages.SUCCESS)
+                return redirect(f"{reverse('admin:pupils_class_week_grid', args=[class_obj.pk])}?week={week_start}")
+
+        context = {
+            **self.admin_site.each_context(request),
+            **class_week_grid(class_obj.id, week_start, grid),
+            'title': f'Выбор завтраков {class_obj.name} на неделю с {week_start}',
+            'opts': self.model._meta,
+            'class_obj': class_obj,
+            'week_start': week_start,
+            'previous_week': week_start - timedelta(days=7),
+            'next_week': week_start + timedelta(days=7),
+        }
+        return render(request, 'admin/class_week_grid.html', context)
+
 
 @admin.register(Pupil)
 class PupilAdmin(admin.ModelAdmin):
@@ -35,6 +134,48 @@ class DailyMenuAdmin(admin.ModelAdmin):
     list_display = ['date', 'option_1', 'option_2']
     list_filter = ['date']
     date_hierarchy = 'date'
+    list_select_related = ['option_1', 'option_2']
+    actions = ['plan_term']
+
+    @admin.action(description='Повторить выбранные недели как ротацию на период')
+    def plan_term(self, request, queryset):
+        """Промежуточная страница: период, каникулы и режим конфликтов, затем запись одним bulk_create"""
+        from django.conf import settings
+
+        holidays_text = request.POST.get('holidays', '\n'.join(settings.MENU_HOLIDAYS))
+        if request.POST.get('apply'):
+            try:
+                date_from = datetime.strptime(request.POST.get('date_from', ''), '%Y-%m-%d').date()
+                date_to = datetime.strptime(request.POST.get('date_to', ''), '%Y-%m-%d').date()
+            except ValueError:
+                messages.error(request, 'Неверная дата, ожидается ГГГГ-ММ-ДД')
+            else:
+                try:
+                    result = plan_menus(
+                        rotation_from_menus(queryset), date_from, date_to,
+                        holidays=parse_holidays(holidays_text.replace(',', '\n').splitlines()),
+                        conflicts=request.POST.get('conflicts', SKIP),
+                    )
+                except MenuPlanError as e:
+                    messages.error(request, str(e))
+                else:
+                    self.message_user(request, f"Создано меню: {result['created']}, перезаписано: "
+                                               f"{result['updated']}, пропущено: {result['skipped']}",
+                                      messages.SUCCESS)
+                    return None
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Планирование меню по ротации',
+            'opts': self.model._meta,
+            'menus': queryset.order_by('date'),
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+            'date_from': request.POST.get('date_from', ''),
+            'date_to': request.POST.get('date_to', ''),
+            'holidays': holidays_text,
+            'conflicts': request.POST.get('conflicts', SKIP),
+        }
+        return render(request, 'admin/plan_menus.html', context)
 
 
 @admin.register(WeeklyBreakfasts)
@@ -43,18 +184,31 @@ class WeeklyBreakfastAdmin(admin.ModelAdmin):
                     'week_start_date', 'choices_count']
     list_filter = ['pupil__class_group', 'week_start_date']
     search_fields = ['pupil__first_name', 'pupil__last_name']
+    # Ученик, класс и пять блюд - одним JOIN-запросом на страницу
+    list_select_related = ['pupil__class_group', 'monday', 'tuesday', 'wednesday', 'thursday', 'friday']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ['export_selected_weeks', 'freeze_selected_weeks']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            choices_total=sum(
+                Case(When(**{f'{day}__isnull': False}, then=Value(1)), default=Value(0))
+                for day in WEEKDAYS
+            )
+        )
 
     def get_class_group(self, obj):
         return obj.pupil.class_group
 
     get_class_group.short_description = 'Класс'
+    get_class_group.admin_order_field = 'pupil__class_group__name'
 
     def choices_count(self, obj):
-        count = sum([1 for field in [obj.monday, obj.tuesday, obj.wednesday,
-                                     obj.thursday, obj.friday] if field])
-        return f"{count}/5"
+        return f"{obj.choices_total}/5"
 
     choices_count.short_description = 'Выбрано'
+    choices_count.admin_order_field = 'choices_total'
 
     def get_urls(self):
         urls = super().get_urls()
@@ -64,6 +218,10 @@ class WeeklyBreakfastAdmin(admin.ModelAdmin):
                  name='pupils_weeklybreakfasts_statistics'),
             path('export-excel/', self.admin_site.admin_view(self.export_to_excel),
                  name='pupils_weeklybreakfasts_export_excel'),
+            path('reports/', self.admin_site.admin_view(self.reports_view),
+                 name='pupils_weeklybreakfasts_reports'),
+            path('live/', self.admin_site.admin_view(self.live_view),
+                 name='pupils_weeklybreakfasts_live'),
         ]
         return custom_urls + urls
 
@@ -74,16 +232,57 @@ class WeeklyBreakfastAdmin(admin.ModelAdmin):
         today = datetime.now().date()
         week_start = today - timedelta(days=today.weekday())
 
-        stats_data = get_weekly_statistics(week_start)
+        stats_data = cached_weekly_statistics(week_start)
 
         context = {
             'title': f'Статистика завтраков на неделю с {week_start} по {week_start + timedelta(days=4)}',
             'classes_stats': stats_data['classes_stats'],
             'week_start': week_start,
+            'cache_info': get_statistics_cache_info(),
         }
 
         return render(request, 'admin/breakfast_statistics.html', context)
 
+    def live_view(self, request):
+        """Живая панель выбора на текущую неделю, обновляется по SSE без перезагрузки"""
+        today = datetime.now().date()
+        week_start = today - timedelta(days=today.weekday())
+        context = {
+            **self.admin_site.each_context(request),
+            'title': f'Выбор завтраков в реальном времени, неделя с {week_start}',
+            'week_start': week_start,
+            'days': WEEKDAYS,
+            'class_names': dict(Class.objects.values_list('id', 'name')),
+        }
+        return render(request, 'admin/live_dashboard.html', context)
+
+    def reports_view(self, request):
+        """Отчёт по выбору учеников за произвольный период, по неделе на страницу"""
+        today = datetime.now().date()
+        week_start = today - timedelta(days=today.weekday())
+        try:
+            date_from = datetime.strptime(request.GET['date_from'], '%Y-%m-%d').date() \
+                if request.GET.get('date_from') else week_start
+            date_to = datetime.strptime(request.GET['date_to'], '%Y-%m-%d').date() \
+                if request.GET.get('date_to') else date_from + timedelta(days=4)
+        except ValueError:
+            messages.error(request, 'Неверная дата, ожидается ГГГГ-ММ-ДД')
+            date_from, date_to = week_start, week_start + timedelta(days=4)
+        if date_to < date_from:
+            date_from, date_to = date_to, date_from
+
+        class_ids = [int(class_id) for class_id in request.GET.getlist('classes') if class_id.isdigit()]
+
+        query = request.GET.copy()
+        query.pop('page', None)
+        context = {
+            **self.admin_site.each_context(request),
+            **report_context(date_from, date_to, class_ids, request.GET.get('page')),
+            'title': f'Отчёт по завтракам с {date_from} по {date_to}',
+            'page_query': query.urlencode(),
+        }
+        return render(request, 'weekly_reports.html', context)
+
     def changelist_view(self, request, extra_context=None):
         """Добавляем ссылку на статистику в список"""
         extra_context = extra_context or {}
@@ -91,190 +290,256 @@ class WeeklyBreakfastAdmin(admin.ModelAdmin):
         return super().changelist_view(request, extra_context=extra_context)
 
     def export_to_excel(self, request):
-        """Экспорт с листами статистики и листами учеников"""
-        from .models import Class, Pupil, WeeklyBreakfasts
+        """Ставит выгрузку текущей недели в очередь и открывает страницу её статуса"""
         from datetime import datetime, timedelta
 
-        from openpyxl.styles import PatternFill
-
-        not_chosen_fill = PatternFill(start_color="FFCCCC", end_color="FFCCCC", fill_type="solid")
-        chosen_style = PatternFill(start_color="CCFFCC", end_color="CCFFCC", fill_type="solid")
-
         today = datetime.now().date()
         week_start = today - timedelta(days=today.weekday())
 
-        # Создаем Excel книгу
-        wb = openpyxl.Workbook()
-        wb.remove(wb.active)
-
-        # Стили
-        header_fill = PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid")
-        bold_font = Font(bold=True)
-        center_align = Alignment(horizontal='center')
-
-        # 1.\
-        stats_data = get_weekly_statistics(week_start)
-        ws_stats = wb.create_sheet(title="Статистика")
-
-        # Заголовок статистики
-        ws_stats.merge_cells('A1:E1')
-        ws_stats['A1'] = f'Статистика завтраков с {week_start} по {stats_data["week_end"]}'
-        ws_stats['A1'].font = Font(bold=True, size=14)
-        ws_stats['A1'].alignment = center_align
-
-        row = 3
-
-        for class_stat in stats_data['classes_stats']:
-            class_obj = class_stat['class']
-
-            # Заголовок класса
-            ws_stats.merge_cells(f'A{row}:E{row}')
-            ws_stats[f'A{row}'] = f'Класс: {class_obj.name}'
-            ws_stats[f'A{row}'].font = bold_font
-            row += 1
-
-            # Всего учеников
-            ws_stats[f'A{row}'] = f'Всего учеников: {class_stat["total_pupils"]}'
-            row += 1
-
-            # Заголовки таблицы
-            headers = ['День недели', 'Вариант 1', 'Вариант 2', 'Не выбрано', 'Выбрали']
-            for col, header in enumerate(headers, 1):
-                cell = ws_stats.cell(row=row, column=col, value=header)
-                cell.font = bold_font
-                cell.fill = header_fill
-
-            row += 1
-
-            # Статистика по дням
-            days_mapping = {
-                'monday': 'Понедельник',
-                'tuesday': 'Вторник',
-                'wednesday': 'Среда',
-                'thursday': 'Четверг',
-                'friday': 'Пятница'
-            }
+        job = request_export(week_start, request.user)
+        return redirect('admin:pupils_exportjob_status', job.pk)
+
+    @admin.action(description='Выгрузить в Excel недели выбранных записей')
+    def export_selected_weeks(self, request, queryset):
+        week_starts = queryset.order_by('week_start_date').values_list('week_start_date', flat=True).distinct()
+        frozen = set(WeekSnapshot.objects.filter(week_start_date__in=week_starts).values_list('week_start_date',
+                                                                                              flat=True))
+        if len(week_starts) == 1 and frozen:
+            # Замороженная неделя уже лежит в хранилище снимков
+            return redirect('week_workbook', week_starts[0])
+        jobs = [request_export(week_start, request.user) for week_start in week_starts if week_start not in frozen]
+        if frozen:
+            self.message_user(request, f'Заморожено, выгрузка не нужна: {len(frozen)} нед.', messages.INFO)
+        if not jobs:
+            return redirect('admin:pupils_weeksnapshot_changelist')
+        if len(jobs) == 1:
+            return redirect('admin:pupils_exportjob_status', jobs[0].pk)
+        self.message_user(request, f'Выгрузок поставлено в очередь: {len(jobs)}', messages.SUCCESS)
+        return redirect('admin:pupils_exportjob_changelist')
+
+    @admin.action(description='Заморозить недели выбранных записей')
+    def freeze_selected_weeks(self, request, queryset):
+        week_starts = queryset.order_by('week_start_date').values_list('week_start_date', flat=True).distinct()
+        frozen = 0
+        for week_start in week_starts:
+            try:
+                freeze_week(week_start, request.user)
+            except SnapshotError as e:
+                messages.error(request, str(e))
+            else:
+                frozen += 1
+        if frozen:
+            self.message_user(request, f'Заморожено недель: {frozen}', messages.SUCCESS)
+
+
+@admin.register(WeekSnapshot)
+class WeekSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['week_start_date', 'frozen_at', 'frozen_by', 'files']
+    list_select_related = ['frozen_by']
+    readonly_fields = ['week_start_date', 'statistics_sha256', 'workbook_sha256', 'frozen_by', 'frozen_at']
+    actions = ['unfreeze_weeks']
+
+    def has_add_permission(self, request):
+        # Снимки создаются действием над недельными записями и командой freeze_weeks
+        return False
+
+    def files(self, obj):
+        from django.utils.html import format_html
+
+        week = obj.week_start_date
+        return format_html('<a href="{}">Статистика</a> / <a href="{}">Excel</a>',
+                           reverse('week_statistics', args=[week]), reverse('week_workbook', args=[week]))
+
+    files.short_description = 'Файлы'
+
+    @admin.action(description='Разморозить выбранные недели (пересчитывать по данным)')
+    def unfreeze_weeks(self, request, queryset):
+        weeks = list(queryset.values_list('week_start_date', flat=True))
+        for week_start in weeks:
+            unfreeze_week(week_start)
+        self.message_user(request, f'Разморожено недель: {len(weeks)}', messages.SUCCESS)
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ['week_start_date', 'status', 'progress', 'data_version', 'requested_by', 'created_at',
+                    'finished_at', 'download_link']
+    list_filter = ['status', 'week_start_date']
+    list_select_related = ['requested_by']
+    readonly_fields = ['week_start_date', 'data_version', 'status', 'progress', 'file', 'error', 'requested_by',
+                       'created_at', 'finished_at']
+
+    def has_add_permission(self, request):
+        # Задачи создаются только кнопкой экспорта и действием над недельными записями
+        return False
+
+    def download_link(self, obj):
+        from django.utils.html import format_html
+
+        if obj.status != ExportJob.DONE:
+            return '-'
+        return format_html('<a href="{}">Скачать</a>', reverse('admin:pupils_exportjob_download', args=[obj.pk]))
+
+    download_link.short_description = 'Файл'
+
+    def get_urls(self):
+        urls = super().get_urls()
+        from django.urls import path
+        custom_urls = [
+            path('<int:job_id>/status/', self.admin_site.admin_view(self.status_view),
+                 name='pupils_exportjob_status'),
+            path('<int:job_id>/download/', self.admin_site.admin_view(self.download_view),
+                 name='pupils_exportjob_download'),
+        ]
+        return custom_urls + urls
+
+    def status_view(self, request, job_id):
+        """Страница статуса выгрузки, обновляется сама, пока задача не завершится"""
+        job = get_object_or_404(ExportJob, pk=job_id)
+        context = {
+            **self.admin_site.each_context(request),
+            'title': f'Выгрузка в Excel за неделю с {job.week_start_date}',
+            'job': job,
+            'opts': self.model._meta,
+        }
+        return render(request, 'admin/export_job_status.html', context)
+
+    def download_view(self, request, job_id):
+        job = get_object_or_404(ExportJob, pk=job_id, status=ExportJob.DONE)
+        if not job.file.storage.exists(job.file.name):
+            raise Http404('Файл выгрузки не найден')
+        return FileResponse(
+            job.file.open('rb'),
+            as_attachment=True,
+            filename=f'завтраки_{job.week_start_date}.xlsx',
+            content_type=XLSX_CONTENT_TYPE,
+        )
 
-            for day_field, day_name in days_mapping.items():
-                day_data = class_stat['day_stats'][day_field]
-                dishes_list = list(day_data['dishes'].items())
 
-                option1 = f"{dishes_list[0][0]}: {dishes_list[0][1]}" if dishes_list else "-"
-                option2 = f"{dishes_list[1][0]}: {dishes_list[1][1]}" if len(dishes_list) > 1 else "-"
+@admin.register(PendingSubmission)
+class PendingSubmissionAdmin(admin.ModelAdmin):
+    list_display = ['received_at', 'last_name', 'first_name', 'class_group', 'week_start_date', 'attempts', 'error']
+    list_filter = ['class_group']
+    list_select_related = ['class_group']
+    readonly_fields = ['first_name', 'last_name', 'class_group', 'week_start_date', 'choices', 'received_at',
+                       'attempts', 'error']
+    actions = ['requeue']
 
-                # Записываем строку
-                ws_stats.cell(row=row, column=1, value=day_name)
-                ws_stats.cell(row=row, column=2, value=option1)
-                ws_stats.cell(row=row, column=3, value=option2)
-                ws_stats.cell(row=row, column=4, value=day_data['not_chosen'])
-                ws_stats.cell(row=row, column=5, value=day_data['chosen'])
+    def has_add_permission(self, request):
+        # Очередь пополняет только форма /pool/ в режиме POOL_WRITE_BEHIND
+        return False
 
-                row += 1
+    @admin.action(description='Вернуть в очередь (применится поверх более новых отправок)')
+    def requeue(self, request, queryset):
+        self.message_user(request, f'Возвращено в очередь: {requeue_failed(queryset)}', messages.SUCCESS)
 
-            # Пустая строка между классами
-            row += 2
 
-        # 2. ЛИСТЫ С УЧЕНИКАМИ
-        for class_obj in Class.objects.all().order_by('name'):
-            ws_pupils = wb.create_sheet(title=f"Ученики {class_obj.name}")
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'method', 'path', 'view_name', 'status_code', 'duration_ms', 'sql_count',
+                    'sql_duration_ms', 'trigger', 'download_link']
+    list_filter = ['trigger', 'view_name']
+    search_fields = ['path']
+    fields = ['created_at', 'method', 'path', 'view_name', 'status_code', 'trigger', 'user', 'duration_ms',
+              'sql_count', 'sql_duration_ms', 'download_link', 'top_functions_table', 'queries_table']
+    readonly_fields = fields
 
-            # Заголовок
-            ws_pupils.merge_cells('A1:H1')
-            ws_pupils['A1'] = f'Выборы завтраков - {class_obj.name} (неделя {week_start})'
-            ws_pupils['A1'].font = Font(bold=True, size=14)
-            ws_pupils['A1'].alignment = center_align
+    def has_add_permission(self, request):
+        # Профили пишет только ProfilingMiddleware
+        return False
 
-            # Заголовки таблицы
-            headers = ['Фамилия', 'Имя', 'Класс', 'Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница']
-            for col, header in enumerate(headers, 1):
-                cell = ws_pupils.cell(row=3, column=col, value=header)
-                cell.font = bold_font
-                cell.fill = header_fill
+    def has_change_permission(self, request, obj=None):
+        return False
 
-            # Данные учеников
-            pupils = Pupil.objects.filter(class_group=class_obj).order_by('last_name', 'first_name')
-            row_pupil = 4
+    def download_link(self, obj):
+        from django.utils.html import format_html
 
-            for pupil in pupils:
-                try:
-                    breakfast = WeeklyBreakfasts.objects.get(pupil=pupil, week_start_date=week_start)
-                except WeeklyBreakfasts.DoesNotExist:
-                    breakfast = None
-
-                # Данные ученика
-                ws_pupils.cell(row=row_pupil, column=1, value=pupil.last_name)
-                ws_pupils.cell(row=row_pupil, column=2, value=pupil.first_name)
-                ws_pupils.cell(row=row_pupil, column=3, value=class_obj.name)
-
-                days = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday']
-                for col, day_field in enumerate(days, 4):
-                    cell = ws_pupils.cell(row=row_pupil, column=col)
-                    if breakfast and getattr(breakfast, day_field):
-                        cell.fill = chosen_style
-                        cell.value = getattr(breakfast, day_field).short_name
-                    else:
-                        cell.fill = not_chosen_fill
-                        cell.value = "Не выбрано"
-
-                row_pupil += 1
-
-            # Настраиваем ширину колонок
-            column_widths = [15, 15, 10, 20, 20, 20, 20, 20]
-            for i, width in enumerate(column_widths, 1):
-                ws_pupils.column_dimensions[get_column_letter(i)].width = width
-
-        # Настраиваем ширину колонок для листа статистики
-        stats_widths = [15, 25, 25, 12, 12]
-        for i, width in enumerate(stats_widths, 1):
-            ws_stats.column_dimensions[get_column_letter(i)].width = width
-
-        # Создаем HTTP ответ с файлом
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        filename = f'завтраки_{week_start}.xlsx'
-        response['Content-Disposition'] = f"attachment; filename*=UTF-8''{urllib.parse.quote(filename)}"
+        return format_html('<a href="{}">.prof</a>', reverse('admin:pupils_requestprofile_download', args=[obj.pk]))
 
-        wb.save(response)
-        return response
+    download_link.short_description = 'Файл'
 
+    def top_functions_table(self, obj):
+        from django.utils.html import format_html, format_html_join
 
+        rows = format_html_join('', '<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>', (
+            (row['cumtime_ms'], row['tottime_ms'], row['calls'], row['function']) for row in obj.top_functions
+        ))
+        return format_html('<table><thead><tr><th>cumtime, мс</th><th>tottime, мс</th><th>Вызовов</th>'
+                           '<th>Функция</th></tr></thead><tbody>{}</tbody></table>', rows)
+
+    top_functions_table.short_description = 'Функции по суммарному времени'
+
+    def queries_table(self, obj):
+        from django.utils.html import format_html, format_html_join
+
+        rows = format_html_join('', '<tr><td>{}</td><td><code>{}</code></td></tr>', (
+            (query['duration_ms'], query['sql']) for query in obj.queries
+        ))
+        return format_html('<table><thead><tr><th>мс</th><th>SQL</th></tr></thead><tbody>{}</tbody></table>', rows)
+
+    queries_table.short_description = 'SQL-запросы'
+
+    def get_urls(self):
+        urls = super().get_urls()
+        from django.urls import path
+        custom_urls = [
+            path('<int:profile_id>/download/', self.admin_site.admin_view(self.download_view),
+                 name='pupils_requestprofile_download'),
+        ]
+        return custom_urls + urls
+
+    def download_view(self, request, profile_id):
+        profile = get_object_or_404(RequestProfile, pk=profile_id)
+        if not self.has_view_permission(request, profile):
+            raise PermissionDenied
+        if not profile.stats_file.storage.exists(profile.stats_file.name):
+            raise Http404('Файл профиля не найден')
+        return FileResponse(profile.stats_file.open('rb'), as_attachment=True,
+                            filename=f'profile_{profile.pk}.prof', content_type='application/octet-stream')
+
+
+@reporting_reads()
 def get_weekly_statistics(week_start=None):
-    """Общая функция для получения статистики за неделю"""
-    from django.db.models import Count
+    """Общая функция для получения статистики за неделю.
+
+    Читает готовые счётчики WeeklyDishCounter (класс × день × блюдо),
+    поэтому стоимость не зависит от числа учеников и классов.
+    """
     from datetime import datetime, timedelta
 
     if week_start is None:
         today = datetime.now().date()
         week_start = today - timedelta(days=today.weekday())
 
-    from .models import Class, WeeklyBreakfasts
+    from .models import Class, WeeklyDishCounter, WEEKDAYS
+
+    week_counters = WeeklyDishCounter.objects.filter(
+        week_start_date=week_start, count__gt=0
+    ).values_list('class_group_id', 'weekday', 'dish__short_name', 'count')
+
+    # counts[class_id][day] -> {short_name: count}
+    counts = {}
+    for class_id, day, dish, count in week_counters:
+        day_counts = counts.setdefault(class_id, {}).setdefault(day, {})
+        day_counts[dish] = day_counts.get(dish, 0) + count
 
     classes_stats = []
 
     for class_obj in Class.objects.all():
         total_pupils = class_obj.number_of_pupils
+        class_counts = counts.get(class_obj.id, {})
         day_stats = {}
-        days = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday']
-
-        for day in days:
-            choices = WeeklyBreakfasts.objects.filter(
-                week_start_date=week_start,
-                pupil__class_group=class_obj
-            ).exclude(**{f"{day}__isnull": True})
-
-            dish_counts = choices.values(
-                f'{day}__short_name'
-            ).annotate(count=Count('id')).order_by('-count')
 
-            dish_stats = {}
-            for item in dish_counts:
-                dish_stats[item[f'{day}__short_name']] = item['count']
+        for day in WEEKDAYS:
+            dish_counts = class_counts.get(day, {})
+            # Самое популярное блюдо первым
+            dish_stats = dict(sorted(dish_counts.items(), key=lambda item: (-item[1], item[0])))
+            chosen = sum(dish_stats.values())
 
             day_stats[day] = {
                 'dishes': dish_stats,
-                'not_chosen': total_pupils - choices.count(),
-                'chosen': choices.count()
+                'not_chosen': total_pupils - chosen,
+                'chosen': chosen
             }
 
         classes_stats.append({
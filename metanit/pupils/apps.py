@@ -5,3 +5,6 @@ class PupilsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'pupils'
     verbose_name = 'Ученики'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
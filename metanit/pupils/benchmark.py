@@ -0,0 +1,120 @@
+import platform
+import random
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .excel import SPOOL_MAX_SIZE, write_weekly_workbook
+from .models import Pupil, DailyMenu, WEEKDAYS
+from .seeding import seed_school, current_week_start
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _summary(timings, query_counts):
+    return {
+        'runs': len(timings),
+        'p50_ms': round(_percentile(timings, 50), 2),
+        'p90_ms': round(_percentile(timings, 90), 2),
+        'p99_ms': round(_percentile(timings, 99), 2),
+        'mean_ms': round(statistics.mean(timings), 2),
+        'max_ms': round(max(timings), 2),
+        'queries': max(query_counts),
+    }
+
+
+def _measure(request, repeat, warm):
+    timings = []
+    query_counts = []
+    for _ in range(repeat):
+        if not warm:
+            cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = request()
+            if response is not None and response.streaming:
+                b''.join(response.streaming_content)
+            timings.append((time.perf_counter() - started) * 1000)
+        if response is not None and response.status_code >= 400:
+            raise RuntimeError(f'{response.status_code} от {response.request["PATH_INFO"]}')
+        query_counts.append(len(queries.captured_queries))
+    return _summary(timings, query_counts)
+
+
+def _pool_post_payloads(rnd):
+    week_start = current_week_start()
+    menus = list(DailyMenu.objects.filter(date__range=(week_start, week_start + timedelta(days=len(WEEKDAYS) - 1))))
+    pupils = list(Pupil.objects.values('first_name', 'last_name', 'class_group_id'))
+    while True:
+        pupil = rnd.choice(pupils)
+        data = {'first_name': pupil['first_name'], 'last_name': pupil['last_name'],
+                'class_name': pupil['class_group_id']}
+        for menu in menus:
+            data[f'breakfast_{menu.date}'] = rnd.choice([menu.option_1_id, menu.option_2_id, 'none'])
+        yield data
+
+
+def _build_workbook(week_start):
+    """Сборка книги так же, как в фоновой выгрузке ExportJob"""
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, suffix='.xlsx') as fileobj:
+        write_weekly_workbook(fileobj, week_start)
+
+
+def benchmark_size(classes, pupils_per_class, weeks, repeat, warm, seed=None):
+    """Засевает пустую базу и замеряет задержки и число SQL-запросов основных страниц"""
+    call_command('flush', interactive=False, verbosity=0)
+    cache.clear()
+    seeded = seed_school(classes, pupils_per_class, weeks, seed=seed)
+
+    admin = get_user_model().objects.create_superuser('benchmark', 'benchmark@example.com', 'benchmark')
+    pupil_client = Client()
+    admin_client = Client()
+    admin_client.force_login(admin)
+
+    payloads = _pool_post_payloads(random.Random(seed))
+
+    endpoints = {
+        'pool_get': lambda: pupil_client.get(reverse('pool')),
+        'pool_post': lambda: pupil_client.post(reverse('pool'), next(payloads)),
+        'statistics_view': lambda: admin_client.get(reverse('admin:pupils_weeklybreakfasts_statistics')),
+        # Кнопка экспорта только ставит задачу в очередь, замеряем саму сборку книги
+        'export_workbook': lambda: _build_workbook(current_week_start()),
+    }
+
+    return {
+        'classes': classes,
+        'pupils_per_class': pupils_per_class,
+        'seeded': seeded,
+        'endpoints': {name: _measure(request, repeat, warm) for name, request in endpoints.items()},
+    }
+
+
+def run_benchmark(sizes, weeks, repeat, warm=False, seed=None):
+    """Прогоняет benchmark_size для каждого размера (классов, учеников в классе)"""
+    return {
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+        },
+        'settings': {'weeks': weeks, 'repeat': repeat, 'warm_cache': warm, 'seed': seed},
+        'results': [
+            benchmark_size(classes, pupils_per_class, weeks, repeat, warm, seed=seed)
+            for classes, pupils_per_class in sizes
+        ],
+    }
@@ -0,0 +1,187 @@
+import secrets
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .routers import primary_reads
+
+DATA_VERSION_KEY = 'pupils:data_version'
+DATA_CHANGED_AT_KEY = 'pupils:data_changed_at'
+MENU_VERSION_KEY = 'pupils:menu_version'
+PUPIL_VERSION_KEY = 'pupils:pupil_version'
+PUPIL_NAMES_KEY = 'pupils:names:{class_id}:v{version}'
+POOL_CONTEXT_KEY = 'pupils:pool:{first_date}:{last_date}:v{version}'
+KITCHEN_TOTALS_KEY = 'pupils:kitchen:{week_start}:{per_class}:v{version}'
+SNAPSHOT_KEY = 'pupils:snapshot:{week_start}'
+STATISTICS_KEY = 'pupils:statistics:{week_start}:v{version}'
+STATISTICS_HITS_KEY = 'pupils:statistics:hits'
+STATISTICS_MISSES_KEY = 'pupils:statistics:misses'
+
+
+def _incr(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        return cache.incr(key)
+
+
+def _new_version():
+    """Новая версия: миллисекунды и случайный хвост, влезает в BigIntegerField.
+
+    Не cache.incr: у FileBasedCache он не атомарный (get, затем set), и два
+    одновременных изменения могли записать одну и ту же версию. Свежее
+    значение при каждом изменении не совпадает ни с одной прежней версией.
+    """
+    return time.time_ns() // 1_000_000 * 1_000_000 + secrets.randbelow(1_000_000)
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _bump_version(key):
+    version = _new_version()
+    cache.set(key, version, timeout=None)
+    return version
+
+
+def get_data_version():
+    """Текущая версия данных: меняется при каждом изменении учеников, выборов и меню"""
+    return _get_version(DATA_VERSION_KEY)
+
+
+def bump_data_version():
+    cache.set(DATA_CHANGED_AT_KEY, time.time(), timeout=None)
+    return _bump_version(DATA_VERSION_KEY)
+
+
+def get_data_changed_at():
+    """Время последнего изменения данных (unix time) для заголовка Last-Modified"""
+    changed_at = cache.get(DATA_CHANGED_AT_KEY)
+    if changed_at is None:
+        cache.add(DATA_CHANGED_AT_KEY, time.time(), timeout=None)
+        changed_at = cache.get(DATA_CHANGED_AT_KEY)
+    return changed_at
+
+
+def get_menu_version():
+    """Версия меню, блюд и классов - не меняется от отправок формы /pool/"""
+    return _get_version(MENU_VERSION_KEY)
+
+
+def bump_menu_version():
+    return _bump_version(MENU_VERSION_KEY)
+
+
+def cached_weekly_statistics(week_start):
+    """get_weekly_statistics с кэшем по неделе и версии данных"""
+    from .admin import get_weekly_statistics
+
+    key = STATISTICS_KEY.format(week_start=week_start, version=get_data_version())
+    stats_data = cache.get(key)
+    if stats_data is not None:
+        _incr(STATISTICS_HITS_KEY)
+        return stats_data
+
+    _incr(STATISTICS_MISSES_KEY)
+    with primary_reads():
+        stats_data = get_weekly_statistics(week_start)
+    # Короткий TTL страхует от рассинхронизации версии между процессами
+    cache.set(key, stats_data, timeout=settings.STATISTICS_CACHE_TIMEOUT)
+    return stats_data
+
+
+def get_statistics_cache_info():
+    return {
+        'hits': cache.get(STATISTICS_HITS_KEY, 0),
+        'misses': cache.get(STATISTICS_MISSES_KEY, 0),
+        'version': get_data_version(),
+    }
+
+
+def get_pupil_version():
+    """Версия списка учеников - меняется только при изменении учеников и классов"""
+    return _get_version(PUPIL_VERSION_KEY)
+
+
+def bump_pupil_version():
+    return _bump_version(PUPIL_VERSION_KEY)
+
+
+def cached_pupil_names(class_id):
+    """Ученики класса для подсказки имени: [(name_key, фамилия, имя)], отсортированные по ключу"""
+    from .models import Pupil
+
+    key = PUPIL_NAMES_KEY.format(class_id=class_id, version=get_pupil_version())
+    names = cache.get(key)
+    if names is None:
+        names = list(Pupil.objects.filter(class_group_id=class_id).order_by('name_key').values_list(
+            'name_key', 'last_name', 'first_name'
+        ))
+        cache.set(key, names, timeout=settings.POOL_CACHE_TIMEOUT)
+    return names
+
+
+def cached_pool_context(week_dates):
+    """Классы и меню на дни недели для формы /pool/.
+
+    Меню за все дни читается одним запросом вместе с блюдами и кэшируется
+    до изменения DailyMenu, Dish или Class.
+    """
+    from .models import Class, DailyMenu
+
+    if not week_dates:
+        return {'classes': [], 'menus': {}}
+
+    key = POOL_CONTEXT_KEY.format(first_date=week_dates[0], last_date=week_dates[-1],
+                                  version=get_menu_version())
+    context = cache.get(key)
+    if context is None:
+        menus = DailyMenu.objects.filter(
+            date__range=(week_dates[0], week_dates[-1])
+        ).select_related('option_1', 'option_2')
+        context = {
+            'classes': list(Class.objects.all().order_by('name')),
+            'menus': {menu.date: menu for menu in menus},
+        }
+        cache.set(key, context, timeout=settings.POOL_CACHE_TIMEOUT)
+    return context
+
+
+def cached_kitchen_totals(week_start, per_class=False):
+    """kitchen_totals с кэшем по неделе и версии данных"""
+    from .counters import kitchen_totals
+
+    key = KITCHEN_TOTALS_KEY.format(week_start=week_start, per_class=int(per_class), version=get_data_version())
+    totals = cache.get(key)
+    if totals is None:
+        with primary_reads():
+            totals = kitchen_totals(week_start, per_class=per_class)
+        cache.set(key, totals, timeout=settings.STATISTICS_CACHE_TIMEOUT)
+    return totals
+
+
+def cached_snapshot(week_start):
+    """Хэши снимка замороженной недели (статистика, книга) или None, если неделя не заморожена"""
+    from .models import WeekSnapshot
+
+    key = SNAPSHOT_KEY.format(week_start=week_start)
+    hashes = cache.get(key)
+    if hashes is None:
+        snapshot = WeekSnapshot.objects.filter(week_start_date=week_start).values_list(
+            'statistics_sha256', 'workbook_sha256'
+        ).first()
+        # Пустой кортеж - «не заморожена», чтобы не спрашивать БД на каждый запрос
+        hashes = tuple(snapshot or ())
+        cache.set(key, hashes, timeout=settings.STATISTICS_CACHE_TIMEOUT)
+    return hashes or None
+
+
+def forget_snapshot(week_start):
+    cache.delete(SNAPSHOT_KEY.format(week_start=week_start))
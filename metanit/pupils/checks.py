@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """Версии данных в кэше должны быть общими для всех процессов.
+
+    С locmem каждый воркер видит свою версию: после записи остальные
+    продолжают отвечать 304 и отдавать устаревшие меню и сводки.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if backend.endswith('LocMemCache') and settings.WEB_CONCURRENCY > 1:
+        return [Error(
+            f'Кэш locmem не общий для {settings.WEB_CONCURRENCY} процессов (WEB_CONCURRENCY)',
+            hint='Укажите CACHE_BACKEND=file или запустите один процесс',
+            id='pupils.E001',
+        )]
+    return []
@@ -0,0 +1,267 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Q
+
+from .cache import bump_data_version
+from .counters import apply_deltas, choice_deltas
+from .live import publish_choice_deltas
+from .models import Pupil, DailyMenu, WeeklyBreakfasts, BreakfastChoice, WEEKDAYS, clean_name, normalize_name
+
+
+class ChoiceError(ValueError):
+    """Некорректные данные формы выбора завтраков"""
+
+
+def week_start_for(date):
+    return date - timedelta(days=date.weekday())
+
+
+def parse_choices(data):
+    """Разбирает поля breakfast_ГГГГ-ММ-ДД формы.
+
+    Все выбранные блюда проверяются одним запросом к DailyMenu: блюдо должно
+    быть одним из двух вариантов меню на этот день. Возвращает начало недели
+    и {'monday': id блюда или None, ...} только для присланных дней.
+    """
+    submitted = {}
+    for key, value in data.items():
+        if not key.startswith('breakfast_'):
+            continue
+        try:
+            date = datetime.strptime(key.replace('breakfast_', ''), '%Y-%m-%d').date()
+        except ValueError:
+            raise ChoiceError(f'Неверная дата: {key}')
+        if date.weekday() >= len(WEEKDAYS):
+            raise ChoiceError(f'{date} - выходной день')
+        submitted[date] = value if value and value != "none" else None
+
+    if not submitted:
+        return None, {}
+
+    weeks = {week_start_for(date) for date in submitted}
+    if len(weeks) > 1:
+        raise ChoiceError('Выбор можно сохранить только для одной недели')
+
+    menus = {
+        date: {option_1, option_2}
+        for date, option_1, option_2 in DailyMenu.objects.filter(
+            date__in=[date for date, value in submitted.items() if value]
+        ).values_list('date', 'option_1_id', 'option_2_id')
+    }
+
+    choices = {}
+    for date, value in submitted.items():
+        dish_id = None
+        if value:
+            try:
+                dish_id = int(value)
+            except ValueError:
+                raise ChoiceError(f'Неверное блюдо: {value}')
+            if dish_id not in menus.get(date, ()):
+                raise ChoiceError(f'Блюда нет в меню на {date}')
+        choices[WEEKDAYS[date.weekday()]] = dish_id
+
+    return weeks.pop(), choices
+
+
+def write_breakfast_choices(pupil_id, week_start, choices):
+    """Записывает выбор по дням в BreakfastChoice: не более двух запросов"""
+    chosen = [
+        BreakfastChoice(pupil_id=pupil_id, date=week_start + timedelta(days=WEEKDAYS.index(day)),
+                        chosen_dish_id=dish_id)
+        for day, dish_id in choices.items() if dish_id
+    ]
+    cleared = [week_start + timedelta(days=WEEKDAYS.index(day)) for day, dish_id in choices.items() if not dish_id]
+
+    if chosen:
+        BreakfastChoice.objects.bulk_create(chosen, update_conflicts=True, unique_fields=['pupil', 'date'],
+                                            update_fields=['chosen_dish'])
+    if cleared:
+        BreakfastChoice.objects.filter(pupil_id=pupil_id, date__in=cleared).delete()
+
+
+def save_weekly_choices(pupil, week_start, choices):
+    """Сохраняет выбор ученика на неделю в одной транзакции.
+
+    Строки BreakfastChoice по дням пишет сигнал post_save недельной строки
+    WeeklyBreakfasts. Она же блокируется (SELECT ... FOR UPDATE), поэтому параллельные отправки формы
+    одним учеником выполняются по очереди, а счётчики WeeklyDishCounter
+    считаются от актуального предыдущего выбора.
+    """
+    with transaction.atomic(savepoint=False):
+        weekly_breakfast, created = WeeklyBreakfasts.objects.select_for_update().get_or_create(
+            pupil=pupil,
+            week_start_date=week_start
+        )
+        weekly_breakfast.pupil = pupil
+
+        for day, dish_id in choices.items():
+            setattr(weekly_breakfast, f'{day}_id', dish_id)
+        weekly_breakfast.save()
+
+    return weekly_breakfast
+
+
+def clean_submission(first_name, last_name, data):
+    """Проверенная отправка формы: (имя, фамилия, начало недели, выбор по дням)"""
+    week_start, choices = parse_choices(data)
+
+    first_name, last_name = clean_name(first_name), clean_name(last_name)
+    if not first_name or not last_name:
+        raise ChoiceError('Укажите имя и фамилию')
+
+    return first_name, last_name, week_start, choices
+
+
+def save_submission(first_name, last_name, class_id, data):
+    """Проверяет и сохраняет отправку формы /pool/ за фиксированное число запросов"""
+    first_name, last_name, week_start, choices = clean_submission(first_name, last_name, data)
+    return apply_submission(first_name, last_name, class_id, week_start, choices)
+
+
+def apply_submission(first_name, last_name, class_id, week_start, choices):
+    """Находит или создаёт ученика и сохраняет его выбор на неделю"""
+    with transaction.atomic():
+        # Ищем по нормализованному ключу: «Ёлкина  анна» и «елкина Анна» - один ученик
+        pupil, created = Pupil.objects.get_or_create(
+            class_group_id=class_id,
+            name_key=normalize_name(first_name, last_name),
+            defaults={'first_name': first_name, 'last_name': last_name},
+        )
+        if choices:
+            save_weekly_choices(pupil, week_start, choices)
+
+    return pupil
+
+
+def parse_class_grid(data):
+    """Разбирает поля choice_<id ученика>_<день> таблицы класса: {id ученика: {день: id блюда или None}}"""
+    grid = {}
+    for key, value in data.items():
+        if not key.startswith('choice_'):
+            continue
+        pupil_id, _, day = key.removeprefix('choice_').partition('_')
+        if day not in WEEKDAYS:
+            raise ChoiceError(f'Неверный день: {key}')
+        try:
+            grid.setdefault(int(pupil_id), {})[day] = int(value) if value else None
+        except ValueError:
+            raise ChoiceError(f'Неверное значение: {key}')
+    return grid
+
+
+def class_week_grid(class_id, week_start, grid=None):
+    """Таблица выбора класса на неделю для админки: три запроса.
+
+    grid - присланные значения, которые показываются вместо сохранённых
+    (например, после ошибки проверки).
+    """
+    menus = {
+        menu.date: menu
+        for menu in DailyMenu.objects.filter(
+            date__range=(week_start, week_start + timedelta(days=len(WEEKDAYS) - 1))
+        ).select_related('option_1', 'option_2')
+    }
+    days = []
+    for offset, day in enumerate(WEEKDAYS):
+        date = week_start + timedelta(days=offset)
+        days.append({'day': day, 'date': date, 'menu': menus.get(date)})
+
+    pupils = list(Pupil.objects.filter(class_group_id=class_id).order_by('name_key'))
+    saved = {
+        weekly.pupil_id: weekly.get_choices()
+        for weekly in WeeklyBreakfasts.objects.filter(pupil__in=pupils, week_start_date=week_start)
+    }
+    grid = grid or {}
+    rows = []
+    for pupil in pupils:
+        choices = {**saved.get(pupil.id, {}), **grid.get(pupil.id, {})}
+        rows.append({
+            'pupil': pupil,
+            'cells': [{'day': day['day'], 'menu': day['menu'], 'name': f"choice_{pupil.id}_{day['day']}",
+                       'value': choices.get(day['day'])} for day in days],
+        })
+    return {'days': days, 'rows': rows}
+
+
+def save_class_week(class_id, week_start, grid):
+    """Сохраняет выбор всего класса на неделю за фиксированное число запросов.
+
+    Все ячейки проверяются в памяти по меню недели, загруженному одним
+    запросом; затем недельные строки, BreakfastChoice и счётчики
+    WeeklyDishCounter пишутся пачками в одной транзакции. Массовые операции
+    не отправляют сигналы, поэтому счётчики и кэш обновляются здесь же.
+    """
+    week_dates = {day: week_start + timedelta(days=offset) for offset, day in enumerate(WEEKDAYS)}
+    menus = {
+        WEEKDAYS[date.weekday()]: {option_1, option_2}
+        for date, option_1, option_2 in DailyMenu.objects.filter(
+            date__range=(week_start, week_dates[WEEKDAYS[-1]])
+        ).values_list('date', 'option_1_id', 'option_2_id')
+    }
+
+    with transaction.atomic():
+        pupils = {pupil.id: pupil for pupil in Pupil.objects.filter(class_group_id=class_id)}
+        errors = []
+        for pupil_id, choices in grid.items():
+            if pupil_id not in pupils:
+                errors.append(f'Ученик {pupil_id} не из этого класса')
+                continue
+            for day, dish_id in choices.items():
+                if dish_id and dish_id not in menus.get(day, ()):
+                    errors.append(f'{pupils[pupil_id]}: блюда нет в меню на {week_dates[day]}')
+        if errors:
+            raise ChoiceError('; '.join(errors))
+
+        existing = {
+            weekly.pupil_id: weekly
+            for weekly in WeeklyBreakfasts.objects.select_for_update().filter(
+                pupil_id__in=list(grid), week_start_date=week_start
+            )
+        }
+        to_create, to_update, chosen = [], [], []
+        cleared = Q()
+        deltas = Counter()
+        for pupil_id, choices in grid.items():
+            weekly = existing.get(pupil_id)
+            if weekly is None:
+                if not any(choices.values()):
+                    continue
+                weekly = WeeklyBreakfasts(pupil_id=pupil_id, week_start_date=week_start)
+                old_choices = {}
+            else:
+                old_choices = weekly.get_choices()
+
+            for day, dish_id in choices.items():
+                setattr(weekly, f'{day}_id', dish_id)
+            new_choices = weekly.get_choices()
+            if new_choices == old_choices:
+                continue
+
+            (to_update if weekly.pk else to_create).append(weekly)
+            deltas.update(choice_deltas(old_choices, new_choices))
+            chosen += [BreakfastChoice(pupil_id=pupil_id, date=week_dates[day], chosen_dish_id=dish_id)
+                       for day, dish_id in choices.items() if dish_id]
+            cleared_dates = [week_dates[day] for day, dish_id in choices.items() if not dish_id]
+            if cleared_dates:
+                cleared |= Q(pupil_id=pupil_id, date__in=cleared_dates)
+
+        WeeklyBreakfasts.objects.bulk_create(to_create)
+        WeeklyBreakfasts.objects.bulk_update(to_update, WEEKDAYS)
+        if chosen:
+            BreakfastChoice.objects.bulk_create(chosen, update_conflicts=True, unique_fields=['pupil', 'date'],
+                                                update_fields=['chosen_dish'])
+        if cleared:
+            BreakfastChoice.objects.filter(cleared).delete()
+
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        apply_deltas(week_start, class_id, deltas)
+        if to_create or to_update:
+            transaction.on_commit(bump_data_version)
+            transaction.on_commit(partial(publish_choice_deltas, week_start, class_id, deltas))
+
+    return {'created': len(to_create), 'updated': len(to_update),
+            'unchanged': len(grid) - len(to_create) - len(to_update)}
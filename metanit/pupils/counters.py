@@ -0,0 +1,200 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import WEEKDAYS, BreakfastChoice, Class, Pupil, WeeklyBreakfasts, WeeklyDishCounter
+from .routers import reporting_reads
+
+
+def choice_deltas(old_choices, new_choices):
+    """Изменения счётчиков {(день, id блюда): +1/-1} при смене выбора"""
+    deltas = Counter()
+    for day in WEEKDAYS:
+        old, new = old_choices.get(day), new_choices.get(day)
+        if old == new:
+            continue
+        if old:
+            deltas[(day, old)] -= 1
+        if new:
+            deltas[(day, new)] += 1
+    return {key: delta for key, delta in deltas.items() if delta}
+
+
+def apply_deltas(week_start, class_id, deltas):
+    """Применяет изменения атомарными F()-обновлениями, не более трёх запросов"""
+    if not deltas:
+        return
+
+    with transaction.atomic(savepoint=False):
+        WeeklyDishCounter.objects.bulk_create([
+            WeeklyDishCounter(week_start_date=week_start, class_group_id=class_id, weekday=day, dish_id=dish_id)
+            for (day, dish_id), delta in deltas.items() if delta > 0
+        ], ignore_conflicts=True)
+
+        counters = WeeklyDishCounter.objects.filter(week_start_date=week_start, class_group_id=class_id)
+        for delta in set(deltas.values()):
+            keys = Q()
+            for (day, dish_id), key_delta in deltas.items():
+                if key_delta == delta:
+                    keys |= Q(weekday=day, dish_id=dish_id)
+            counters.filter(keys).update(count=F('count') + delta)
+
+
+def move_pupil_counters(moves):
+    """Переносит вклад учеников в счётчики при переводе: {id ученика: (старый класс, новый класс)}.
+
+    Недельные строки читаются одним запросом, изменения суммируются по
+    неделе и классу.
+    """
+    if not moves:
+        return
+    deltas = {}
+    for weekly in WeeklyBreakfasts.objects.filter(pupil_id__in=list(moves)):
+        old_class_id, new_class_id = moves[weekly.pupil_id]
+        choices = weekly.get_choices()
+        for class_id, week_deltas in ((old_class_id, choice_deltas(choices, {})),
+                                      (new_class_id, choice_deltas({}, choices))):
+            week_counter = deltas.setdefault((weekly.week_start_date, class_id), Counter())
+            week_counter.update(week_deltas)
+    for (week_start, class_id), week_deltas in deltas.items():
+        apply_deltas(week_start, class_id, {key: delta for key, delta in week_deltas.items() if delta})
+
+
+def choice_totals(date_from, date_to, class_ids=None):
+    """Количество порций по дням и блюдам за период одним GROUP BY date, dish.
+
+    Возвращает строки {'date', 'chosen_dish_id', 'chosen_dish__name',
+    'chosen_dish__short_name', 'total'}, упорядоченные по дате.
+    """
+    choices = BreakfastChoice.objects.filter(date__range=(date_from, date_to))
+    if class_ids is not None:
+        choices = choices.filter(pupil__class_group_id__in=class_ids)
+    return choices.values(
+        'date', 'chosen_dish_id', 'chosen_dish__name', 'chosen_dish__short_name'
+    ).annotate(total=Count('id')).order_by('date', '-total', 'chosen_dish__name')
+
+
+@reporting_reads()
+def kitchen_totals(week_start, per_class=False):
+    """Порции по дням и блюдам за неделю из счётчиков WeeklyDishCounter.
+
+    Один запрос независимо от числа учеников; с per_class добавляется
+    разбивка по классам.
+    """
+    fields = ['weekday', 'dish_id', 'dish__name', 'dish__short_name']
+    if per_class:
+        fields += ['class_group_id', 'class_group__name']
+    rows = WeeklyDishCounter.objects.filter(
+        week_start_date=week_start, count__gt=0
+    ).values(*fields).annotate(total=Sum('count')).order_by('dish__name')
+
+    days = {
+        day: {'day': day, 'date': week_start + timedelta(days=offset), 'total': 0, 'dishes': {}, 'classes': {}}
+        for offset, day in enumerate(WEEKDAYS)
+    }
+    for row in rows:
+        day = days[row['weekday']]
+        day['total'] += row['total']
+        dish = day['dishes'].setdefault(row['dish_id'], {
+            'id': row['dish_id'], 'name': row['dish__name'], 'short_name': row['dish__short_name'], 'total': 0,
+        })
+        dish['total'] += row['total']
+        if per_class:
+            class_data = day['classes'].setdefault(row['class_group_id'], {
+                'id': row['class_group_id'], 'name': row['class_group__name'], 'total': 0, 'dishes': {},
+            })
+            class_data['total'] += row['total']
+            class_data['dishes'][row['dish__short_name']] = (
+                class_data['dishes'].get(row['dish__short_name'], 0) + row['total']
+            )
+
+    result = []
+    for day in days.values():
+        day['dishes'] = list(day['dishes'].values())
+        if per_class:
+            day['classes'] = sorted(day['classes'].values(), key=lambda class_data: class_data['name'])
+        else:
+            del day['classes']
+        result.append(day)
+    return result
+
+
+def compute_weekly_counts(week_start):
+    """Счётчики за неделю, посчитанные заново по BreakfastChoice одним запросом.
+
+    Возвращает {(id класса, день, id блюда): количество}.
+    """
+    rows = BreakfastChoice.objects.filter(
+        date__range=(week_start, week_start + timedelta(days=len(WEEKDAYS) - 1))
+    ).values_list('pupil__class_group_id', 'date', 'chosen_dish_id').annotate(count=Count('id')).order_by()
+
+    return {
+        (class_id, WEEKDAYS[date.weekday()], dish_id): count
+        for class_id, date, dish_id, count in rows
+    }
+
+
+@transaction.atomic
+def rebuild_counters(week_start, dry_run=False):
+    """Сверяет счётчики недели с BreakfastChoice и исправляет расхождения.
+
+    Возвращает количество созданных, изменённых и удалённых строк.
+    """
+    actual = compute_weekly_counts(week_start)
+    stored = {
+        (counter.class_group_id, counter.weekday, counter.dish_id): counter
+        for counter in WeeklyDishCounter.objects.select_for_update().filter(week_start_date=week_start)
+    }
+
+    to_create = [
+        WeeklyDishCounter(week_start_date=week_start, class_group_id=class_id, weekday=day,
+                          dish_id=dish_id, count=count)
+        for (class_id, day, dish_id), count in actual.items() if (class_id, day, dish_id) not in stored
+    ]
+    to_update = []
+    to_delete = []
+    for key, counter in stored.items():
+        count = actual.get(key, 0)
+        if not count:
+            to_delete.append(counter.pk)
+        elif counter.count != count:
+            counter.count = count
+            to_update.append(counter)
+
+    if not dry_run:
+        WeeklyDishCounter.objects.bulk_create(to_create)
+        WeeklyDishCounter.objects.bulk_update(to_update, ['count'])
+        WeeklyDishCounter.objects.filter(pk__in=to_delete).delete()
+
+    return {'created': len(to_create), 'updated': len(to_update), 'deleted': len(to_delete)}
+
+
+def change_pupil_counts(deltas):
+    """Сдвигает Class.number_of_pupils на {id класса: изменение} атомарными UPDATE ... SET n = n + d"""
+    classes_by_delta = {}
+    for class_id, delta in deltas.items():
+        if class_id is not None and delta:
+            classes_by_delta.setdefault(delta, []).append(class_id)
+    for delta, class_ids in classes_by_delta.items():
+        Class.objects.filter(id__in=class_ids).update(number_of_pupils=F('number_of_pupils') + delta)
+
+
+def recount_pupils(class_ids=None):
+    """Пересчитывает number_of_pupils по таблице учеников одним UPDATE с подзапросом"""
+    pupils_count = Pupil.objects.filter(class_group=OuterRef('pk')).order_by().values(
+        'class_group'
+    ).annotate(total=Count('pk')).values('total')
+    classes = Class.objects.all() if class_ids is None else Class.objects.filter(id__in=list(class_ids))
+    return classes.update(number_of_pupils=Coalesce(Subquery(pupils_count), 0))
+
+
+def find_pupil_count_drift():
+    """Классы, у которых number_of_pupils расходится с числом учеников: один запрос с GROUP BY.
+
+    Возвращает [(класс, фактическое число учеников)].
+    """
+    classes = Class.objects.annotate(actual=Count('pupil')).exclude(number_of_pupils=F('actual')).order_by('name')
+    return [(class_obj, class_obj.actual) for class_obj in classes]
@@ -0,0 +1,158 @@
+from collections import defaultdict
+
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill, NamedStyle
+from openpyxl.utils import get_column_letter
+from django.db.models import FilteredRelation, Q
+
+from .models import Pupil
+from .routers import reporting_reads
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Файл собирается в памяти, пока не превысит этот размер, дальше - на диске
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+PUPILS_CHUNK_SIZE = 2000
+
+DAYS_MAPPING = {
+    'monday': 'Понедельник',
+    'tuesday': 'Вторник',
+    'wednesday': 'Среда',
+    'thursday': 'Четверг',
+    'friday': 'Пятница'
+}
+
+STATS_HEADERS = ['День недели', 'Вариант 1', 'Вариант 2', 'Не выбрано', 'Выбрали']
+STATS_WIDTHS = [15, 25, 25, 12, 12]
+PUPILS_HEADERS = ['Фамилия', 'Имя', 'Класс', 'Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница']
+PUPILS_WIDTHS = [15, 15, 10, 20, 20, 20, 20, 20]
+
+
+def _add_named_styles(wb):
+    """Общие стили книги: ячейки ссылаются на них по имени, а не хранят копии"""
+    styles = [
+        NamedStyle(name='title', font=Font(bold=True, size=14), alignment=Alignment(horizontal='center')),
+        NamedStyle(name='bold', font=Font(bold=True)),
+        NamedStyle(name='header', font=Font(bold=True),
+                   fill=PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid")),
+        NamedStyle(name='chosen',
+                   fill=PatternFill(start_color="CCFFCC", end_color="CCFFCC", fill_type="solid")),
+        NamedStyle(name='not_chosen',
+                   fill=PatternFill(start_color="FFCCCC", end_color="FFCCCC", fill_type="solid")),
+    ]
+    for style in styles:
+        wb.add_named_style(style)
+
+
+def _cell(ws, value, style):
+    cell = WriteOnlyCell(ws, value=value)
+    cell.style = style
+    return cell
+
+
+def _set_widths(ws, widths):
+    # В режиме write-only ширины задаются до записи первой строки
+    for i, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(i)].width = width
+
+
+def _write_statistics_sheet(wb, stats_data, week_start):
+    ws = wb.create_sheet(title="Статистика")
+    _set_widths(ws, STATS_WIDTHS)
+
+    ws.append([_cell(ws, f'Статистика завтраков с {week_start} по {stats_data["week_end"]}', 'title')])
+    ws.merged_cells.add('A1:E1')
+    ws.append([])
+
+    row = 3
+    for class_stat in stats_data['classes_stats']:
+        class_obj = class_stat['class']
+
+        # Заголовок класса
+        ws.append([_cell(ws, f'Класс: {class_obj.name}', 'bold')])
+        ws.merged_cells.add(f'A{row}:E{row}')
+
+        ws.append([f'Всего учеников: {class_stat["total_pupils"]}'])
+        ws.append([_cell(ws, header, 'header') for header in STATS_HEADERS])
+
+        # Статистика по дням
+        for day_field, day_name in DAYS_MAPPING.items():
+            day_data = class_stat['day_stats'][day_field]
+            dishes_list = list(day_data['dishes'].items())
+
+            option1 = f"{dishes_list[0][0]}: {dishes_list[0][1]}" if dishes_list else "-"
+            option2 = f"{dishes_list[1][0]}: {dishes_list[1][1]}" if len(dishes_list) > 1 else "-"
+
+            ws.append([day_name, option1, option2, day_data['not_chosen'], day_data['chosen']])
+
+        # Пустые строки между классами
+        ws.append([])
+        ws.append([])
+        row += 3 + len(DAYS_MAPPING) + 2
+
+
+@reporting_reads()
+def load_pupil_rows(week_start):
+    """Строки листов учеников, сгруппированные по id класса.
+
+    Ученики, их выбор на неделю и названия блюд читаются одним запросом
+    с LEFT JOIN, поэтому число запросов не зависит от числа учеников.
+    """
+    pupils = Pupil.objects.annotate(
+        week=FilteredRelation('weeklybreakfasts', condition=Q(weeklybreakfasts__week_start_date=week_start))
+    ).order_by('class_group_id', 'last_name', 'first_name').values_list(
+        'class_group_id', 'last_name', 'first_name',
+        *[f'week__{day_field}__short_name' for day_field in DAYS_MAPPING]
+    )
+
+    rows_by_class = defaultdict(list)
+    for class_id, *row in pupils.iterator(chunk_size=PUPILS_CHUNK_SIZE):
+        rows_by_class[class_id].append(row)
+    return rows_by_class
+
+
+def _write_pupils_sheet(wb, class_obj, week_start, rows):
+    ws = wb.create_sheet(title=f"Ученики {class_obj.name}")
+    _set_widths(ws, PUPILS_WIDTHS)
+
+    ws.append([_cell(ws, f'Выборы завтраков - {class_obj.name} (неделя {week_start})', 'title')])
+    ws.merged_cells.add('A1:H1')
+    ws.append([])
+    ws.append([_cell(ws, header, 'header') for header in PUPILS_HEADERS])
+
+    for last_name, first_name, *dishes in rows:
+        row = [last_name, first_name, class_obj.name]
+        for dish in dishes:
+            if dish:
+                row.append(_cell(ws, dish, 'chosen'))
+            else:
+                row.append(_cell(ws, "Не выбрано", 'not_chosen'))
+        ws.append(row)
+
+
+@reporting_reads()
+def write_weekly_workbook(fileobj, week_start, progress=None):
+    """Потоково записывает книгу со статистикой и листами учеников в fileobj.
+
+    progress(done, total) вызывается после каждого записанного листа.
+    """
+    from .cache import cached_weekly_statistics
+
+    wb = openpyxl.Workbook(write_only=True)
+    _add_named_styles(wb)
+
+    stats_data = cached_weekly_statistics(week_start)
+    _write_statistics_sheet(wb, stats_data, week_start)
+
+    rows_by_class = load_pupil_rows(week_start)
+    classes = sorted((class_stat['class'] for class_stat in stats_data['classes_stats']),
+                     key=lambda class_obj: class_obj.name)
+    if progress:
+        progress(1, len(classes) + 1)
+    for done, class_obj in enumerate(classes, 2):
+        _write_pupils_sheet(wb, class_obj, week_start, rows_by_class.get(class_obj.id, []))
+        if progress:
+            progress(done, len(classes) + 1)
+
+    wb.save(fileobj)
@@ -0,0 +1,89 @@
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .cache import get_data_version
+from .excel import SPOOL_MAX_SIZE, write_weekly_workbook
+from .models import ExportJob
+
+logger = logging.getLogger(__name__)
+
+# Выгрузки строятся в потоках этого же процесса, вне цикла запрос-ответ
+_executor = ThreadPoolExecutor(max_workers=settings.EXPORT_WORKERS, thread_name_prefix='export')
+
+
+def request_export(week_start, user=None):
+    """Возвращает задачу выгрузки недели, при необходимости ставя новую в очередь.
+
+    Готовый файл для той же недели и той же версии данных отдаётся повторно,
+    незавершённая задача с теми же параметрами тоже переиспользуется.
+    """
+    version = get_data_version()
+    jobs = ExportJob.objects.filter(week_start_date=week_start, data_version=version)
+
+    done = jobs.filter(status=ExportJob.DONE).first()
+    if done and done.file and done.file.storage.exists(done.file.name):
+        return done
+
+    # Задача, зависшая дольше таймаута (например, процесс перезапустили), не считается живой
+    stale_before = timezone.now() - timedelta(seconds=settings.EXPORT_JOB_TIMEOUT)
+    active = jobs.filter(status__in=[ExportJob.PENDING, ExportJob.RUNNING], created_at__gte=stale_before).first()
+    if active:
+        return active
+
+    job = ExportJob.objects.create(week_start_date=week_start, data_version=version, requested_by=user)
+    transaction.on_commit(lambda: _executor.submit(_run_in_thread, job.pk))
+    return job
+
+
+def run_export_job(job_id):
+    """Строит книгу для задачи и сохраняет её в MEDIA_ROOT/exports/.
+
+    Готовые выгрузки той же недели, поставленные раньше (меньший id), после успеха
+    удаляются вместе с файлами: каждая новая версия данных даёт новый файл,
+    и без этого exports/ рос бы с каждой отправкой формы.
+    """
+    ExportJob.objects.filter(pk=job_id).update(status=ExportJob.RUNNING)
+    job = ExportJob.objects.get(pk=job_id)
+    last_percent = 0
+
+    def progress(done, total):
+        nonlocal last_percent
+        # Пишем в базу только при смене процента, а не на каждый лист
+        percent = min(99, done * 100 // total)
+        if percent != last_percent:
+            ExportJob.objects.filter(pk=job_id).update(progress=percent)
+            last_percent = percent
+
+    try:
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, suffix='.xlsx') as fileobj:
+            write_weekly_workbook(fileobj, job.week_start_date, progress=progress)
+            fileobj.seek(0)
+            job.file.save(f'breakfasts_{job.week_start_date}_v{job.data_version}.xlsx', File(fileobj), save=False)
+        job.status = ExportJob.DONE
+        job.progress = 100
+    except Exception as e:
+        logger.exception('Выгрузка %s завершилась ошибкой', job_id)
+        job.status = ExportJob.FAILED
+        job.error = str(e)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['file', 'status', 'progress', 'error', 'finished_at'])
+    if job.status == ExportJob.DONE:
+        # QuerySet.delete шлёт post_delete по каждой задаче, и сигнал удаляет её файл
+        ExportJob.objects.filter(week_start_date=job.week_start_date, status=ExportJob.DONE,
+                                 pk__lt=job.pk).delete()
+    return job
+
+
+def _run_in_thread(job_id):
+    # У каждого потока своё соединение с базой, закрываем его по завершении задачи
+    try:
+        run_export_job(job_id)
+    finally:
+        connections.close_all()
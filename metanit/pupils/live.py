@@ -0,0 +1,77 @@
+import asyncio
+import json
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Сколько событий может ждать медленный клиент, прежде чем его отключат
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+
+class Publisher:
+    """Раздача событий подписчикам SSE внутри одного процесса.
+
+    publish() можно вызывать из любого потока (обычно из on_commit синхронного
+    view), события доставляются в asyncio-очереди подписчиков через их цикл
+    событий, поэтому открытое соединение не занимает поток.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    @contextmanager
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        subscriber = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        try:
+            yield queue
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, event)
+            except RuntimeError:
+                # Цикл событий уже закрыт - подписчик отпишется сам
+                pass
+
+    @staticmethod
+    def _deliver(queue, event):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            logger.warning('Очередь подписчика SSE переполнена, событие пропущено')
+
+
+publisher = Publisher()
+
+
+def publish_choice_deltas(week_start, class_id, deltas):
+    """Событие об изменении счётчиков: {(день, id блюда): +1/-1} для класса за неделю"""
+    if not deltas or not publisher.subscriber_count:
+        return
+    publisher.publish({
+        'week_start': str(week_start),
+        'class_id': class_id,
+        'deltas': [{'day': day, 'dish_id': dish_id, 'delta': delta} for (day, dish_id), delta in deltas.items()],
+    })
+
+
+def sse_message(data, event=None):
+    """Сообщение в формате text/event-stream"""
+    lines = [f'event: {event}'] if event else []
+    lines.append(f'data: {json.dumps(data, ensure_ascii=False, default=str)}')
+    return '\n'.join(lines) + '\n\n'
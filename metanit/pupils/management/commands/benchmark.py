@@ -0,0 +1,49 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from pupils.benchmark import run_benchmark
+
+
+def parse_size(value):
+    try:
+        classes, pupils = value.lower().split('x')
+        return int(classes), int(pupils)
+    except ValueError:
+        raise CommandError(f'Неверный размер {value!r}, ожидается КЛАССОВxУЧЕНИКОВ, например 30x25')
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный замер /pool/, статистики и выгрузки Excel на синтетических данных. '
+            'Работает во временной тестовой базе, рабочие данные не затрагиваются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='5x25,20x30,60x30',
+                            help='Размеры школы через запятую: КЛАССОВxУЧЕНИКОВ')
+        parser.add_argument('--weeks', type=int, default=4, help='Недель меню и выбора в данных')
+        parser.add_argument('--repeat', type=int, default=20, help='Запросов на каждую страницу')
+        parser.add_argument('--warm', action='store_true', help='Не сбрасывать кэш между запросами')
+        parser.add_argument('--seed', type=int, default=1, help='Зерно генератора случайных чисел')
+        parser.add_argument('--output', help='Файл для результатов в JSON (по умолчанию stdout)')
+
+    def handle(self, *args, **options):
+        sizes = [parse_size(size) for size in options['sizes'].split(',') if size.strip()]
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            result = run_benchmark(sizes, options['weeks'], options['repeat'],
+                                   warm=options['warm'], seed=options['seed'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(result, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(f"Результаты записаны в {options['output']}"))
+        else:
+            self.stdout.write(output)
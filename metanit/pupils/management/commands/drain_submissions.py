@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from pupils.writebehind import drain_submissions
+
+
+class Command(BaseCommand):
+    help = 'Применяет отправки /pool/ из очереди отложенной записи (POOL_WRITE_BEHIND)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Разобрать очередь до конца и выйти')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Пауза между проверками пустой очереди, секунды')
+        parser.add_argument('--batch-size', type=int, help='Отправок в одной транзакции')
+
+    def handle(self, *args, **options):
+        while True:
+            result = drain_submissions(options['batch_size'])
+            if result['submissions']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Отправок: {result['submissions']}, применено: {result['applied']}, "
+                    f"ошибок: {result['failed']}"
+                ))
+                continue
+            if options['once']:
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
@@ -0,0 +1,47 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pupils.snapshots import SnapshotError, freeze_week, unfreeze_week, weeks_to_freeze
+
+
+class Command(BaseCommand):
+    help = ('Замораживает закрытые недели: статистика и книга Excel сохраняются в хранилище снимков '
+            'и больше не пересчитываются. Без --week обрабатывает все закрытые недели (удобно для cron)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--week', action='append', default=[],
+                            help='Любой день недели (ГГГГ-ММ-ДД), можно повторять')
+        parser.add_argument('--unfreeze', action='store_true',
+                            help='Разморозить недели из --week, чтобы они снова считались по данным')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать недели')
+
+    def handle(self, *args, **options):
+        try:
+            weeks = [day - timedelta(days=day.weekday()) for day in map(date.fromisoformat, options['week'])]
+        except ValueError as e:
+            raise CommandError(f'Неверная дата: {e}')
+
+        if options['unfreeze']:
+            if not weeks:
+                raise CommandError('Укажите размораживаемые недели через --week')
+            if options['dry_run']:
+                self.stdout.write(self.style.SUCCESS(f'Будет разморожено недель: {len(weeks)}'))
+                return
+            unfrozen = sum(unfreeze_week(week_start) for week_start in weeks)
+            self.stdout.write(self.style.SUCCESS(f'Разморожено недель: {unfrozen}'))
+            return
+
+        weeks = weeks or weeks_to_freeze()
+        if options['dry_run']:
+            self.stdout.write('\n'.join(str(week_start) for week_start in weeks))
+            self.stdout.write(self.style.SUCCESS(f'Будет заморожено недель: {len(weeks)}'))
+            return
+
+        for week_start in weeks:
+            try:
+                snapshot = freeze_week(week_start)
+            except SnapshotError as e:
+                raise CommandError(str(e))
+            self.stdout.write(f'{week_start}: {snapshot.statistics_sha256[:12]} {snapshot.workbook_sha256[:12]}')
+        self.stdout.write(self.style.SUCCESS(f'Заморожено недель: {len(weeks)}'))
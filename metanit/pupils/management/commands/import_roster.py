@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from pupils.roster import RosterError, import_roster, read_roster
+
+
+class Command(BaseCommand):
+    help = 'Загружает классы и учеников из CSV или XLSX (колонки: класс, фамилия, имя)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу .csv или .xlsx')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, что будет создано')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as fileobj:
+                result = import_roster(read_roster(fileobj, options['path']), dry_run=options['dry_run'])
+        except (OSError, RosterError) as e:
+            raise CommandError(str(e))
+
+        for error in result['errors']:
+            self.stderr.write(error)
+        if options['verbosity'] > 1 or options['dry_run']:
+            for name in result['new_classes']:
+                self.stdout.write(f'+ класс {name}')
+            for class_name, last_name, first_name, _ in result['new_pupils']:
+                self.stdout.write(f'+ {class_name}: {last_name} {first_name}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Новых классов {len(result['new_classes'])}, новых учеников {len(result['new_pupils'])}, "
+            f"уже были в базе {result['existing']}, ошибок {len(result['errors'])}"
+        ))
+        if options['dry_run']:
+            self.stdout.write('Пробный запуск, изменения не сохранены')
@@ -0,0 +1,53 @@
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from pupils.menus import OVERWRITE, SKIP, MenuPlanError, parse_holidays, plan_menus, rotation_from_menus
+from pupils.models import DailyMenu
+
+
+class Command(BaseCommand):
+    help = 'Планирует меню на период, повторяя меню выбранных недель (ротацию)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', required=True, help='Первый день периода (ГГГГ-ММ-ДД)')
+        parser.add_argument('--to', dest='date_to', required=True, help='Последний день периода (ГГГГ-ММ-ДД)')
+        parser.add_argument('--rotation-start', required=True,
+                            help='Понедельник первой недели ротации (ГГГГ-ММ-ДД), меню берутся из базы')
+        parser.add_argument('--rotation-weeks', type=int, default=1, help='Недель в ротации')
+        parser.add_argument('--holiday', action='append', default=[],
+                            help='Каникулы: ГГГГ-ММ-ДД или ГГГГ-ММ-ДД..ГГГГ-ММ-ДД, можно повторять; '
+                                 'добавляются к MENU_HOLIDAYS')
+        parser.add_argument('--overwrite', action='store_true', help='Перезаписывать уже заданные меню')
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать изменения')
+
+    def handle(self, *args, **options):
+        try:
+            date_from = date.fromisoformat(options['date_from'])
+            date_to = date.fromisoformat(options['date_to'])
+            rotation_start = date.fromisoformat(options['rotation_start'])
+        except ValueError as e:
+            raise CommandError(f'Неверная дата: {e}')
+        if options['rotation_weeks'] < 1:
+            raise CommandError('В ротации должна быть хотя бы одна неделя')
+        rotation_start -= timedelta(days=rotation_start.weekday())
+        rotation_end = rotation_start + timedelta(weeks=options['rotation_weeks'], days=-1)
+
+        try:
+            rotation = rotation_from_menus(DailyMenu.objects.filter(date__range=(rotation_start, rotation_end)),
+                                           first_week=rotation_start, weeks=options['rotation_weeks'])
+            result = plan_menus(
+                rotation, date_from, date_to,
+                holidays=parse_holidays(settings.MENU_HOLIDAYS + options['holiday']),
+                conflicts=OVERWRITE if options['overwrite'] else SKIP,
+                dry_run=options['dry_run'],
+            )
+        except MenuPlanError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано {result['created']}, перезаписано {result['updated']}, пропущено {result['skipped']}"
+        ))
+        if options['dry_run']:
+            self.stdout.write('Пробный запуск, изменения не сохранены')
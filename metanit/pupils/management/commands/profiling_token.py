@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from pupils.profiling import PROFILE_HEADER, make_profiling_token
+
+
+class Command(BaseCommand):
+    help = 'Выдаёт подписанный заголовок для профилирования запроса (нужен REQUEST_PROFILING_ENABLED)'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{PROFILE_HEADER}: {make_profiling_token()}')
+        self.stdout.write(self.style.SUCCESS(f'Действует {settings.PROFILING_TOKEN_MAX_AGE} с'))
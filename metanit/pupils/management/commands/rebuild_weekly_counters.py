@@ -0,0 +1,41 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pupils.counters import rebuild_counters
+from pupils.models import WeeklyBreakfasts, WeeklyDishCounter
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики WeeklyDishCounter по выборам учеников и исправляет расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--week', help='Любой день недели (ГГГГ-ММ-ДД), по умолчанию текущая неделя')
+        parser.add_argument('--all', action='store_true', help='Пересчитать все недели')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать расхождения')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            weeks = sorted(
+                set(WeeklyBreakfasts.objects.values_list('week_start_date', flat=True))
+                | set(WeeklyDishCounter.objects.values_list('week_start_date', flat=True))
+            )
+        elif options['week']:
+            try:
+                day = date.fromisoformat(options['week'])
+            except ValueError:
+                raise CommandError(f"Неверная дата: {options['week']}")
+            weeks = [day - timedelta(days=day.weekday())]
+        else:
+            today = date.today()
+            weeks = [today - timedelta(days=today.weekday())]
+
+        for week_start in weeks:
+            result = rebuild_counters(week_start, dry_run=options['dry_run'])
+            self.stdout.write(
+                f"{week_start}: создано {result['created']}, изменено {result['updated']}, "
+                f"удалено {result['deleted']}"
+            )
+
+        if options['dry_run']:
+            self.stdout.write('Пробный запуск, изменения не сохранены')
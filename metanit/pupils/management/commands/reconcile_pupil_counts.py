@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from pupils.counters import find_pupil_count_drift, recount_pupils
+
+
+class Command(BaseCommand):
+    help = 'Сверяет Class.number_of_pupils с числом учеников и исправляет расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Только показать расхождения')
+
+    def handle(self, *args, **options):
+        drift = find_pupil_count_drift()
+        for class_obj, actual in drift:
+            self.stdout.write(f'{class_obj.name}: записано {class_obj.number_of_pupils}, учеников {actual}')
+
+        if drift and not options['dry_run']:
+            recount_pupils(class_obj.id for class_obj, _ in drift)
+
+        self.stdout.write(self.style.SUCCESS(f'Классов с расхождением: {len(drift)}'))
+        if options['dry_run']:
+            self.stdout.write('Пробный запуск, изменения не сохранены')
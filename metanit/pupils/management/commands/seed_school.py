@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from pupils.seeding import seed_school
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу синтетическими классами, учениками, меню и выбором завтраков'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--classes', type=int, default=30, help='Количество классов')
+        parser.add_argument('--pupils', type=int, default=25, help='Учеников в классе')
+        parser.add_argument('--weeks', type=int, default=12, help='Недель меню и выбора, начиная с текущей')
+        parser.add_argument('--choice-rate', type=float, default=0.8, help='Доля дней, на которые сделан выбор')
+        parser.add_argument('--seed', type=int, help='Зерно генератора случайных чисел')
+
+    def handle(self, *args, **options):
+        result = seed_school(
+            classes=options['classes'],
+            pupils_per_class=options['pupils'],
+            weeks=options['weeks'],
+            choice_rate=options['choice_rate'],
+            seed=options['seed'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано: классов {result['classes']}, учеников {result['pupils']}, меню {result['menus']}, "
+            f"недельных строк {result['weekly_rows']}, выборов {result['choices']}"
+        ))
@@ -0,0 +1,103 @@
+from datetime import date, timedelta
+
+from django.db import transaction
+
+from .cache import bump_data_version, bump_menu_version
+from .models import DailyMenu, WEEKDAYS
+
+SKIP = 'skip'
+OVERWRITE = 'overwrite'
+BATCH_SIZE = 1000
+
+
+class MenuPlanError(ValueError):
+    """Неверные параметры планирования меню"""
+
+
+def parse_holidays(values):
+    """Даты каникул и праздников из строк «ГГГГ-ММ-ДД» или «ГГГГ-ММ-ДД..ГГГГ-ММ-ДД»"""
+    holidays = set()
+    for value in values:
+        value = value.strip()
+        if not value:
+            continue
+        first, _, last = value.partition('..')
+        try:
+            first = date.fromisoformat(first.strip())
+            last = date.fromisoformat(last.strip()) if last else first
+        except ValueError:
+            raise MenuPlanError(f'Неверная дата каникул: {value}')
+        holidays.update(first + timedelta(days=offset) for offset in range((last - first).days + 1))
+    return holidays
+
+
+def rotation_from_menus(menus, first_week=None, weeks=None):
+    """Ротация из готовых меню: [неделя -> {номер дня недели: (id варианта 1, id варианта 2)}].
+
+    По умолчанию недели считаются от понедельника самого раннего меню до
+    недели самого позднего включительно.
+    """
+    menus = sorted(menus, key=lambda menu: menu.date)
+    if not menus:
+        raise MenuPlanError('Нет меню для ротации')
+    first_week = first_week or menus[0].date - timedelta(days=menus[0].date.weekday())
+    weeks = weeks or (menus[-1].date - first_week).days // 7 + 1
+    rotation = [{} for _ in range(weeks)]
+    for menu in menus:
+        if menu.date.weekday() < len(WEEKDAYS):
+            rotation[(menu.date - first_week).days // 7][menu.date.weekday()] = (menu.option_1_id, menu.option_2_id)
+    return rotation
+
+
+def school_days(date_from, date_to, holidays=()):
+    day = date_from
+    while day <= date_to:
+        if day.weekday() < len(WEEKDAYS) and day not in holidays:
+            yield day
+        day += timedelta(days=1)
+
+
+def plan_menus(rotation, date_from, date_to, holidays=(), conflicts=SKIP, dry_run=False):
+    """Заполняет DailyMenu на учебные дни периода по ротации одним bulk_create.
+
+    Неделя ротации определяется по календарной неделе от date_from, так что
+    каникулы не сдвигают ротацию. Дни, на которые меню уже есть, пропускаются
+    (conflicts=SKIP) или перезаписываются (OVERWRITE). Возвращает счётчики
+    {'created', 'updated', 'skipped'}.
+    """
+    if conflicts not in (SKIP, OVERWRITE):
+        raise MenuPlanError(f'Неизвестный режим конфликтов: {conflicts}')
+    if date_to < date_from:
+        raise MenuPlanError('Дата окончания раньше даты начала')
+    if not rotation:
+        raise MenuPlanError('Пустая ротация')
+
+    first_week = date_from - timedelta(days=date_from.weekday())
+    menus = []
+    for day in school_days(date_from, date_to, holidays):
+        options = rotation[(day - first_week).days // 7 % len(rotation)].get(day.weekday())
+        if options:
+            menus.append(DailyMenu(date=day, option_1_id=options[0], option_2_id=options[1]))
+
+    with transaction.atomic():
+        existing = set(DailyMenu.objects.filter(date__range=(date_from, date_to)).values_list('date', flat=True))
+        planned = sum(menu.date in existing for menu in menus)
+        result = {
+            'created': len(menus) - planned,
+            'updated': planned if conflicts == OVERWRITE else 0,
+            'skipped': planned if conflicts == SKIP else 0,
+        }
+        if dry_run or not menus:
+            return result
+
+        if conflicts == OVERWRITE:
+            DailyMenu.objects.bulk_create(menus, batch_size=BATCH_SIZE, update_conflicts=True,
+                                          unique_fields=['date'], update_fields=['option_1', 'option_2'])
+        else:
+            DailyMenu.objects.bulk_create(menus, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+        # bulk_create не шлёт сигналов, сбрасываем кэши меню сами
+        transaction.on_commit(bump_menu_version)
+        transaction.on_commit(bump_data_version)
+
+    return result
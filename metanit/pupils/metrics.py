@@ -0,0 +1,91 @@
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+# Границы корзин гистограммы длительности запроса, секунды
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class ViewStats:
+    def __init__(self):
+        self.buckets = [0] * (len(DURATION_BUCKETS) + 1)
+        self.count = 0
+        self.duration_sum = 0.0
+        self.queries_sum = 0
+        self.sql_duration_sum = 0.0
+
+    def observe(self, duration, queries, sql_duration):
+        self.buckets[bisect_left(DURATION_BUCKETS, duration)] += 1
+        self.count += 1
+        self.duration_sum += duration
+        self.queries_sum += queries
+        self.sql_duration_sum += sql_duration
+
+
+class MetricsRegistry:
+    """Метрики запросов в памяти процесса, по имени view"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = defaultdict(ViewStats)
+
+    def observe(self, view, duration, queries, sql_duration):
+        with self._lock:
+            self._views[view].observe(duration, queries, sql_duration)
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {view: vars(stats).copy() | {'buckets': list(stats.buckets)}
+                    for view, stats in self._views.items()}
+
+    def render_prometheus(self):
+        """Метрики в текстовом формате Prometheus"""
+        lines = [
+            '# HELP pupils_request_duration_seconds Request wall time by view.',
+            '# TYPE pupils_request_duration_seconds histogram',
+        ]
+        views = sorted(self.snapshot().items())
+        for view, stats in views:
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS + ('+Inf',), stats['buckets']):
+                cumulative += count
+                lines.append(f'pupils_request_duration_seconds_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+            lines.append(f'pupils_request_duration_seconds_sum{{view="{view}"}} {stats["duration_sum"]:.6f}')
+            lines.append(f'pupils_request_duration_seconds_count{{view="{view}"}} {stats["count"]}')
+
+        lines += [
+            '# HELP pupils_request_sql_queries_total SQL queries executed by view.',
+            '# TYPE pupils_request_sql_queries_total counter',
+        ]
+        lines += [f'pupils_request_sql_queries_total{{view="{view}"}} {stats["queries_sum"]}'
+                  for view, stats in views]
+
+        lines += [
+            '# HELP pupils_request_sql_seconds_total Time spent in SQL by view.',
+            '# TYPE pupils_request_sql_seconds_total counter',
+        ]
+        lines += [f'pupils_request_sql_seconds_total{{view="{view}"}} {stats["sql_duration_sum"]:.6f}'
+                  for view, stats in views]
+        return '\n'.join(lines) + '\n'
+
+
+def render_write_behind(stats):
+    """Гауги очереди отложенной записи /pool/ в формате Prometheus"""
+    return '\n'.join([
+        '# HELP pupils_write_behind_queue_depth Submissions waiting in the write-behind queue.',
+        '# TYPE pupils_write_behind_queue_depth gauge',
+        f'pupils_write_behind_queue_depth {stats["depth"]}',
+        '# HELP pupils_write_behind_queue_lag_seconds Age of the oldest queued submission.',
+        '# TYPE pupils_write_behind_queue_lag_seconds gauge',
+        f'pupils_write_behind_queue_lag_seconds {stats["lag_seconds"]:.3f}',
+        '# HELP pupils_write_behind_failed Queued submissions that failed to apply and wait for an admin.',
+        '# TYPE pupils_write_behind_failed gauge',
+        f'pupils_write_behind_failed {stats["failed"]}',
+    ]) + '\n'
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,121 @@
+import cProfile
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import registry
+from .profiling import QUERIES_LIMIT, profile_trigger, save_profile
+
+logger = logging.getLogger(__name__)
+sql_logger = logging.getLogger('pupils.sql')
+
+
+class QueryTimer:
+    """execute_wrapper: считает SQL-запросы и их суммарное время, пишет медленные в лог"""
+
+    def __init__(self, slow_threshold_ms):
+        self.count = 0
+        self.duration = 0.0
+        self.slow_threshold = slow_threshold_ms / 1000
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.count += 1
+            self.duration += duration
+            if self.slow_threshold and duration >= self.slow_threshold:
+                sql_logger.warning('Медленный запрос %.1f мс: %s', duration * 1000, sql)
+
+
+class QueryRecorder(QueryTimer):
+    """QueryTimer, который дополнительно запоминает текст и время первых limit запросов"""
+
+    def __init__(self, limit):
+        super().__init__(slow_threshold_ms=0)
+        self.limit = limit
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return super().__call__(execute, sql, params, many, context)
+        finally:
+            if len(self.queries) < self.limit:
+                self.queries.append({'sql': sql, 'duration_ms': round((time.perf_counter() - started) * 1000, 3)})
+
+
+class RequestMetricsMiddleware:
+    """Время запроса, число и время SQL-запросов по каждому view.
+
+    Добавляет заголовок Server-Timing и копит гистограммы в metrics.registry.
+    Включается через REQUEST_METRICS_ENABLED.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer(settings.SLOW_QUERY_THRESHOLD_MS)
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        registry.observe(view, duration, timer.count, timer.duration)
+
+        response['Server-Timing'] = (
+            f'app;dur={duration * 1000:.1f}, '
+            f'db;dur={timer.duration * 1000:.1f};desc="{timer.count} queries"'
+        )
+        return response
+
+
+class ProfilingMiddleware:
+    """Выполняет отдельные запросы под cProfile и сохраняет профиль в RequestProfile.
+
+    Запрос профилируется по ?_profile от сотрудника, по подписанному заголовку
+    X-Profile-Token или по случайной выборке (PROFILING_SAMPLE_RATE); остальные
+    запросы проходят без накладных расходов. У потоковых ответов профилируется
+    только подготовка ответа, не отдача содержимого. Включается через
+    REQUEST_PROFILING_ENABLED и должен стоять после AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        trigger = profile_trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+
+        recorder = QueryRecorder(QUERIES_LIMIT)
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration = time.perf_counter() - started
+
+        try:
+            profile = save_profile(request, response, trigger, profiler, duration, recorder)
+        except Exception:
+            # Профиль - побочный продукт: запрос не должен падать из-за хранилища или БД
+            logger.exception('Не удалось сохранить профиль запроса %s %s', request.method, request.path)
+        else:
+            response['X-Profile-Id'] = str(profile.pk)
+        return response
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday']
+
+
+def fill_counters(apps, schema_editor):
+    WeeklyBreakfasts = apps.get_model('pupils', 'WeeklyBreakfasts')
+    WeeklyDishCounter = apps.get_model('pupils', 'WeeklyDishCounter')
+
+    counters = []
+    for day in WEEKDAYS:
+        rows = WeeklyBreakfasts.objects.exclude(**{f'{day}__isnull': True}).values(
+            'week_start_date', 'pupil__class_group_id', f'{day}_id'
+        ).annotate(count=Count('id'))
+        for row in rows:
+            counters.append(WeeklyDishCounter(
+                week_start_date=row['week_start_date'], class_group_id=row['pupil__class_group_id'],
+                weekday=day, dish_id=row[f'{day}_id'], count=row['count'],
+            ))
+    WeeklyDishCounter.objects.bulk_create(counters, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pupils', '0005_alter_class_options_class_number_of_pupils_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='weeklybreakfasts',
+            options={'verbose_name': 'Выбор завтрака на неделю', 'verbose_name_plural': 'Все выборы завтрака на неделю'},
+        ),
+        migrations.CreateModel(
+            name='WeeklyDishCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week_start_date', models.DateField(verbose_name='Дата начала недели')),
+                ('weekday', models.CharField(choices=[('monday', 'Понедельник'), ('tuesday', 'Вторник'), ('wednesday', 'Среда'), ('thursday', 'Четверг'), ('friday', 'Пятница')], max_length=10, verbose_name='День недели')),
+                ('count', models.IntegerField(default=0, verbose_name='Количество')),
+                ('class_group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='pupils.class', verbose_name='Класс')),
+                ('dish', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='pupils.dish', verbose_name='Блюдо')),
+            ],
+            options={
+                'verbose_name': 'Счётчик выбора',
+                'verbose_name_plural': 'Счётчики выбора',
+                'constraints': [models.UniqueConstraint(fields=('week_start_date', 'class_group', 'weekday', 'dish'), name='unique_weekly_dish_counter')],
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
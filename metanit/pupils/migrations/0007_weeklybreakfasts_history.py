@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pupils', '0006_weeklydishcounter'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='weeklybreakfasts',
+            name='pupil',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='pupils.pupil', verbose_name='Ученик'),
+        ),
+        migrations.AddIndex(
+            model_name='pupil',
+            index=models.Index(fields=['class_group', 'last_name', 'first_name'], name='pupil_class_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weeklybreakfasts',
+            index=models.Index(fields=['week_start_date', 'pupil'], name='weekly_week_pupil_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='weeklybreakfasts',
+            constraint=models.UniqueConstraint(fields=('pupil', 'week_start_date'), name='unique_pupil_week'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:38
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday']
+
+
+def copy_weekly_choices(apps, schema_editor):
+    WeeklyBreakfasts = apps.get_model('pupils', 'WeeklyBreakfasts')
+    BreakfastChoice = apps.get_model('pupils', 'BreakfastChoice')
+
+    choices = []
+    for weekly in WeeklyBreakfasts.objects.iterator(chunk_size=2000):
+        for offset, day in enumerate(WEEKDAYS):
+            dish_id = getattr(weekly, f'{day}_id')
+            if dish_id:
+                choices.append(BreakfastChoice(pupil_id=weekly.pupil_id, chosen_dish_id=dish_id,
+                                               date=weekly.week_start_date + timedelta(days=offset)))
+        if len(choices) >= 5000:
+            BreakfastChoice.objects.bulk_create(choices)
+            choices = []
+    BreakfastChoice.objects.bulk_create(choices)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pupils', '0007_weeklybreakfasts_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BreakfastChoice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('chosen_dish', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='pupils.dish', verbose_name='Выбранное блюдо')),
+                ('pupil', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='pupils.pupil', verbose_name='Ученик')),
+            ],
+            options={
+                'verbose_name': 'Выбор завтрака',
+                'verbose_name_plural': 'Выборы завтраков',
+                'indexes': [models.Index(fields=['date', 'chosen_dish', 'pupil'], name='choice_date_dish_idx')],
+                'constraints': [models.UniqueConstraint(fields=('pupil', 'date'), name='unique_pupil_date')],
+            },
+        ),
+        migrations.RunPython(copy_weekly_choices, migrations.RunPython.noop),
+    ]
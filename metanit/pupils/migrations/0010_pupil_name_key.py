@@ -0,0 +1,99 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import Count
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday']
+
+
+def normalize_name(first_name, last_name):
+    # Копия pupils.models.normalize_name на момент миграции
+    return f"{' '.join(last_name.split())} {' '.join(first_name.split())}".casefold().replace('ё', 'е')
+
+
+def merge_duplicate_pupils(apps, schema_editor):
+    """Заполняет name_key и сливает учеников, у которых он совпал внутри класса.
+
+    Остаётся самая ранняя запись. Недели выбора всех дубликатов сливаются с её
+    неделями по дням: для каждого дня берётся выбор из самой поздней строки
+    WeeklyBreakfasts (большего id), где он не пуст, - обычно это исправленная
+    повторная отправка. BreakfastChoice этих недель записывается заново по
+    слитому выбору, счётчики затронутых недель пересчитываются из него.
+    """
+    Pupil = apps.get_model('pupils', 'Pupil')
+    WeeklyBreakfasts = apps.get_model('pupils', 'WeeklyBreakfasts')
+    BreakfastChoice = apps.get_model('pupils', 'BreakfastChoice')
+    WeeklyDishCounter = apps.get_model('pupils', 'WeeklyDishCounter')
+
+    groups = defaultdict(list)
+    pupils = list(Pupil.objects.order_by('id'))
+    for pupil in pupils:
+        pupil.name_key = normalize_name(pupil.first_name, pupil.last_name)
+        groups[pupil.class_group_id, pupil.name_key].append(pupil)
+    Pupil.objects.bulk_update(pupils, ['name_key'], batch_size=1000)
+
+    affected_weeks = set()
+    for keeper, *duplicates in groups.values():
+        if not duplicates:
+            continue
+        pupil_ids = [keeper.id] + [duplicate.id for duplicate in duplicates]
+        weeks = defaultdict(list)
+        for weekly in WeeklyBreakfasts.objects.filter(pupil_id__in=pupil_ids).order_by('id'):
+            weeks[weekly.week_start_date].append(weekly)
+
+        for week_start, rows in weeks.items():
+            if all(weekly.pupil_id == keeper.id for weekly in rows):
+                continue
+            affected_weeks.add(week_start)
+            merged = {}
+            for weekly in rows:
+                for day in WEEKDAYS:
+                    if getattr(weekly, f'{day}_id'):
+                        merged[day] = getattr(weekly, f'{day}_id')
+
+            target = next((weekly for weekly in rows if weekly.pupil_id == keeper.id), rows[-1])
+            WeeklyBreakfasts.objects.filter(id__in=[weekly.id for weekly in rows if weekly is not target]).delete()
+            target.pupil_id = keeper.id
+            for day in WEEKDAYS:
+                setattr(target, f'{day}_id', merged.get(day))
+            target.save()
+
+            BreakfastChoice.objects.filter(
+                pupil_id__in=pupil_ids, date__range=(week_start, week_start + timedelta(days=len(WEEKDAYS) - 1))
+            ).delete()
+            BreakfastChoice.objects.bulk_create([
+                BreakfastChoice(pupil_id=keeper.id, date=week_start + timedelta(days=WEEKDAYS.index(day)),
+                                chosen_dish_id=dish_id)
+                for day, dish_id in merged.items()
+            ])
+        Pupil.objects.filter(id__in=[duplicate.id for duplicate in duplicates]).delete()
+
+    for week_start in affected_weeks:
+        WeeklyDishCounter.objects.filter(week_start_date=week_start).delete()
+        rows = BreakfastChoice.objects.filter(
+            date__range=(week_start, week_start + timedelta(days=len(WEEKDAYS) - 1))
+        ).values('pupil__class_group_id', 'date', 'chosen_dish_id').annotate(total=Count('id'))
+        WeeklyDishCounter.objects.bulk_create([
+            WeeklyDishCounter(week_start_date=week_start, class_group_id=row['pupil__class_group_id'],
+                              weekday=WEEKDAYS[row['date'].weekday()], dish_id=row['chosen_dish_id'],
+                              count=row['total'])
+            for row in rows
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pupils', '0009_exportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pupil',
+            name='name_key',
+            field=models.CharField(default='', editable=False, max_length=101, verbose_name='Ключ имени'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(merge_duplicate_pupils, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pupils', '0010_pupil_name_key'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='pupil',
+            constraint=models.UniqueConstraint(fields=('class_group', 'name_key'), name='unique_pupil_name_key'),
+        ),
+    ]
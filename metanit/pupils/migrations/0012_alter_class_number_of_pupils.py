@@ -0,0 +1,29 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def recount_pupils(apps, schema_editor):
+    """Заменяет введённое вручную number_of_pupils фактическим числом учеников"""
+    Class = apps.get_model('pupils', 'Class')
+    Pupil = apps.get_model('pupils', 'Pupil')
+    pupils_count = Pupil.objects.filter(class_group=OuterRef('pk')).order_by().values(
+        'class_group'
+    ).annotate(total=Count('pk')).values('total')
+    Class.objects.update(number_of_pupils=Coalesce(Subquery(pupils_count), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pupils', '0011_pupil_unique_pupil_name_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='class',
+            name='number_of_pupils',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Количество учеников'),
+        ),
+        migrations.RunPython(recount_pupils, migrations.RunPython.noop),
+    ]
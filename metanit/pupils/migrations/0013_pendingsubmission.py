@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pupils', '0012_alter_class_number_of_pupils'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingSubmission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_name', models.CharField(max_length=50, verbose_name='Имя')),
+                ('last_name', models.CharField(max_length=50, verbose_name='Фамилия')),
+                ('week_start_date', models.DateField(blank=True, null=True, verbose_name='Дата начала недели')),
+                ('choices', models.JSONField(default=dict, verbose_name='Выбор по дням')),
+                ('received_at', models.DateTimeField(auto_now_add=True, verbose_name='Получено')),
+                ('class_group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='pupils.class', verbose_name='Класс')),
+            ],
+            options={
+                'verbose_name': 'Отправка в очереди',
+                'verbose_name_plural': 'Отправки в очереди',
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pupils', '0013_pendingsubmission'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeekSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week_start_date', models.DateField(unique=True, verbose_name='Дата начала недели')),
+                ('statistics_sha256', models.CharField(max_length=64, verbose_name='SHA-256 статистики')),
+                ('workbook_sha256', models.CharField(max_length=64, verbose_name='SHA-256 книги Excel')),
+                ('frozen_at', models.DateTimeField(auto_now_add=True, verbose_name='Заморожена')),
+                ('frozen_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Заморозил')),
+            ],
+            options={
+                'verbose_name': 'Замороженная неделя',
+                'verbose_name_plural': 'Замороженные недели',
+                'ordering': ['-week_start_date'],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pupils', '0015_requestprofile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pendingsubmission',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Неудачных попыток'),
+        ),
+        migrations.AddField(
+            model_name='pendingsubmission',
+            name='error',
+            field=models.TextField(blank=True, verbose_name='Ошибка'),
+        ),
+    ]
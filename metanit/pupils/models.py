@@ -1,10 +1,13 @@
-from django.db import models
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
 
 
 class Class(models.Model):
     name = models.CharField(max_length=10, verbose_name='Название класса')
-    number_of_pupils = models.IntegerField(verbose_name='Количество учеников')
+    # Поддерживается автоматически: сигналы Pupil и PupilQuerySet, сверка - reconcile_pupil_counts
+    number_of_pupils = models.IntegerField(default=0, editable=False, verbose_name='Количество учеников')
 
     class Meta:
         verbose_name = _('Класс')
@@ -14,18 +17,112 @@ class Class(models.Model):
         return f"{self.name}"
 
 
+def clean_name(name):
+    """Имя без лишних пробелов: по краям и повторных внутри"""
+    return ' '.join((name or '').split())
+
+
+def normalize_name(first_name, last_name):
+    """Ключ ученика: «фамилия имя» без учёта регистра, пробелов и различия ё/е"""
+    return f'{clean_name(last_name)} {clean_name(first_name)}'.casefold().replace('ё', 'е')
+
+
+class PupilQuerySet(models.QuerySet):
+    """Массовые операции с учениками, которые сами обновляют Class.number_of_pupils и сбрасывают кэши"""
+
+    def _invalidate_caches(self):
+        # Сигналов массовые операции не шлют: версии данных и подсказок имён меняем после фиксации
+        from .cache import bump_data_version, bump_pupil_version
+
+        transaction.on_commit(bump_data_version, using=self.db)
+        transaction.on_commit(bump_pupil_version, using=self.db)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from collections import Counter
+        from .counters import change_pupil_counts, recount_pupils
+
+        objs = list(objs)
+        if not objs:
+            return super().bulk_create(objs, *args, **kwargs)
+        with transaction.atomic(using=self.db, savepoint=False):
+            created = super().bulk_create(objs, *args, **kwargs)
+            class_counts = Counter(pupil.class_group_id for pupil in objs)
+            if kwargs.get('ignore_conflicts') or kwargs.get('update_conflicts'):
+                # Какие строки реально вставлены, неизвестно - пересчитываем затронутые классы
+                recount_pupils(class_counts)
+            else:
+                change_pupil_counts(class_counts)
+            self._invalidate_caches()
+        return created
+
+    def update(self, **kwargs):
+        from collections import Counter
+        from .counters import change_pupil_counts, move_pupil_counters
+
+        if 'class_group' not in kwargs and 'class_group_id' not in kwargs:
+            rows = super().update(**kwargs)
+            if rows:
+                self._invalidate_caches()
+            return rows
+        with transaction.atomic(using=self.db, savepoint=False):
+            pupils = dict(self.order_by().values_list('pk', 'class_group_id'))
+            moved = Counter(pupils.values())
+            rows = super().update(**kwargs)
+            new_class = kwargs.get('class_group_id', kwargs.get('class_group'))
+            new_class_id = getattr(new_class, 'pk', new_class)
+            deltas = {class_id: -total for class_id, total in moved.items()}
+            deltas[new_class_id] = deltas.get(new_class_id, 0) + sum(moved.values())
+            change_pupil_counts(deltas)
+            # Выбор переведённых учеников переезжает в счётчики нового класса
+            move_pupil_counters({pupil_id: (old_class_id, new_class_id)
+                                 for pupil_id, old_class_id in pupils.items() if old_class_id != new_class_id})
+            if rows:
+                self._invalidate_caches()
+        return rows
+
+
 class Pupil(models.Model):
     first_name = models.CharField(max_length=50, verbose_name='Имя')
     last_name = models.CharField(max_length=50, verbose_name='Фамилия')
     class_group = models.ForeignKey(Class, on_delete=models.CASCADE, verbose_name='Класс')
+    name_key = models.CharField(max_length=101, editable=False, verbose_name='Ключ имени')
+
+    objects = PupilQuerySet.as_manager()
 
     class Meta:
         verbose_name = _('Ученик')
         verbose_name_plural = _('Ученики')
+        indexes = [
+            models.Index(fields=['class_group', 'last_name', 'first_name'], name='pupil_class_name_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['class_group', 'name_key'], name='unique_pupil_name_key'),
+        ]
 
     def __str__(self):
         return f"{self.last_name} {self.first_name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Класс на момент загрузки - чтобы при переводе поправить number_of_pupils обоих классов
+        instance._loaded_class_id = instance.__dict__.get('class_group_id')
+        return instance
+
+    def clean(self):
+        # name_key не редактируется в формах, и ModelForm не проверяет unique_pupil_name_key сам
+        self.name_key = normalize_name(self.first_name, self.last_name)
+        if self.class_group_id and Pupil.objects.filter(
+            class_group_id=self.class_group_id, name_key=self.name_key
+        ).exclude(pk=self.pk).exists():
+            raise ValidationError(f'Ученик «{self}» уже есть в этом классе')
+
+    def save(self, *args, **kwargs):
+        self.name_key = normalize_name(self.first_name, self.last_name)
+        if kwargs.get('update_fields') is not None and {'first_name', 'last_name'} & set(kwargs['update_fields']):
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'name_key'}
+        super().save(*args, **kwargs)
+
 
 class Dish(models.Model):
     short_name = models.CharField(max_length=100, verbose_name='Короткое название блюда')
@@ -55,8 +152,11 @@ class DailyMenu(models.Model):
         return f"Меню на {self.date}"
 
 
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday']
+
+
 class WeeklyBreakfasts(models.Model):
-    pupil = models.OneToOneField(Pupil, on_delete=models.CASCADE, verbose_name="Ученик")
+    pupil = models.ForeignKey(Pupil, on_delete=models.CASCADE, verbose_name="Ученик")
 
     monday = models.ForeignKey(Dish, on_delete=models.SET_NULL,
                                null=True, blank=True, verbose_name="Понедельник",
@@ -79,6 +179,209 @@ class WeeklyBreakfasts(models.Model):
     class Meta:
         verbose_name = _('Выбор завтрака на неделю')
         verbose_name_plural = _('Все выборы завтрака на неделю')
+        # Одна строка на ученика и неделю; история прошлых недель сохраняется
+        constraints = [
+            models.UniqueConstraint(fields=['pupil', 'week_start_date'], name='unique_pupil_week'),
+        ]
+        indexes = [
+            models.Index(fields=['week_start_date', 'pupil'], name='weekly_week_pupil_idx'),
+        ]
 
     def __str__(self):
         return f"{self.pupil}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем выбор, ученика и неделю на момент загрузки, чтобы при
+        # сохранении снять старый вклад в счётчики WeeklyDishCounter
+        instance._loaded_choices = instance.get_choices()
+        instance._loaded_key = instance.get_key()
+        return instance
+
+    def get_key(self):
+        """(ученик, начало недели) - под этим ключом строка учтена в счётчиках"""
+        return self.__dict__.get('pupil_id'), self.__dict__.get('week_start_date')
+
+    def get_choices(self):
+        """Выбор по дням: {'monday': id блюда или None, ...}"""
+        return {day: getattr(self, f'{day}_id') for day in WEEKDAYS}
+
+
+class BreakfastChoice(models.Model):
+    """Выбор ученика на конкретный день.
+
+    Сейчас выбор хранится дважды: любое сохранение WeeklyBreakfasts переносится
+    сюда сигналом post_save в той же транзакции, а таблица класса, которая
+    пишет пачками без сигналов, обновляет обе таблицы сама.
+    Отсюда читают сводки за период (choice_totals) и сверка счётчиков
+    (rebuild_counters); админка, выгрузка в Excel, таблица класса и сигналы
+    счётчиков читают WeeklyBreakfasts.
+    """
+    pupil = models.ForeignKey(Pupil, on_delete=models.CASCADE, verbose_name='Ученик')
+    date = models.DateField(verbose_name='Дата')
+    chosen_dish = models.ForeignKey(Dish, on_delete=models.CASCADE, verbose_name='Выбранное блюдо')
+
+    class Meta:
+        verbose_name = _('Выбор завтрака')
+        verbose_name_plural = _('Выборы завтраков')
+        constraints = [
+            models.UniqueConstraint(fields=['pupil', 'date'], name='unique_pupil_date'),
+        ]
+        indexes = [
+            # Покрывающий индекс для GROUP BY date, chosen_dish (+ join к классу через pupil)
+            models.Index(fields=['date', 'chosen_dish', 'pupil'], name='choice_date_dish_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.pupil} {self.date}: {self.chosen_dish}"
+
+
+class WeeklyDishCounter(models.Model):
+    """Денормализованные счётчики выбора: неделя × класс × день × блюдо"""
+    WEEKDAY_CHOICES = [
+        ('monday', 'Понедельник'),
+        ('tuesday', 'Вторник'),
+        ('wednesday', 'Среда'),
+        ('thursday', 'Четверг'),
+        ('friday', 'Пятница'),
+    ]
+
+    week_start_date = models.DateField(verbose_name='Дата начала недели')
+    class_group = models.ForeignKey(Class, on_delete=models.CASCADE, verbose_name='Класс')
+    weekday = models.CharField(max_length=10, choices=WEEKDAY_CHOICES, verbose_name='День недели')
+    dish = models.ForeignKey(Dish, on_delete=models.CASCADE, verbose_name='Блюдо')
+    count = models.IntegerField(default=0, verbose_name='Количество')
+
+    class Meta:
+        verbose_name = _('Счётчик выбора')
+        verbose_name_plural = _('Счётчики выбора')
+        constraints = [
+            models.UniqueConstraint(fields=['week_start_date', 'class_group', 'weekday', 'dish'],
+                                    name='unique_weekly_dish_counter'),
+        ]
+
+    def __str__(self):
+        return f"{self.week_start_date} {self.class_group} {self.weekday}: {self.dish} = {self.count}"
+
+
+class ExportJob(models.Model):
+    """Фоновая выгрузка недели в Excel: состояние задачи и готовый файл"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    week_start_date = models.DateField(verbose_name='Дата начала недели')
+    data_version = models.BigIntegerField(verbose_name='Версия данных')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, verbose_name='Статус')
+    progress = models.PositiveSmallIntegerField(default=0, verbose_name='Прогресс, %')
+    file = models.FileField(upload_to='exports/', blank=True, verbose_name='Файл')
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL,
+                                     verbose_name='Запросил')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создана')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Завершена')
+
+    class Meta:
+        verbose_name = _('Выгрузка в Excel')
+        verbose_name_plural = _('Выгрузки в Excel')
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['week_start_date', 'data_version'], name='export_week_version_idx'),
+        ]
+
+    def __str__(self):
+        return f"Выгрузка {self.week_start_date} ({self.get_status_display()})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.DONE, self.FAILED)
+
+
+class PendingSubmission(models.Model):
+    """Очередь отправок /pool/ в режиме отложенной записи (POOL_WRITE_BEHIND).
+
+    Строка добавляется уже проверенной и удаляется в той же транзакции, в
+    которой выбор применён, поэтому после падения процесса очередь просто
+    дочитывается заново. Строка, которую не удалось применить, остаётся
+    с текстом ошибки и больше не обрабатывается, пока её не вернут в очередь.
+    """
+    first_name = models.CharField(max_length=50, verbose_name='Имя')
+    last_name = models.CharField(max_length=50, verbose_name='Фамилия')
+    class_group = models.ForeignKey(Class, on_delete=models.CASCADE, verbose_name='Класс')
+    week_start_date = models.DateField(null=True, blank=True, verbose_name='Дата начала недели')
+    choices = models.JSONField(default=dict, verbose_name='Выбор по дням')
+    received_at = models.DateTimeField(auto_now_add=True, verbose_name='Получено')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='Неудачных попыток')
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+
+    class Meta:
+        verbose_name = _('Отправка в очереди')
+        verbose_name_plural = _('Отправки в очереди')
+
+    def __str__(self):
+        return f"{self.last_name} {self.first_name} ({self.received_at})"
+
+
+class WeekSnapshot(models.Model):
+    """Замороженная закрытая неделя: статистика и книга Excel в хранилище по SHA-256 содержимого.
+
+    Пока снимок существует, неделя отдаётся из хранилища без пересчёта;
+    пересчитать её можно, только удалив снимок (разморозив неделю).
+    """
+    week_start_date = models.DateField(unique=True, verbose_name='Дата начала недели')
+    statistics_sha256 = models.CharField(max_length=64, verbose_name='SHA-256 статистики')
+    workbook_sha256 = models.CharField(max_length=64, verbose_name='SHA-256 книги Excel')
+    frozen_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL,
+                                  verbose_name='Заморозил')
+    frozen_at = models.DateTimeField(auto_now_add=True, verbose_name='Заморожена')
+
+    class Meta:
+        verbose_name = _('Замороженная неделя')
+        verbose_name_plural = _('Замороженные недели')
+        ordering = ['-week_start_date']
+
+    def __str__(self):
+        return f"Неделя с {self.week_start_date}"
+
+
+class RequestProfile(models.Model):
+    """Запрос, выполненный под cProfile (ProfilingMiddleware): время, SQL и самые дорогие функции"""
+    PARAM = 'param'
+    HEADER = 'header'
+    SAMPLE = 'sample'
+    TRIGGER_CHOICES = [
+        (PARAM, 'Параметр запроса'),
+        (HEADER, 'Подписанный заголовок'),
+        (SAMPLE, 'Случайная выборка'),
+    ]
+
+    method = models.CharField(max_length=10, verbose_name='Метод')
+    path = models.CharField(max_length=500, verbose_name='Путь')
+    view_name = models.CharField(max_length=200, blank=True, verbose_name='View')
+    status_code = models.PositiveSmallIntegerField(verbose_name='Код ответа')
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES, verbose_name='Причина')
+    duration_ms = models.FloatField(verbose_name='Время, мс')
+    sql_count = models.PositiveIntegerField(verbose_name='SQL-запросов')
+    sql_duration_ms = models.FloatField(verbose_name='Время SQL, мс')
+    queries = models.JSONField(default=list, verbose_name='SQL-запросы')
+    top_functions = models.JSONField(default=list, verbose_name='Функции по суммарному времени')
+    stats_file = models.FileField(upload_to='profiles/', verbose_name='Файл .prof')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL,
+                             verbose_name='Пользователь')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создан')
+
+    class Meta:
+        verbose_name = _('Профиль запроса')
+        verbose_name_plural = _('Профили запросов')
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} мс)"
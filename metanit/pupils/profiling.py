@@ -0,0 +1,112 @@
+import marshal
+import pstats
+import random
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from .models import RequestProfile
+
+PROFILE_PARAM = '_profile'
+PROFILE_HEADER = 'X-Profile-Token'
+TOKEN_SALT = 'pupils.profiling'
+TOKEN_VALUE = 'profile'
+TOP_FUNCTIONS_LIMIT = 50
+QUERIES_LIMIT = 500
+
+
+def make_profiling_token():
+    """Значение заголовка X-Profile-Token, действует PROFILING_TOKEN_MAX_AGE секунд"""
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(TOKEN_VALUE)
+
+
+def check_profiling_token(token):
+    try:
+        value = signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=settings.PROFILING_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return value == TOKEN_VALUE
+
+
+def profile_trigger(request):
+    """Причина профилировать запрос или None.
+
+    Параметр ?_profile работает только для сотрудников, подписанный заголовок -
+    для любого клиента (например, curl без сессии), плюс случайная выборка
+    с долей PROFILING_SAMPLE_RATE.
+    """
+    user = getattr(request, 'user', None)
+    if PROFILE_PARAM in request.GET and user is not None and user.is_staff:
+        return RequestProfile.PARAM
+    token = request.headers.get(PROFILE_HEADER)
+    if token and check_profiling_token(token):
+        return RequestProfile.HEADER
+    if settings.PROFILING_SAMPLE_RATE and random.random() < settings.PROFILING_SAMPLE_RATE:
+        return RequestProfile.SAMPLE
+    return None
+
+
+def top_functions(stats, limit=TOP_FUNCTIONS_LIMIT):
+    """Самые дорогие функции по суммарному (cumulative) времени"""
+    stats.sort_stats(pstats.SortKey.CUMULATIVE)
+    rows = []
+    for func in stats.fcn_list[:limit]:
+        primitive_calls, calls, total_time, cumulative_time, callers = stats.stats[func]
+        rows.append({
+            'function': pstats.func_std_string(func),
+            'calls': calls,
+            'primitive_calls': primitive_calls,
+            'tottime_ms': round(total_time * 1000, 3),
+            'cumtime_ms': round(cumulative_time * 1000, 3),
+        })
+    return rows
+
+
+def save_profile(request, response, trigger, profiler, duration, recorder):
+    """Сохраняет профиль запроса: сводку в БД и сырые данные cProfile в файл .prof.
+
+    Хранятся только PROFILING_MAX_PROFILES последних профилей, иначе случайная
+    выборка по /pool/ копила бы строки и файлы без конца.
+    """
+    stats = pstats.Stats(profiler)
+    match = getattr(request, 'resolver_match', None)
+    user = getattr(request, 'user', None)
+
+    profile = RequestProfile(
+        method=request.method,
+        path=request.get_full_path()[:500],
+        view_name=match.view_name if match else '',
+        status_code=response.status_code,
+        trigger=trigger,
+        duration_ms=duration * 1000,
+        sql_count=recorder.count,
+        sql_duration_ms=recorder.duration * 1000,
+        queries=recorder.queries,
+        top_functions=top_functions(stats),
+        user=user if user is not None and user.is_authenticated else None,
+    )
+    # Тот же формат, что у pstats.Stats.dump_stats: файл открывается snakeviz, pstats и т.п.
+    profile.stats_file.save(f'{timezone.now():%Y%m%d-%H%M%S}.prof', ContentFile(marshal.dumps(stats.stats)),
+                            save=False)
+    try:
+        profile.save()
+    except Exception:
+        profile.stats_file.delete(save=False)
+        raise
+    prune_profiles()
+    return profile
+
+
+def prune_profiles(keep=None):
+    """Удаляет профили старше keep последних (по умолчанию PROFILING_MAX_PROFILES), возвращает их число"""
+    keep = settings.PROFILING_MAX_PROFILES if keep is None else keep
+    if not keep:
+        return 0
+    oldest_kept = RequestProfile.objects.order_by('-id').values_list('id', flat=True)[keep - 1:keep].first()
+    if oldest_kept is None:
+        return 0
+    # QuerySet.delete шлёт post_delete по каждому профилю, и сигнал удаляет его файл .prof
+    deleted, _ = RequestProfile.objects.filter(id__lt=oldest_kept).delete()
+    return deleted
@@ -0,0 +1,82 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.paginator import Paginator
+
+from .counters import choice_totals
+from .models import Class, Pupil, BreakfastChoice, WEEKDAYS
+from .routers import reporting_reads
+
+NOT_CHOSEN = '—'
+
+
+def report_weeks(date_from, date_to):
+    """Понедельники недель, у которых хотя бы один учебный день попадает в период"""
+    week_start = date_from - timedelta(days=date_from.weekday())
+    weeks = []
+    while week_start <= date_to:
+        if max(week_start, date_from) <= min(week_start + timedelta(days=len(WEEKDAYS) - 1), date_to):
+            weeks.append(week_start)
+        week_start += timedelta(weeks=1)
+    return weeks
+
+
+def build_weekly_report(week_dates, class_ids=None):
+    """Матрица класс × ученик × дата и статистика блюд за набор дат.
+
+    Три запроса на любой объём: ученики выбранных классов, их выбор за даты
+    одним списком и GROUP BY по дате и блюду; раскладка по ячейкам - в памяти.
+    """
+    pupils = Pupil.objects.select_related('class_group').order_by('class_group__name', 'last_name', 'first_name')
+    if class_ids:
+        pupils = pupils.filter(class_group_id__in=class_ids)
+
+    choices = BreakfastChoice.objects.filter(date__in=week_dates)
+    if class_ids:
+        choices = choices.filter(pupil__class_group_id__in=class_ids)
+    # choice_by_pupil[pupil_id][date] -> короткое название блюда
+    choice_by_pupil = defaultdict(dict)
+    for pupil_id, day, dish in choices.values_list('pupil_id', 'date', 'chosen_dish__short_name'):
+        choice_by_pupil[pupil_id][day] = dish
+
+    report_data = []
+    for pupil in pupils:
+        if not report_data or report_data[-1]['class'].id != pupil.class_group_id:
+            report_data.append({'class': pupil.class_group, 'pupils': []})
+        pupil_choices = choice_by_pupil.get(pupil.id, {})
+        report_data[-1]['pupils'].append({
+            'pupil': pupil,
+            'daily_choices': [pupil_choices.get(day, NOT_CHOSEN) for day in week_dates],
+        })
+
+    stats_by_date = defaultdict(list)
+    if week_dates:
+        for row in choice_totals(week_dates[0], week_dates[-1], class_ids or None):
+            stats_by_date[row['date']].append(row)
+    dish_statistics = [{'date': day, 'stats': stats_by_date.get(day, [])} for day in week_dates]
+
+    return {'report_data': report_data, 'dish_statistics': dish_statistics}
+
+
+@reporting_reads()
+def report_context(date_from, date_to, class_ids=None, page=1):
+    """Контекст weekly_reports.html: период делится на страницы по одной учебной неделе"""
+    paginator = Paginator(report_weeks(date_from, date_to), 1)
+    page_obj = paginator.get_page(page)
+    week_start = page_obj[0] if page_obj.object_list else date_from
+    week_dates = [
+        day for day in (week_start + timedelta(days=offset) for offset in range(len(WEEKDAYS)))
+        if date_from <= day <= date_to
+    ] if page_obj.object_list else []
+
+    return {
+        **build_weekly_report(week_dates, class_ids),
+        'all_classes': Class.objects.order_by('name'),
+        'selected_classes': list(class_ids or []),
+        'week_dates': week_dates,
+        'week_start': week_dates[0] if week_dates else week_start,
+        'week_end': week_dates[-1] if week_dates else week_start,
+        'date_from': date_from,
+        'date_to': date_to,
+        'page_obj': page_obj,
+    }
@@ -0,0 +1,117 @@
+import codecs
+import csv
+import itertools
+import os
+
+import openpyxl
+from django.db import transaction
+
+from .cache import bump_menu_version
+from .models import Class, Pupil, clean_name, normalize_name
+
+BATCH_SIZE = 1000
+# Первая строка файла считается заголовком, если в первой ячейке одно из этих слов
+HEADER_WORDS = {'класс', 'class'}
+
+
+class RosterError(ValueError):
+    """Файл списка учеников не удалось прочитать"""
+
+
+def read_roster(fileobj, filename):
+    """Строки (класс, фамилия, имя) из CSV или XLSX, файл читается потоково.
+
+    CSV - в UTF-8 (с BOM или без), разделитель «,» или «;»; у XLSX берётся
+    первый лист. Порядок колонок: класс, фамилия, имя.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.xlsx':
+        try:
+            wb = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+        except Exception as e:
+            raise RosterError(f'Не удалось открыть XLSX: {e}')
+        try:
+            yield from _roster_rows(wb.worksheets[0].iter_rows(values_only=True))
+        finally:
+            wb.close()
+    elif extension == '.csv':
+        lines = _decode_lines(fileobj)
+        first_line = next(lines, '')
+        delimiter = ';' if first_line.count(';') > first_line.count(',') else ','
+        yield from _roster_rows(csv.reader(itertools.chain([first_line], lines), delimiter=delimiter))
+    else:
+        raise RosterError('Поддерживаются только файлы .csv и .xlsx')
+
+
+def _decode_lines(fileobj):
+    try:
+        yield from codecs.iterdecode(fileobj, 'utf-8-sig')
+    except UnicodeDecodeError:
+        # Excel по умолчанию сохраняет CSV в cp1251
+        raise RosterError('Файл CSV не в кодировке UTF-8: сохраните его в Excel как «CSV UTF-8» или загрузите XLSX')
+
+
+def _roster_rows(rows):
+    for number, row in enumerate(rows, 1):
+        cells = [clean_name(str(cell)) if cell is not None else '' for cell in (row or [])][:3]
+        if not any(cells):
+            continue
+        if number == 1 and cells[0].casefold() in HEADER_WORDS:
+            continue
+        cells += [''] * (3 - len(cells))
+        yield number, cells
+
+
+def import_roster(rows, dry_run=False):
+    """Создаёт недостающие классы и учеников из строк read_roster пакетами.
+
+    Ученик ищется по (класс, name_key), существующие не меняются;
+    number_of_pupils классов пересчитывает Pupil.objects.bulk_create.
+    С dry_run ничего не записывается, но возвращаются те же списки изменений.
+    """
+    result = {'new_classes': [], 'new_pupils': [], 'existing': 0, 'errors': []}
+    roster = {}
+    for number, (class_name, last_name, first_name) in rows:
+        if not class_name or not last_name or not first_name:
+            result['errors'].append(f'Строка {number}: нужны класс, фамилия и имя')
+            continue
+        if len(class_name) > Class._meta.get_field('name').max_length:
+            result['errors'].append(f'Строка {number}: слишком длинное название класса «{class_name}»')
+            continue
+        roster.setdefault(class_name, {}).setdefault(normalize_name(first_name, last_name), (last_name, first_name))
+
+    with transaction.atomic():
+        # При одинаковых названиях берётся класс, созданный раньше
+        classes = {class_obj.name: class_obj for class_obj in Class.objects.filter(name__in=roster).order_by('-id')}
+        result['new_classes'] = sorted(name for name in roster if name not in classes)
+
+        existing_keys = set(Pupil.objects.filter(
+            class_group__in=classes.values()
+        ).values_list('class_group__name', 'name_key'))
+        for class_name, pupils in sorted(roster.items()):
+            for name_key, (last_name, first_name) in sorted(pupils.items()):
+                if (class_name, name_key) in existing_keys:
+                    result['existing'] += 1
+                else:
+                    result['new_pupils'].append((class_name, last_name, first_name, name_key))
+
+        if dry_run or not (result['new_classes'] or result['new_pupils']):
+            return result
+
+        for class_obj in Class.objects.bulk_create(
+            [Class(name=name) for name in result['new_classes']], batch_size=BATCH_SIZE
+        ):
+            classes[class_obj.name] = class_obj
+
+        # ignore_conflicts: ученика, добавленного параллельно через /pool/, просто пропускаем
+        Pupil.objects.bulk_create([
+            Pupil(class_group=classes[class_name], last_name=last_name, first_name=first_name, name_key=name_key)
+            for class_name, last_name, first_name, name_key in result['new_pupils']
+        ], batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+        # Версии данных и имён меняет Pupil.objects.bulk_create, а новые классы в меню формы /pool/ - здесь
+        if result['new_classes']:
+            transaction.on_commit(bump_menu_version)
+
+    return result
+
@@ -0,0 +1,51 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+_reporting = ContextVar('pupils_reporting_reads', default=False)
+_primary = ContextVar('pupils_primary_reads', default=False)
+
+
+@contextmanager
+def reporting_reads():
+    """Чтения внутри блока (или декорированной функции) уходят на реплику.
+
+    Контекстная переменная не протекает в другие потоки и запросы, поэтому
+    запись и чтение сразу после записи по-прежнему идут в default.
+    """
+    token = _reporting.set(True)
+    try:
+        yield
+    finally:
+        _reporting.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """Чтения внутри блока идут в default, даже из функций с reporting_reads.
+
+    Нужно там, где результат кэшируется под текущей версией данных: данные
+    с отстающей реплики иначе закэшировались бы как свежие.
+    """
+    token = _primary.set(True)
+    try:
+        yield
+    finally:
+        _primary.reset(token)
+
+
+class ReportingRouter:
+    """Отправляет отчётные чтения на реплику, всё остальное - в default"""
+
+    def db_for_read(self, model, **hints):
+        if _reporting.get() and not _primary.get() and settings.REPORTING_DATABASE:
+            return settings.REPORTING_DATABASE
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика - копия default, объекты из обеих баз можно связывать
+        return True
@@ -0,0 +1,81 @@
+import random
+from datetime import date, timedelta
+
+from django.db import transaction
+
+from .counters import rebuild_counters
+from .models import Class, Pupil, Dish, DailyMenu, WeeklyBreakfasts, BreakfastChoice, WEEKDAYS, normalize_name
+
+FIRST_NAMES = ['Анна', 'Мария', 'Иван', 'Пётр', 'Алексей', 'Софья', 'Дарья', 'Михаил', 'Егор', 'Полина']
+LAST_NAMES = ['Иванов', 'Петров', 'Сидоров', 'Смирнов', 'Кузнецов', 'Попов', 'Волков', 'Зайцев', 'Орлов', 'Лебедев']
+DISHES = ['Каша овсяная', 'Омлет', 'Сырники', 'Блины', 'Запеканка', 'Каша гречневая', 'Оладьи', 'Яичница']
+
+BATCH_SIZE = 2000
+
+
+def current_week_start():
+    today = date.today()
+    return today - timedelta(days=today.weekday())
+
+
+@transaction.atomic
+def seed_school(classes, pupils_per_class, weeks, choice_rate=0.8, start=None, seed=None):
+    """Заполняет базу синтетической школой через bulk_create.
+
+    Создаёт классы, учеников, блюда, меню на weeks недель начиная со start
+    и случайный выбор учеников на каждую неделю, затем пересчитывает счётчики.
+    """
+    rnd = random.Random(seed)
+    start = start or current_week_start()
+
+    dishes = Dish.objects.bulk_create([Dish(name=name, short_name=name.split()[0]) for name in DISHES])
+    class_objs = Class.objects.bulk_create([
+        Class(name=f'{number % 11 + 1}{"АБВГДЕЖЗИК"[number // 11 % 10]}{number // 110 or ""}')
+        for number in range(classes)
+    ])
+    pupils = []
+    for class_obj in class_objs:
+        for i in range(pupils_per_class):
+            first_name, last_name = rnd.choice(FIRST_NAMES), f'{rnd.choice(LAST_NAMES)}-{i}'
+            # bulk_create не вызывает save(), ключ имени заполняем сами
+            pupils.append(Pupil(first_name=first_name, last_name=last_name, class_group=class_obj,
+                                name_key=normalize_name(first_name, last_name)))
+    Pupil.objects.bulk_create(pupils, batch_size=BATCH_SIZE)
+
+    week_starts = [start + timedelta(weeks=week) for week in range(weeks)]
+    menus = {}
+    for week_start in week_starts:
+        for offset in range(len(WEEKDAYS)):
+            option_1, option_2 = rnd.sample(dishes, 2)
+            menus[week_start + timedelta(days=offset)] = DailyMenu(
+                date=week_start + timedelta(days=offset), option_1=option_1, option_2=option_2
+            )
+    DailyMenu.objects.bulk_create(menus.values(), batch_size=BATCH_SIZE)
+
+    weekly_rows = []
+    choices = []
+    for week_start in week_starts:
+        for pupil in pupils:
+            weekly = WeeklyBreakfasts(pupil=pupil, week_start_date=week_start)
+            for offset, day in enumerate(WEEKDAYS):
+                if rnd.random() >= choice_rate:
+                    continue
+                day_date = week_start + timedelta(days=offset)
+                menu = menus[day_date]
+                dish = menu.option_1 if rnd.random() < 0.5 else menu.option_2
+                setattr(weekly, day, dish)
+                choices.append(BreakfastChoice(pupil=pupil, date=day_date, chosen_dish=dish))
+            weekly_rows.append(weekly)
+    WeeklyBreakfasts.objects.bulk_create(weekly_rows, batch_size=BATCH_SIZE)
+    BreakfastChoice.objects.bulk_create(choices, batch_size=BATCH_SIZE)
+
+    for week_start in week_starts:
+        rebuild_counters(week_start)
+
+    return {
+        'classes': len(class_objs),
+        'pupils': len(pupils),
+        'menus': len(menus),
+        'weekly_rows': len(weekly_rows),
+        'choices': len(choices),
+    }
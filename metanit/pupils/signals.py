@@ -0,0 +1,169 @@
+from datetime import timedelta
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cache import bump_data_version, bump_menu_version, bump_pupil_version, forget_snapshot
+from .choices import write_breakfast_choices
+from .counters import apply_deltas, change_pupil_counts, choice_deltas, move_pupil_counters
+from .live import publish_choice_deltas
+from .models import (Class, Pupil, Dish, DailyMenu, WeeklyBreakfasts, BreakfastChoice, ExportJob, RequestProfile,
+                     WeekSnapshot, WEEKDAYS)
+from .snapshots import delete_unreferenced_files
+
+
+# Подключён раньше update_counters_on_save: тот обновляет _loaded_key и _loaded_choices
+@receiver(post_save, sender=WeeklyBreakfasts)
+def sync_breakfast_choices(sender, instance, created, raw=False, **kwargs):
+    """Переносит изменение недельной строки в BreakfastChoice при любом сохранении"""
+    if raw:
+        return
+    new_choices = instance.get_choices()
+    new_key = instance.get_key()
+    old_choices = {} if created else getattr(instance, '_loaded_choices', None)
+    old_key = new_key if created else getattr(instance, '_loaded_key', new_key)
+
+    if old_key != new_key:
+        _delete_week_choices(*old_key)
+    if old_key != new_key or old_choices is None:
+        # Строку перенесли или сохранили без загрузки из базы: пишем неделю целиком
+        changed = new_choices
+    else:
+        changed = {day: dish_id for day, dish_id in new_choices.items() if dish_id != old_choices.get(day)}
+    if changed:
+        write_breakfast_choices(instance.pupil_id, instance.week_start_date, changed)
+
+
+@receiver(post_save, sender=WeeklyBreakfasts)
+def update_counters_on_save(sender, instance, created, raw=False, **kwargs):
+    """Переносит изменение выбора ученика в счётчики WeeklyDishCounter"""
+    if raw:
+        return
+    new_choices = instance.get_choices()
+    new_key = instance.get_key()
+    old_choices = {} if created else getattr(instance, '_loaded_choices', {})
+    old_key = new_key if created else getattr(instance, '_loaded_key', new_key)
+
+    if old_key == new_key:
+        _apply_and_publish(instance, new_key, choice_deltas(old_choices, new_choices))
+    else:
+        # Строку перенесли на другую неделю или другому ученику: старый вклад снимаем целиком
+        _apply_and_publish(instance, old_key, choice_deltas(old_choices, {}))
+        _apply_and_publish(instance, new_key, choice_deltas({}, new_choices))
+    instance._loaded_choices = new_choices
+    instance._loaded_key = new_key
+
+
+@receiver(post_delete, sender=WeeklyBreakfasts)
+def update_counters_on_delete(sender, instance, **kwargs):
+    old_choices = getattr(instance, '_loaded_choices', instance.get_choices())
+    _apply_and_publish(instance, getattr(instance, '_loaded_key', instance.get_key()),
+                       choice_deltas(old_choices, {}))
+
+
+def _apply_and_publish(weekly, key, deltas):
+    """Применяет изменения к счётчикам класса ученика из key = (ученик, неделя)"""
+    if not deltas:
+        return
+    pupil_id, week_start = key
+    if pupil_id == weekly.pupil_id:
+        class_id = weekly.pupil.class_group_id
+    else:
+        class_id = Pupil.objects.filter(pk=pupil_id).values_list('class_group_id', flat=True).first()
+    apply_deltas(week_start, class_id, deltas)
+    # Живая панель узнаёт об изменении только после фиксации транзакции
+    transaction.on_commit(partial(publish_choice_deltas, week_start, class_id, deltas))
+
+
+@receiver(post_delete, sender=WeeklyBreakfasts)
+def delete_breakfast_choices(sender, instance, **kwargs):
+    """Удаление недельной строки удаляет и выбор по дням этой недели"""
+    _delete_week_choices(*getattr(instance, '_loaded_key', instance.get_key()))
+
+
+def _delete_week_choices(pupil_id, week_start):
+    BreakfastChoice.objects.filter(
+        pupil_id=pupil_id, date__range=(week_start, week_start + timedelta(days=len(WEEKDAYS) - 1))
+    ).delete()
+
+
+@receiver(post_save, sender=Pupil)
+def update_pupil_count_on_save(sender, instance, created, raw=False, **kwargs):
+    """Новый ученик или перевод в другой класс меняет number_of_pupils"""
+    if raw:
+        return
+    old_class_id = None if created else getattr(instance, '_loaded_class_id', instance.class_group_id)
+    if old_class_id != instance.class_group_id:
+        change_pupil_counts({old_class_id: -1, instance.class_group_id: 1})
+        if old_class_id is not None:
+            move_pupil_counters({instance.pk: (old_class_id, instance.class_group_id)})
+    instance._loaded_class_id = instance.class_group_id
+
+
+@receiver(post_delete, sender=Pupil)
+def update_pupil_count_on_delete(sender, instance, **kwargs):
+    change_pupil_counts({getattr(instance, '_loaded_class_id', None) or instance.class_group_id: -1})
+
+
+@receiver(post_save, sender=WeeklyBreakfasts)
+@receiver(post_delete, sender=WeeklyBreakfasts)
+@receiver(post_save, sender=Pupil)
+@receiver(post_delete, sender=Pupil)
+@receiver(post_save, sender=Class)
+@receiver(post_delete, sender=Class)
+@receiver(post_save, sender=Dish)
+@receiver(post_delete, sender=Dish)
+@receiver(post_save, sender=DailyMenu)
+@receiver(post_delete, sender=DailyMenu)
+def invalidate_statistics(sender, **kwargs):
+    """Сбрасывает кэш статистики после фиксации транзакции"""
+    transaction.on_commit(bump_data_version)
+
+
+@receiver(post_save, sender=Class)
+@receiver(post_delete, sender=Class)
+@receiver(post_save, sender=Dish)
+@receiver(post_delete, sender=Dish)
+@receiver(post_save, sender=DailyMenu)
+@receiver(post_delete, sender=DailyMenu)
+def invalidate_pool_menu(sender, **kwargs):
+    """Сбрасывает кэш меню формы /pool/"""
+    transaction.on_commit(bump_menu_version)
+
+
+@receiver(post_save, sender=Pupil)
+@receiver(post_delete, sender=Pupil)
+@receiver(post_save, sender=Class)
+@receiver(post_delete, sender=Class)
+def invalidate_pupil_names(sender, **kwargs):
+    """Сбрасывает кэш подсказок имён учеников"""
+    transaction.on_commit(bump_pupil_version)
+
+
+@receiver(post_delete, sender=ExportJob)
+def delete_export_file(sender, instance, **kwargs):
+    """Удаляет файл выгрузки вместе с задачей"""
+    if instance.file:
+        instance.file.delete(save=False)
+
+
+@receiver(post_delete, sender=RequestProfile)
+def delete_profile_file(sender, instance, **kwargs):
+    """Удаляет файл .prof вместе с профилем"""
+    if instance.stats_file:
+        instance.stats_file.delete(save=False)
+
+
+@receiver(post_save, sender=WeekSnapshot)
+@receiver(post_delete, sender=WeekSnapshot)
+def invalidate_snapshot(sender, instance, **kwargs):
+    """Заморозка и разморозка недели сразу видны запросам к её статистике и книге"""
+    transaction.on_commit(partial(forget_snapshot, instance.week_start_date))
+
+
+@receiver(post_delete, sender=WeekSnapshot)
+def delete_snapshot_files(sender, instance, **kwargs):
+    """Удаляет файлы размороженной недели, если их содержимое не нужно другим неделям"""
+    transaction.on_commit(partial(delete_unreferenced_files, instance.statistics_sha256, instance.workbook_sha256))
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import tempfile
+from datetime import datetime, timedelta
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .excel import SPOOL_MAX_SIZE, write_weekly_workbook
+from .models import WeeklyBreakfasts, WeekSnapshot
+
+SNAPSHOT_DIR = 'snapshots'
+STATISTICS_SUFFIX = '.json'
+WORKBOOK_SUFFIX = '.xlsx'
+# Только для адресов по хэшу (/api/snapshots/<sha256>...): содержимое по ним никогда не меняется.
+# Адреса недель после разморозки отдают другое содержимое, поэтому там no-cache и ETag
+IMMUTABLE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+
+class SnapshotError(ValueError):
+    """Неделю нельзя заморозить"""
+
+
+def snapshot_name(sha256, suffix):
+    """Путь файла в хранилище по хэшу содержимого: snapshots/ab/ab12….json"""
+    return f'{SNAPSHOT_DIR}/{sha256[:2]}/{sha256}{suffix}'
+
+
+def snapshot_week(sha256, suffix):
+    """Первая неделя, снимок которой ссылается на файл, или None, если файл больше не нужен"""
+    field = 'statistics_sha256' if suffix == STATISTICS_SUFFIX else 'workbook_sha256'
+    return WeekSnapshot.objects.filter(**{field: sha256}).order_by('week_start_date').values_list(
+        'week_start_date', flat=True
+    ).first()
+
+
+def _store(fileobj, suffix):
+    """Кладёт файл в хранилище под именем из его SHA-256; одинаковое содержимое хранится один раз"""
+    fileobj.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: fileobj.read(64 * 1024), b''):
+        digest.update(chunk)
+    sha256 = digest.hexdigest()
+
+    name = snapshot_name(sha256, suffix)
+    if not default_storage.exists(name):
+        fileobj.seek(0)
+        default_storage.save(name, File(fileobj))
+    return sha256
+
+
+def statistics_document(week_start):
+    """Статистика недели в виде JSON-совместимого словаря"""
+    from .cache import cached_weekly_statistics
+
+    stats_data = cached_weekly_statistics(week_start)
+    return {
+        'week_start': week_start,
+        'week_end': week_start + timedelta(days=4),
+        'classes': [
+            {'id': class_stats['class'].id, 'name': class_stats['class'].name,
+             'total_pupils': class_stats['total_pupils'], 'day_stats': class_stats['day_stats']}
+            for class_stats in stats_data['classes_stats']
+        ],
+    }
+
+
+def dump_statistics(document):
+    # Ключи сортируются, чтобы одинаковая статистика давала одинаковый хэш
+    return json.dumps(document, cls=DjangoJSONEncoder, ensure_ascii=False, sort_keys=True).encode()
+
+
+def is_closed(week_start, today=None):
+    """Неделя закрыта, когда наступил следующий понедельник"""
+    today = today or datetime.now().date()
+    return week_start + timedelta(days=7) <= today
+
+
+def freeze_week(week_start, user=None):
+    """Сохраняет статистику и книгу закрытой недели в хранилище и запоминает их хэши.
+
+    Уже замороженная неделя не пересчитывается.
+    """
+    if week_start.weekday():
+        raise SnapshotError(f'{week_start} - не понедельник')
+    if not is_closed(week_start):
+        raise SnapshotError(f'Неделя с {week_start} ещё не закончилась')
+
+    snapshot = WeekSnapshot.objects.filter(week_start_date=week_start).first()
+    if snapshot is not None:
+        return snapshot
+
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as statistics:
+        statistics.write(dump_statistics(statistics_document(week_start)))
+        statistics_sha256 = _store(statistics, STATISTICS_SUFFIX)
+
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as workbook:
+        write_weekly_workbook(workbook, week_start)
+        workbook_sha256 = _store(workbook, WORKBOOK_SUFFIX)
+
+    snapshot, created = WeekSnapshot.objects.get_or_create(
+        week_start_date=week_start,
+        defaults={'statistics_sha256': statistics_sha256, 'workbook_sha256': workbook_sha256, 'frozen_by': user},
+    )
+    return snapshot
+
+
+def unfreeze_week(week_start):
+    """Удаляет снимок недели: следующие запросы снова считают её по данным. True, если снимок был"""
+    deleted, _ = WeekSnapshot.objects.filter(week_start_date=week_start).delete()
+    return bool(deleted)
+
+
+def weeks_to_freeze(today=None):
+    """Закрытые недели с выбором учеников, которые ещё не заморожены"""
+    today = today or datetime.now().date()
+    return list(
+        WeeklyBreakfasts.objects.filter(week_start_date__lte=today - timedelta(days=7))
+        .exclude(week_start_date__in=WeekSnapshot.objects.values('week_start_date'))
+        .order_by('week_start_date').values_list('week_start_date', flat=True).distinct()
+    )
+
+
+def delete_unreferenced_files(statistics_sha256, workbook_sha256):
+    """Удаляет файлы снимка, если на то же содержимое не ссылается другая неделя"""
+    if not WeekSnapshot.objects.filter(statistics_sha256=statistics_sha256).exists():
+        default_storage.delete(snapshot_name(statistics_sha256, STATISTICS_SUFFIX))
+    if not WeekSnapshot.objects.filter(workbook_sha256=workbook_sha256).exists():
+        default_storage.delete(snapshot_name(workbook_sha256, WORKBOOK_SUFFIX))
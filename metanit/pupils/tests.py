@@ -1,3 +1,1467 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import marshal
+import os
+import tempfile
+import threading
+from datetime import date, timedelta
+from unittest.mock import MagicMock, patch
 
-# Create your tests here.
+import openpyxl
+from django.conf import settings
+from django.contrib.admin import helpers
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.utils import load_backend
+from django.test import TestCase, TransactionTestCase, modify_settings, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .admin import WeeklyBreakfastAdmin, get_weekly_statistics
+from .cache import (bump_data_version, cached_kitchen_totals, cached_weekly_statistics, get_data_version,
+                    get_statistics_cache_info)
+from .checks import check_shared_cache
+from .choices import ChoiceError, parse_choices, save_class_week, save_weekly_choices
+from .counters import choice_totals, compute_weekly_counts, kitchen_totals, rebuild_counters
+from .excel import load_pupil_rows, write_weekly_workbook
+from .exports import request_export, run_export_job
+from .live import Publisher, publish_choice_deltas, publisher
+from .menus import OVERWRITE, parse_holidays, plan_menus, rotation_from_menus
+from .metrics import registry
+from .paginators import ESTIMATE_THRESHOLD, EstimatedCountPaginator
+from .profiling import make_profiling_token
+from .roster import RosterError, import_roster, read_roster
+from .routers import reporting_reads
+from .models import (Class, Pupil, Dish, DailyMenu, WeeklyBreakfasts, WeeklyDishCounter, BreakfastChoice,
+                     ExportJob, PendingSubmission, RequestProfile, WeekSnapshot, WEEKDAYS)
+from .seeding import seed_school
+from .snapshots import SnapshotError, freeze_week, snapshot_name, unfreeze_week
+from .writebehind import drain_submissions, queue_stats, requeue_failed
+
+WEEK_START = date(2025, 12, 1)
+
+
+def current_week_start():
+    today = date.today()
+    return today - timedelta(days=today.weekday())
+
+
+def create_class_with_choices(name, pupils, dishes, week_start=WEEK_START):
+    class_obj = Class.objects.create(name=name)
+    # Ещё один ученик без выбора на неделю
+    Pupil.objects.create(first_name='Яна', last_name='Яковлева', class_group=class_obj)
+    for i in range(pupils):
+        pupil = Pupil.objects.create(first_name=f'Имя{i}', last_name=f'Фамилия{i}', class_group=class_obj)
+        WeeklyBreakfasts.objects.create(
+            pupil=pupil, week_start_date=week_start,
+            monday=dishes[i % 2], tuesday=dishes[0], wednesday=None,
+            thursday=dishes[1], friday=dishes[i % 2],
+        )
+    return class_obj
+
+
+class WeeklyStatisticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.dishes = [
+            Dish.objects.create(short_name='Каша', name='Каша овсяная'),
+            Dish.objects.create(short_name='Омлет', name='Омлет с сыром'),
+        ]
+
+    def test_statistics_structure(self):
+        class_obj = create_class_with_choices('5А', 3, self.dishes)
+
+        stats = get_weekly_statistics(WEEK_START)
+
+        self.assertEqual(stats['week_end'], date(2025, 12, 5))
+        [class_stat] = stats['classes_stats']
+        self.assertEqual(class_stat['class'], class_obj)
+        self.assertEqual(class_stat['total_pupils'], 4)
+        day_stats = class_stat['day_stats']
+        self.assertEqual(list(day_stats), ['monday', 'tuesday', 'wednesday', 'thursday', 'friday'])
+        self.assertEqual(list(day_stats['monday']['dishes'].items()), [('Каша', 2), ('Омлет', 1)])
+        self.assertEqual(day_stats['monday']['chosen'], 3)
+        self.assertEqual(day_stats['monday']['not_chosen'], 1)
+        self.assertEqual(day_stats['tuesday']['dishes'], {'Каша': 3})
+        self.assertEqual(day_stats['wednesday'], {'dishes': {}, 'not_chosen': 4, 'chosen': 0})
+
+    def test_other_weeks_are_ignored(self):
+        class_obj = Class.objects.create(name='6Б')
+        pupil = Pupil.objects.create(first_name='Анна', last_name='Иванова', class_group=class_obj)
+        WeeklyBreakfasts.objects.create(pupil=pupil, week_start_date=date(2025, 11, 24), monday=self.dishes[0])
+
+        [class_stat] = get_weekly_statistics(WEEK_START)['classes_stats']
+
+        self.assertEqual(class_stat['day_stats']['monday']['chosen'], 0)
+
+    def test_query_count_does_not_grow_with_classes(self):
+        create_class_with_choices('1А', 2, self.dishes)
+        with self.assertNumQueries(2):
+            get_weekly_statistics(WEEK_START)
+
+        for i in range(10):
+            create_class_with_choices(f'{i + 2}А', 3, self.dishes)
+        with self.assertNumQueries(2):
+            stats = get_weekly_statistics(WEEK_START)
+
+        self.assertEqual(len(stats['classes_stats']), 11)
+
+
+class WeeklyDishCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.porridge = Dish.objects.create(short_name='Каша', name='Каша овсяная')
+        cls.omelette = Dish.objects.create(short_name='Омлет', name='Омлет с сыром')
+        cls.class_obj = Class.objects.create(name='5А')
+        cls.pupil = Pupil.objects.create(first_name='Анна', last_name='Иванова', class_group=cls.class_obj)
+
+    def counters(self):
+        return {
+            (weekday, dish): count
+            for weekday, dish, count in WeeklyDishCounter.objects.filter(count__gt=0)
+            .values_list('weekday', 'dish__short_name', 'count')
+        }
+
+    def test_change_and_clear_choice(self):
+        breakfast = WeeklyBreakfasts.objects.create(pupil=self.pupil, week_start_date=WEEK_START,
+                                                    monday=self.porridge, tuesday=self.porridge)
+        self.assertEqual(self.counters(), {('monday', 'Каша'): 1, ('tuesday', 'Каша'): 1})
+
+        breakfast = WeeklyBreakfasts.objects.get(pk=breakfast.pk)
+        breakfast.monday = self.omelette
+        breakfast.tuesday = None
+        breakfast.save()
+        self.assertEqual(self.counters(), {('monday', 'Омлет'): 1})
+
+        breakfast.delete()
+        self.assertEqual(self.counters(), {})
+
+    def test_moving_row_to_another_week_moves_counters(self):
+        save_weekly_choices(self.pupil, WEEK_START, {'monday': self.porridge.id})
+
+        breakfast = WeeklyBreakfasts.objects.get()
+        breakfast.week_start_date = WEEK_START + timedelta(days=7)
+        breakfast.save()
+
+        self.assertEqual(
+            list(WeeklyDishCounter.objects.filter(count__gt=0).values_list('week_start_date', 'weekday', 'count')),
+            [(WEEK_START + timedelta(days=7), 'monday', 1)]
+        )
+
+    def test_moving_pupil_to_another_class_moves_counters(self):
+        other_class = Class.objects.create(name='6Б')
+        save_weekly_choices(self.pupil, WEEK_START, {'tuesday': self.porridge.id})
+
+        pupil = Pupil.objects.get(pk=self.pupil.pk)
+        pupil.class_group = other_class
+        pupil.save()
+        self.assertEqual(list(WeeklyDishCounter.objects.filter(count__gt=0).values_list('class_group', 'count')),
+                         [(other_class.pk, 1)])
+
+        save_weekly_choices(pupil, WEEK_START, {'tuesday': None})
+        self.assertEqual(self.counters(), {})
+
+        Pupil.objects.filter(pk=pupil.pk).update(class_group=self.class_obj)
+        save_weekly_choices(Pupil.objects.get(pk=pupil.pk), WEEK_START, {'friday': self.omelette.id})
+        Pupil.objects.filter(pk=pupil.pk).update(class_group=other_class)
+        self.assertEqual(list(WeeklyDishCounter.objects.filter(count__gt=0).values_list('class_group', 'count')),
+                         [(other_class.pk, 1)])
+
+    def test_rebuild_fixes_drift(self):
+        save_weekly_choices(self.pupil, WEEK_START, {'friday': self.omelette.id})
+        WeeklyDishCounter.objects.update(count=5)
+        WeeklyDishCounter.objects.create(week_start_date=WEEK_START, class_group=self.class_obj,
+                                         weekday='monday', dish=self.porridge, count=2)
+
+        self.assertEqual(rebuild_counters(WEEK_START, dry_run=True), {'created': 0, 'updated': 1, 'deleted': 1})
+        self.assertEqual(self.counters(), {('friday', 'Омлет'): 5, ('monday', 'Каша'): 2})
+
+        rebuild_counters(WEEK_START)
+        self.assertEqual(self.counters(), {('friday', 'Омлет'): 1})
+
+        WeeklyDishCounter.objects.all().delete()
+        self.assertEqual(rebuild_counters(WEEK_START), {'created': 1, 'updated': 0, 'deleted': 0})
+        self.assertEqual(self.counters(), {('friday', 'Омлет'): 1})
+
+    def test_plain_save_keeps_daily_choices_in_sync(self):
+        breakfast = WeeklyBreakfasts.objects.create(pupil=self.pupil, week_start_date=WEEK_START,
+                                                    monday=self.porridge, friday=self.omelette)
+        self.assertEqual(rebuild_counters(WEEK_START), {'created': 0, 'updated': 0, 'deleted': 0})
+
+        breakfast.monday = None
+        breakfast.wednesday = self.omelette
+        breakfast.save()
+        self.assertEqual(list(BreakfastChoice.objects.order_by('date').values_list('date', 'chosen_dish')),
+                         [(WEEK_START + timedelta(days=2), self.omelette.pk),
+                          (WEEK_START + timedelta(days=4), self.omelette.pk)])
+        rebuild_counters(WEEK_START)
+        self.assertEqual(self.counters(), {('wednesday', 'Омлет'): 1, ('friday', 'Омлет'): 1})
+
+    def test_command_normalizes_week_to_monday(self):
+        save_weekly_choices(self.pupil, WEEK_START, {'friday': self.omelette.id})
+        WeeklyDishCounter.objects.all().delete()
+
+        call_command('rebuild_weekly_counters', '--week', str(WEEK_START + timedelta(days=2)), stdout=io.StringIO())
+
+        self.assertEqual(list(WeeklyDishCounter.objects.values_list('week_start_date', 'count')), [(WEEK_START, 1)])
+
+
+class PupilCountTests(TestCase):
+    def setUp(self):
+        self.class_a = Class.objects.create(name='5А')
+        self.class_b = Class.objects.create(name='6Б')
+
+    def counts(self):
+        return list(Class.objects.order_by('name').values_list('number_of_pupils', flat=True))
+
+    def test_create_move_delete(self):
+        pupil = Pupil.objects.create(first_name='Анна', last_name='Иванова', class_group=self.class_a)
+        Pupil.objects.create(first_name='Борис', last_name='Петров', class_group=self.class_a)
+        self.assertEqual(self.counts(), [2, 0])
+
+        pupil = Pupil.objects.get(pk=pupil.pk)
+        pupil.class_group = self.class_b
+        pupil.save()
+        pupil.save()
+        self.assertEqual(self.counts(), [1, 1])
+
+        pupil.delete()
+        self.assertEqual(self.counts(), [1, 0])
+
+    def test_bulk_operations(self):
+        Pupil.objects.bulk_create([
+            Pupil(first_name=f'Имя{i}', last_name='Фамилия', name_key=f'фамилия имя{i}', class_group=self.class_a)
+            for i in range(5)
+        ])
+        self.assertEqual(self.counts(), [5, 0])
+
+        # ученики и их классы, перевод, по UPDATE на каждое изменение счётчика, недельные строки учеников
+        with self.assertNumQueries(5):
+            Pupil.objects.filter(first_name__in=['Имя0', 'Имя1']).update(class_group=self.class_b)
+        self.assertEqual(self.counts(), [3, 2])
+
+        Pupil.objects.filter(class_group=self.class_a).delete()
+        self.assertEqual(self.counts(), [0, 2])
+
+    def test_bulk_operations_invalidate_caches(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Pupil.objects.bulk_create([Pupil(first_name='Анна', last_name='Иванова', name_key='иванова анна',
+                                             class_group=self.class_a)])
+        cache.clear()
+        [stats_a, stats_b] = cached_weekly_statistics(WEEK_START)['classes_stats']
+        self.assertEqual((stats_a['total_pupils'], stats_b['total_pupils']), (1, 0))
+        self.assertEqual(len(self.client.get(reverse('pupil_names'), {'class': self.class_b.id, 'q': 'ив'})
+                             .json()['pupils']), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Pupil.objects.update(class_group=self.class_b)
+
+        [stats_a, stats_b] = cached_weekly_statistics(WEEK_START)['classes_stats']
+        self.assertEqual((stats_a['total_pupils'], stats_b['total_pupils']), (0, 1))
+        self.assertEqual(len(self.client.get(reverse('pupil_names'), {'class': self.class_b.id, 'q': 'ив'})
+                             .json()['pupils']), 1)
+
+    def test_reconcile_command(self):
+        Pupil.objects.create(first_name='Анна', last_name='Иванова', class_group=self.class_a)
+        Class.objects.filter(pk=self.class_a.pk).update(number_of_pupils=30)
+        out = io.StringIO()
+
+        with self.assertNumQueries(1):
+            call_command('reconcile_pupil_counts', '--dry-run', stdout=out)
+        self.assertIn('5А: записано 30, учеников 1', out.getvalue())
+        self.assertEqual(self.counts(), [30, 0])
+
+        call_command('reconcile_pupil_counts', stdout=io.StringIO())
+        self.assertEqual(self.counts(), [1, 0])
+
+
+class StatisticsCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.dish = Dish.objects.create(short_name='Каша', name='Каша овсяная')
+        cls.class_obj = Class.objects.create(name='5А')
+        cls.pupil = Pupil.objects.create(first_name='Анна', last_name='Иванова', class_group=cls.class_obj)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_repeated_reads_hit_cache(self):
+        cached_weekly_statistics(WEEK_START)
+        with self.assertNumQueries(0):
+            cached_weekly_statistics(WEEK_START)
+
+        info = get_statistics_cache_info()
+        self.assertEqual((info['hits'], info['misses']), (1, 1))
+
+    def test_write_invalidates_after_commit(self):
+        [class_stat] = cached_weekly_statistics(WEEK_START)['classes_stats']
+        self.assertEqual(class_stat['day_stats']['monday']['chosen'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            WeeklyBreakfasts.objects.create(pupil=self.pupil, week_start_date=WEEK_START, monday=self.dish)
+
+        [class_stat] = cached_weekly_statistics(WEEK_START)['classes_stats']
+        self.assertEqual(class_stat['day_stats']['monday']['dishes'], {'Каша': 1})
+
+
+    def test_bump_does_not_reuse_a_version(self):
+        # Второй процесс прочитал ту же версию до первого изменения: incr по get+set дал бы оба раза v+1
+        version = get_data_version()
+        with patch.object(cache, 'incr', side_effect=AssertionError('incr не атомарен в FileBasedCache')):
+            bumped = {bump_data_version() for _ in range(50)}
+
+        self.assertEqual(len(bumped), 50)
+        self.assertNotIn(version, bumped)
+        self.assertIn(get_data_version(), bumped)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ExcelExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.dishes = [
+            Dish.objects.create(short_name='Каша', name='Каша овсяная'),
+            Dish.objects.create(short_name='Омлет', name='Омлет с сыром'),
+        ]
+        create_class_with_choices('5А', 3, cls.dishes, week_start=current_week_start())
+
+    def setUp(self):
+        cache.clear()
+
+    def export(self):
+        self.client.force_login(self.admin)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.get(reverse('admin:pupils_weeklybreakfasts_export_excel'))
+        job = ExportJob.objects.get()
+        self.assertRedirects(response, reverse('admin:pupils_exportjob_status', args=[job.pk]))
+        self.assertEqual(len(callbacks), 1)
+
+        self.assertContains(self.client.get(response.url), 'http-equiv="refresh"')
+        run_export_job(job.pk)
+        self.assertContains(self.client.get(response.url), 'Скачать Excel')
+        response = self.client.get(reverse('admin:pupils_exportjob_download', args=[job.pk]))
+        self.assertEqual(response.status_code, 200)
+        return openpyxl.load_workbook(io.BytesIO(b''.join(response.streaming_content)))
+
+    def test_export_sheets(self):
+        wb = self.export()
+
+        self.assertEqual(wb.sheetnames, ['Статистика', 'Ученики 5А'])
+        ws_stats = wb['Статистика']
+        self.assertIn('A1:E1', ws_stats.merged_cells)
+        self.assertEqual(ws_stats['A3'].value, 'Класс: 5А')
+        self.assertEqual([c.value for c in ws_stats[6]], ['Понедельник', 'Каша: 2', 'Омлет: 1', 1, 3])
+
+        ws_pupils = wb['Ученики 5А']
+        self.assertEqual([c.value for c in ws_pupils[4]],
+                         ['Фамилия0', 'Имя0', '5А', 'Каша', 'Каша', 'Не выбрано', 'Омлет', 'Каша'])
+        self.assertEqual(ws_pupils['F4'].style, 'not_chosen')
+        self.assertEqual(ws_pupils['D4'].style, 'chosen')
+
+    def test_export_query_count_does_not_grow_with_pupils(self):
+        # статистика (2), ученики с выбором (1)
+        with self.assertNumQueries(3):
+            write_weekly_workbook(io.BytesIO(), current_week_start())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(5):
+                create_class_with_choices(f'{i + 6}Б', 10, self.dishes, week_start=current_week_start())
+        fileobj = io.BytesIO()
+        with self.assertNumQueries(3):
+            write_weekly_workbook(fileobj, current_week_start())
+
+        self.assertEqual(len(openpyxl.load_workbook(fileobj).sheetnames), 7)
+
+    def test_load_pupil_rows(self):
+        week_start = current_week_start()
+        class_obj = Class.objects.get(name='5А')
+        Pupil.objects.create(first_name='Яна', last_name='Аксенова', class_group=class_obj)
+
+        with self.assertNumQueries(1):
+            rows = load_pupil_rows(week_start)
+
+        self.assertEqual(rows[class_obj.id][0], ['Аксенова', 'Яна', None, None, None, None, None])
+        self.assertEqual(rows[class_obj.id][1], ['Фамилия0', 'Имя0', 'Каша', 'Каша', None, 'Омлет', 'Каша'])
+        self.assertEqual(len(rows[class_obj.id]), 5)
+        self.assertEqual(load_pupil_rows(week_start + timedelta(days=7))[class_obj.id][1][2:], [None] * 5)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ExportJobTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.dishes = [
+            Dish.objects.create(short_name='Каша', name='Каша овсяная'),
+            Dish.objects.create(short_name='Омлет', name='Омлет с сыром'),
+        ]
+        for i in range(3):
+            create_class_with_choices(f'{i + 5}А', 2, cls.dishes)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_progress_and_result(self):
+        job = request_export(WEEK_START)
+        self.assertEqual(job.status, ExportJob.PENDING)
+
+        run_export_job(job.pk)
+        job.refresh_from_db()
+
+        self.assertEqual((job.status, job.progress), (ExportJob.DONE, 100))
+        self.assertTrue(job.file.name.startswith('exports/'))
+        with job.file.open('rb') as f:
+            self.assertEqual(len(openpyxl.load_workbook(f).sheetnames), 4)
+
+    def test_finished_file_is_reused_until_data_changes(self):
+        job = request_export(WEEK_START)
+        self.assertEqual(request_export(WEEK_START), job)
+        run_export_job(job.pk)
+        self.assertEqual(request_export(WEEK_START), job)
+        self.assertNotEqual(request_export(WEEK_START + timedelta(days=7)), job)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Pupil.objects.filter(class_group__name='5А').first().delete()
+        self.assertNotEqual(request_export(WEEK_START), job)
+
+    def test_newer_export_deletes_superseded_files(self):
+        old_job = request_export(WEEK_START)
+        run_export_job(old_job.pk)
+        old_job.refresh_from_db()
+        other_week = request_export(WEEK_START + timedelta(days=7))
+        run_export_job(other_week.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Pupil.objects.filter(class_group__name='5А').first().delete()
+        run_export_job(request_export(WEEK_START).pk)
+
+        self.assertFalse(ExportJob.objects.filter(pk=old_job.pk).exists())
+        self.assertFalse(old_job.file.storage.exists(old_job.file.name))
+        self.assertEqual(ExportJob.objects.filter(status=ExportJob.DONE).count(), 2)
+
+    def test_failed_job_keeps_error(self):
+        job = request_export(WEEK_START)
+        with patch('pupils.exports.write_weekly_workbook', side_effect=RuntimeError('диск переполнен')), \
+                self.assertLogs('pupils.exports', 'ERROR'):
+            run_export_job(job.pk)
+        job.refresh_from_db()
+
+        self.assertEqual((job.status, job.error), (ExportJob.FAILED, 'диск переполнен'))
+        self.assertNotEqual(request_export(WEEK_START), job)
+
+
+class WeekSnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.dishes = [
+            Dish.objects.create(short_name='Каша', name='Каша овсяная'),
+            Dish.objects.create(short_name='Омлет', name='Омлет с сыром'),
+        ]
+        create_class_with_choices('5А', 2, cls.dishes)
+
+    def setUp(self):
+        cache.clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.client.force_login(self.admin)
+
+    def test_frozen_week_is_served_from_store(self):
+        snapshot = freeze_week(WEEK_START, self.admin)
+        url = reverse('week_statistics', args=[WEEK_START])
+
+        with self.assertNumQueries(3):  # сессия, пользователь, поиск снимка
+            response = self.client.get(url)
+        file_url = reverse('snapshot_file', kwargs={'sha256': snapshot.statistics_sha256, 'suffix': '.json'})
+        self.assertRedirects(response, file_url, fetch_redirect_response=False)
+        self.assertEqual(response['ETag'], f'"{snapshot.statistics_sha256}"')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+
+        response = self.client.get(file_url)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(json.loads(b''.join(response.streaming_content))['classes'][0]['day_stats']['monday']['chosen'], 2)
+
+        # Данные меняются, но замороженная неделя - нет
+        Pupil.objects.filter(first_name='Имя0').delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=f'"{snapshot.statistics_sha256}"')
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(reverse('week_workbook', args=[WEEK_START]), follow=True)
+        self.assertEqual(response['ETag'], f'"{snapshot.workbook_sha256}"')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(len(openpyxl.load_workbook(io.BytesIO(b''.join(response.streaming_content))).sheetnames), 2)
+
+    def test_unfreeze_recomputes_and_removes_files(self):
+        snapshot = freeze_week(WEEK_START)
+        self.assertEqual(freeze_week(WEEK_START), snapshot)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Pupil.objects.filter(first_name='Имя0').delete()
+            self.assertTrue(unfreeze_week(WEEK_START))
+
+        self.assertFalse(os.path.exists(os.path.join(settings.MEDIA_ROOT,
+                                                     snapshot_name(snapshot.statistics_sha256, '.json'))))
+        response = self.client.get(reverse('week_statistics', args=[WEEK_START]),
+                                   HTTP_IF_NONE_MATCH=f'"{snapshot.statistics_sha256}"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertEqual(json.loads(response.content)['classes'][0]['day_stats']['monday']['chosen'], 1)
+        file_url = reverse('snapshot_file', kwargs={'sha256': snapshot.statistics_sha256, 'suffix': '.json'})
+        self.assertEqual(self.client.get(file_url).status_code, 404)
+
+    def test_open_week_cannot_be_frozen(self):
+        with self.assertRaises(SnapshotError):
+            freeze_week(current_week_start())
+        call_command('freeze_weeks', stdout=io.StringIO())
+        self.assertEqual(list(WeekSnapshot.objects.values_list('week_start_date', flat=True)), [WEEK_START])
+
+
+class PoolSubmissionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.porridge = Dish.objects.create(short_name='Каша', name='Каша овсяная')
+        cls.omelette = Dish.objects.create(short_name='Омлет', name='Омлет с сыром')
+        cls.pancakes = Dish.objects.create(short_name='Блины', name='Блины')
+        cls.class_obj = Class.objects.create(name='5А')
+        for i in range(5):
+            DailyMenu.objects.create(date=WEEK_START + timedelta(days=i), option_1=cls.porridge,
+                                     option_2=cls.omelette)
+
+    def submit(self, choices):
+        data = {'first_name': 'Анна', 'last_name': 'Иванова', 'class_name': self.class_obj.id}
+        for day, dish in choices.items():
+            data[f'breakfast_{WEEK_START + timedelta(days=day)}'] = dish.id if dish else 'none'
+        return self.client.post('/pool/', data)
+
+    def test_submission_saves_week(self):
+        self.submit({0: self.porridge, 1: self.omelette, 2: None})
+        self.submit({1: None, 4: self.omelette})
+
+        breakfast = WeeklyBreakfasts.objects.get()
+        self.assertEqual(breakfast.week_start_date, WEEK_START)
+        self.assertEqual(breakfast.get_choices(), {'monday': self.porridge.id, 'tuesday': None,
+                                                   'wednesday': None, 'thursday': None,
+                                                   'friday': self.omelette.id})
+        self.assertEqual(
+            list(BreakfastChoice.objects.order_by('date').values_list('date', 'chosen_dish_id')),
+            [(WEEK_START, self.porridge.id), (WEEK_START + timedelta(days=4), self.omelette.id)]
+        )
+
+    def test_period_totals_single_query(self):
+        self.submit({0: self.porridge, 1: self.omelette})
+        other = Pupil.objects.create(first_name='Борис', last_name='Петров', class_group=self.class_obj)
+        save_weekly_choices(other, WEEK_START, {'monday': self.porridge.id, 'tuesday': self.porridge.id})
+
+        with self.assertNumQueries(1):
+            totals = list(choice_totals(WEEK_START, WEEK_START + timedelta(days=4)))
+
+        self.assertEqual(
+            [(row['date'], row['chosen_dish__name'], row['total']) for row in totals],
+            [(WEEK_START, 'Каша овсяная', 2),
+             (WEEK_START + timedelta(days=1), 'Каша овсяная', 1),
+             (WEEK_START + timedelta(days=1), 'Омлет с сыром', 1)]
+        )
+
+    def test_query_count_does_not_depend_on_days(self):
+        self.submit({0: self.porridge})
+        with self.assertNumQueries(10):
+            self.submit({0: self.omelette})
+        with self.assertNumQueries(10):
+            self.submit({day: self.porridge for day in range(5)})
+
+    def test_new_week_keeps_history(self):
+        next_monday = WEEK_START + timedelta(days=7)
+        DailyMenu.objects.create(date=next_monday, option_1=self.porridge, option_2=self.omelette)
+
+        self.submit({0: self.porridge})
+        self.client.post('/pool/', {'first_name': 'Анна', 'last_name': 'Иванова', 'class_name': self.class_obj.id,
+                                    f'breakfast_{next_monday}': self.omelette.id})
+
+        self.assertEqual(
+            list(WeeklyBreakfasts.objects.order_by('week_start_date').values_list('week_start_date', 'monday_id')),
+            [(WEEK_START, self.porridge.id), (next_monday, self.omelette.id)]
+        )
+
+    def test_dish_outside_menu_is_rejected(self):
+        with self.assertRaises(ChoiceError):
+            parse_choices({f'breakfast_{WEEK_START}': str(self.pancakes.id)})
+        self.submit({0: self.pancakes})
+        self.assertFalse(WeeklyBreakfasts.objects.exists())
+
+
+class ClassWeekGridTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.porridge = Dish.objects.create(short_name='Каша', name='Каша овсяная')
+        cls.omelette = Dish.objects.create(short_name='Омлет', name='Омлет с сыром')
+        cls.pancakes = Dish.objects.create(short_name='Блины', name='Блины')
+        for i in range(5):
+            DailyMenu.objects.create(date=WEEK_START + timedelta(days=i), option_1=cls.porridge,
+                                     option_2=cls.omelette)
+        # Прошлая неделя - чтобы проверить, что запись не задевает другие недели
+        cls.class_obj = create_class_with_choices('5А', 2, [cls.porridge, cls.omelette],
+                                                  week_start=WEEK_START - timedelta(days=7))
+        for pupil in Pupil.objects.filter(first_name__in=['Имя0', 'Имя1']):
+            save_weekly_choices(pupil, WEEK_START, {'monday': cls.porridge.id, 'friday': cls.omelette.id})
+        Pupil.objects.bulk_create([
+            Pupil(first_name=f'Ученик{i}', last_name='Новый', name_key=f'новый ученик{i}', class_group=cls.class_obj)
+            for i in range(27)
+        ])
+
+    def counters(self):
+        return {
+            (counter.class_group_id, counter.weekday, counter.dish_id): counter.count
+            for counter in WeeklyDishCounter.objects.filter(week_start_date=WEEK_START, count__gt=0)
+        }
+
+    def test_whole_class_saved_in_fixed_queries(self):
+        pupils = list(Pupil.objects.filter(class_group=self.class_obj).order_by('id'))
+        grid = {pupil.id: {day: self.omelette.id if i % 2 else self.porridge.id for day in WEEKDAYS}
+                for i, pupil in enumerate(pupils)}
+        grid[pupils[1].id]['monday'] = None
+
+        with self.assertNumQueries(13):
+            result = save_class_week(self.class_obj.id, WEEK_START, grid)
+
+        self.assertEqual(result, {'created': 28, 'updated': 2, 'unchanged': 0})
+        self.assertEqual(WeeklyBreakfasts.objects.filter(week_start_date=WEEK_START).count(), 30)
+        self.assertEqual(BreakfastChoice.objects.filter(date=WEEK_START).count(), 29)
+        self.assertEqual(self.counters(), compute_weekly_counts(WEEK_START))
+
+    def test_invalid_cell_rejects_whole_class(self):
+        pupil = Pupil.objects.get(last_name='Яковлева')
+        with self.assertRaises(ChoiceError):
+            save_class_week(self.class_obj.id, WEEK_START, {
+                pupil.id: {'monday': self.porridge.id, 'tuesday': self.pancakes.id},
+            })
+        self.assertFalse(WeeklyBreakfasts.objects.filter(pupil=pupil).exists())
+
+    def test_admin_grid_saves_posted_cells(self):
+        self.client.force_login(self.admin)
+        url = reverse('admin:pupils_class_week_grid', args=[self.class_obj.id])
+        pupil = Pupil.objects.get(last_name='Яковлева')
+
+        response = self.client.get(url, {'week': str(WEEK_START + timedelta(days=2))})
+        self.assertContains(response, f'name="choice_{pupil.id}_monday"')
+
+        response = self.client.post(f'{url}?week={WEEK_START}', {
+            f'choice_{pupil.id}_monday': self.omelette.id, f'choice_{pupil.id}_tuesday': '',
+        })
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(WeeklyBreakfasts.objects.get(pupil=pupil).get_choices()['monday'], self.omelette.id)
+        self.assertEqual(self.counters(), compute_weekly_counts(WEEK_START))
+
+
+@override_settings(POOL_WRITE_BEHIND=True)
+class WriteBehindTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.porridge = Dish.objects.create(short_name='Каша', name='Каша овсяная')
+        cls.omelette = Dish.objects.create(short_name='Омлет', name='Омлет с сыром')
+        cls.class_obj = Class.objects.create(name='5А')
+        for i in range(5):
+            DailyMenu.objects.create(date=WEEK_START + timedelta(days=i), option_1=cls.porridge,
+                                     option_2=cls.omelette)
+
+    def submit(self, choices, first_name='Анна', last_name='Иванова'):
+        data = {'first_name': first_name, 'last_name': last_name, 'class_name': self.class_obj.id}
+        for day, dish in choices.items():
+            data[f'breakfast_{WEEK_START + timedelta(days=day)}'] = dish.id if dish else 'none'
+        return self.client.post('/pool/', data)
+
+    def test_submission_is_only_queued(self):
+        with self.assertNumQueries(3):
+            self.submit({0: self.porridge, 1: self.omelette})
+
+        self.assertFalse(Pupil.objects.exists())
+        submission = PendingSubmission.objects.get()
+        self.assertEqual(submission.week_start_date, WEEK_START)
+        self.assertEqual(submission.choices, {'monday': self.porridge.id, 'tuesday': self.omelette.id})
+
+    def test_drain_coalesces_with_last_write_wins(self):
+        self.submit({0: self.porridge, 1: self.omelette, 2: self.porridge})
+        self.submit({1: None, 4: self.omelette}, first_name='анна ')
+        self.submit({0: self.omelette})
+        self.submit({0: self.porridge}, first_name='Борис', last_name='Петров')
+
+        result = drain_submissions()
+
+        self.assertEqual(result, {'submissions': 4, 'applied': 2, 'failed': 0})
+        self.assertFalse(PendingSubmission.objects.exists())
+        self.assertEqual(Pupil.objects.count(), 2)
+        anna = WeeklyBreakfasts.objects.get(pupil__last_name='Иванова')
+        self.assertEqual(anna.get_choices(), {'monday': self.omelette.id, 'tuesday': None,
+                                              'wednesday': self.porridge.id, 'thursday': None,
+                                              'friday': self.omelette.id})
+        self.assertEqual(WeeklyDishCounter.objects.get(class_group=self.class_obj, week_start_date=WEEK_START,
+                                                       weekday='monday', dish=self.porridge).count, 1)
+
+    def test_failed_batch_is_replayed(self):
+        self.submit({0: self.porridge})
+        with patch('pupils.writebehind.PendingSubmission.objects.filter', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                drain_submissions()
+
+        self.assertFalse(WeeklyBreakfasts.objects.exists())
+        self.assertEqual(PendingSubmission.objects.count(), 1)
+        self.assertEqual(drain_submissions()['applied'], 1)
+        self.assertEqual(WeeklyBreakfasts.objects.get().monday_id, self.porridge.id)
+
+    def test_failed_group_is_kept_with_error(self):
+        self.submit({0: self.porridge})
+        self.submit({0: self.omelette}, first_name='Борис', last_name='Петров')
+
+        with patch('pupils.writebehind.apply_submission', side_effect=[RuntimeError('нет места'), None]), \
+                self.assertLogs('pupils.writebehind', 'ERROR'):
+            self.assertEqual(drain_submissions(), {'submissions': 2, 'applied': 1, 'failed': 1})
+
+        failed = PendingSubmission.objects.get()
+        self.assertEqual((failed.first_name, failed.error, failed.attempts), ('Анна', 'нет места', 1))
+        self.assertEqual(drain_submissions()['submissions'], 0)
+        self.assertEqual(queue_stats()['failed'], 1)
+
+        requeue_failed(PendingSubmission.objects.all())
+        self.assertEqual(drain_submissions()['applied'], 1)
+        self.assertEqual(WeeklyBreakfasts.objects.get().monday_id, self.porridge.id)
+
+    def test_metrics_report_queue_lag(self):
+        self.submit({0: self.porridge})
+        self.assertEqual(queue_stats()['depth'], 1)
+
+        self.client.force_login(self.admin)
+        body = self.client.get(reverse('metrics')).content.decode()
+
+        self.assertIn('pupils_write_behind_queue_depth 1', body)
+        self.assertIn('pupils_write_behind_queue_lag_seconds', body)
+
+
+class WeeklyReportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.porridge = Dish.objects.create(short_name='Каша', name='Каша овсяная')
+        cls.omelette = Dish.objects.create(short_name='Омлет', name='Омлет с сыром')
+        cls.classes = [Class.objects.create(name=name) for name in ('5А', '6Б')]
+        for class_obj in cls.classes:
+            for i in range(2):
+                pupil = Pupil.objects.create(first_name=f'Имя{i}', last_name=f'Фамилия{i}', class_group=class_obj)
+                for week in range(3):
+                    save_weekly_choices(pupil, WEEK_START + timedelta(weeks=week),
+                                        {'monday': cls.porridge.id, 'tuesday': cls.omelette.id if i else None})
+
+    def get(self, **params):
+        self.client.force_login(self.admin)
+        return self.client.get(reverse('admin:pupils_weeklybreakfasts_reports'), params)
+
+    def test_report_matrix_and_statistics(self):
+        response = self.get(date_from='2025-12-02', date_to='2025-12-19', classes=[self.classes[1].id])
+
+        self.assertEqual(response.context['week_dates'],
+                         [WEEK_START + timedelta(days=offset) for offset in range(1, 5)])
+        [class_data] = response.context['report_data']
+        self.assertEqual(class_data['class'], self.classes[1])
+        self.assertEqual([row['daily_choices'] for row in class_data['pupils']],
+                         [['—', '—', '—', '—'], ['Омлет', '—', '—', '—']])
+        self.assertEqual([(row['chosen_dish__name'], row['total'])
+                          for row in response.context['dish_statistics'][0]['stats']], [('Омлет с сыром', 1)])
+        self.assertEqual(response.context['page_obj'].paginator.num_pages, 3)
+        self.assertContains(response, 'Следующая неделя')
+
+    def test_query_count_does_not_grow_with_range_or_classes(self):
+        self.client.force_login(self.admin)
+        url = reverse('admin:pupils_weeklybreakfasts_reports')
+        # сессия + пользователь, ученики, выбор, статистика блюд, классы для формы
+        with self.assertNumQueries(6):
+            self.client.get(url, {'date_from': '2025-12-01', 'date_to': '2025-12-05'})
+        with self.assertNumQueries(6):
+            response = self.client.get(url, {'date_from': '2025-09-01', 'date_to': '2025-12-31', 'page': 15})
+        self.assertEqual(response.context['week_start'], date(2025, 12, 8))
+        self.assertEqual(len(response.context['report_data']), 2)
+
+    def test_invalid_dates_fall_back_to_current_week(self):
+        response = self.get(date_from='вчера')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['week_start'], current_week_start())
+
+
+@override_settings(DATABASE_ROUTERS=['pupils.routers.ReportingRouter'], REPORTING_DATABASE='replica')
+class ReportingRouterTests(TransactionTestCase):
+    """default и отдельная SQLite-база вместо реплики; реплика намеренно не синхронизируется"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.replica_file = tempfile.NamedTemporaryFile(suffix='.sqlite3', delete=False)
+        cls.replica_file.close()
+        replica_settings = {**connections.settings['default'], 'NAME': cls.replica_file.name}
+        connections['replica'] = load_backend(replica_settings['ENGINE']).DatabaseWrapper(replica_settings, 'replica')
+        call_command('migrate', database='replica', verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections['replica']
+        os.unlink(cls.replica_file.name)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.dish = Dish.objects.create(short_name='Каша', name='Каша овсяная')
+        create_class_with_choices('5А', 2, [self.dish, self.dish])
+
+    def test_reporting_reads_go_to_replica(self):
+        with reporting_reads():
+            self.assertEqual(Pupil.objects.all().db, 'replica')
+            self.assertEqual(Pupil.objects.count(), 0)
+        self.assertEqual(get_weekly_statistics(WEEK_START)['classes_stats'], [])
+        self.assertEqual(kitchen_totals(WEEK_START)[0]['total'], 0)
+        self.assertEqual(Pupil.objects.count(), 3)
+
+    def test_writes_stay_on_default(self):
+        with reporting_reads():
+            Class.objects.create(name='6Б')
+            self.assertFalse(Class.objects.filter(name='6Б').exists())
+        self.assertTrue(Class.objects.filter(name='6Б').exists())
+
+    def test_cached_results_are_read_from_default(self):
+        # Кэш хранится под текущей версией данных - отстающая реплика туда попадать не должна
+        cache.clear()
+        self.assertEqual(cached_kitchen_totals(WEEK_START)[0]['total'], 2)
+        self.assertEqual(len(cached_weekly_statistics(WEEK_START)['classes_stats']), 1)
+
+    @override_settings(REPORTING_DATABASE=None)
+    def test_without_replica_reads_default(self):
+        with reporting_reads():
+            self.assertEqual(Pupil.objects.count(), 3)
+
+
+class PupilIdentityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.porridge = Dish.objects.create(short_name='Каша', name='Каша овсяная')
+        cls.omelette = Dish.objects.create(short_name='Омлет', name='Омлет с сыром')
+        cls.class_obj = Class.objects.create(name='5А')
+        DailyMenu.objects.create(date=WEEK_START, option_1=cls.porridge, option_2=cls.omelette)
+
+    def setUp(self):
+        cache.clear()
+
+    def submit(self, first_name, last_name, dish):
+        return self.client.post('/pool/', {'first_name': first_name, 'last_name': last_name,
+                                           'class_name': self.class_obj.id, f'breakfast_{WEEK_START}': dish.id})
+
+    def test_name_variants_are_one_pupil(self):
+        self.submit(' Анна ', 'ЁЛКИНА  ', self.porridge)
+        self.submit('анна', 'Елкина', self.omelette)
+
+        pupil = Pupil.objects.get()
+        self.assertEqual((pupil.last_name, pupil.first_name, pupil.name_key), ('ЁЛКИНА', 'Анна', 'елкина анна'))
+        self.assertEqual(BreakfastChoice.objects.get().chosen_dish, self.omelette)
+
+    def test_other_class_is_other_pupil(self):
+        other_class = Class.objects.create(name='6Б')
+        Pupil.objects.create(first_name='Анна', last_name='Ёлкина', class_group=self.class_obj)
+        Pupil.objects.create(first_name='Анна', last_name='Ёлкина', class_group=other_class)
+
+        self.assertEqual(Pupil.objects.filter(name_key='елкина анна').count(), 2)
+
+    def test_admin_rejects_duplicate_name(self):
+        Pupil.objects.create(first_name='Анна', last_name='Ёлкина', class_group=self.class_obj)
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+        response = self.client.post(reverse('admin:pupils_pupil_add'), {
+            'first_name': 'анна', 'last_name': ' Елкина', 'class_group': self.class_obj.pk,
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['adminform'].form.non_field_errors(),
+                         ['Ученик «Елкина анна» уже есть в этом классе'])
+        self.assertEqual(Pupil.objects.count(), 1)
+
+    def test_autocomplete_from_cache(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for first_name, last_name in [('Анна', 'Ёлкина'), ('Борис', 'Петров'), ('Пётр', 'Аксенов')]:
+                Pupil.objects.create(first_name=first_name, last_name=last_name, class_group=self.class_obj)
+        url = reverse('pupil_names')
+
+        response = self.client.get(url, {'class': self.class_obj.id, 'q': 'ЕЛК'})
+        self.assertEqual(response.json(), {'pupils': [{'last_name': 'Ёлкина', 'first_name': 'Анна'}]})
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'class': self.class_obj.id, 'q': 'пе'})
+        self.assertEqual([pupil['last_name'] for pupil in response.json()['pupils']], ['Аксенов', 'Петров'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Pupil.objects.create(first_name='Вера', last_name='Петрова', class_group=self.class_obj)
+        response = self.client.get(url, {'class': self.class_obj.id, 'q': 'петр'})
+        self.assertEqual(len(response.json()['pupils']), 3)  # Петров, Петрова и Пётр
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+    def test_autocomplete_requires_two_letters(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Pupil.objects.create(first_name='Анна', last_name='Ёлкина', class_group=self.class_obj)
+        url = reverse('pupil_names')
+
+        for query in ('', 'е', ' Ё '):
+            with self.subTest(q=query), self.assertNumQueries(0):
+                response = self.client.get(url, {'class': self.class_obj.id, 'q': query})
+                self.assertEqual(response.json(), {'pupils': []})
+        response = self.client.get(url, {'class': self.class_obj.id, 'q': 'ел'})
+        self.assertEqual(len(response.json()['pupils']), 1)
+
+
+class RosterImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.class_obj = Class.objects.create(name='5А')
+        Pupil.objects.create(first_name='Анна', last_name='Ёлкина', class_group=cls.class_obj)
+
+    def csv_rows(self, text):
+        return read_roster(io.BytesIO(text.encode('utf-8-sig')), 'roster.csv')
+
+    def test_dry_run_and_import(self):
+        text = 'Класс;Фамилия;Имя\n5А;Елкина;анна\n5А;Петров;Борис\n6Б;Орлов;Егор\n6Б; орлов ;Егор\n;Без;Класса\n'
+
+        result = import_roster(self.csv_rows(text), dry_run=True)
+        self.assertEqual(result['new_classes'], ['6Б'])
+        self.assertEqual([pupil[:3] for pupil in result['new_pupils']],
+                         [('5А', 'Петров', 'Борис'), ('6Б', 'Орлов', 'Егор')])
+        self.assertEqual((result['existing'], result['errors']), (1, ['Строка 6: нужны класс, фамилия и имя']))
+        self.assertEqual(Pupil.objects.count(), 1)
+
+        # классы, ученики, создание классов и учеников, пересчёт number_of_pupils, SAVEPOINT и RELEASE
+        with self.captureOnCommitCallbacks() as callbacks, self.assertNumQueries(7):
+            import_roster(self.csv_rows(text))
+        self.assertEqual(len(callbacks), 3)
+        self.assertEqual(dict(Class.objects.values_list('name', 'number_of_pupils')), {'5А': 2, '6Б': 1})
+        self.assertEqual(import_roster(self.csv_rows(text))['existing'], 3)
+
+    def test_non_utf8_csv_is_rejected(self):
+        rows = read_roster(io.BytesIO('Класс;Фамилия;Имя\n5А;Петров;Борис\n'.encode('cp1251')), 'roster.csv')
+        with self.assertRaisesMessage(RosterError, 'UTF-8'):
+            import_roster(rows)
+
+        self.client.force_login(self.admin)
+        roster = io.BytesIO('5А;Петров;Борис\n'.encode('cp1251'))
+        roster.name = 'roster.csv'
+        response = self.client.post(reverse('admin:pupils_class_import_roster'), {'roster': roster, 'dry_run': '1'})
+        self.assertContains(response, 'не в кодировке UTF-8')
+
+    def test_admin_upload_xlsx(self):
+        wb = openpyxl.Workbook()
+        wb.active.append(['Класс', 'Фамилия', 'Имя'])
+        for i in range(30):
+            wb.active.append([f'{i % 3 + 7}В', f'Фамилия{i}', 'Имя'])
+        upload = io.BytesIO()
+        wb.save(upload)
+        upload.seek(0)
+        upload.name = 'roster.xlsx'
+
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('admin:pupils_class_import_roster'), {'roster': upload})
+
+        self.assertRedirects(response, reverse('admin:pupils_class_changelist'))
+        self.assertEqual(Class.objects.get(name='8В').number_of_pupils, 10)
+        self.assertEqual(Pupil.objects.count(), 31)
+
+    def test_unsupported_file(self):
+        with self.assertRaises(RosterError):
+            import_roster(read_roster(io.BytesIO(b''), 'roster.txt'))
+
+
+class MenuPlannerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.dishes = [Dish.objects.create(short_name=f'Блюдо{i}', name=f'Блюдо {i}') for i in range(4)]
+        # Двухнедельная ротация: 1-2 декабря и 8 декабря
+        cls.template = [
+            DailyMenu.objects.create(date=WEEK_START, option_1=cls.dishes[0], option_2=cls.dishes[1]),
+            DailyMenu.objects.create(date=WEEK_START + timedelta(days=1), option_1=cls.dishes[1],
+                                     option_2=cls.dishes[2]),
+            DailyMenu.objects.create(date=WEEK_START + timedelta(days=7), option_1=cls.dishes[2],
+                                     option_2=cls.dishes[3]),
+        ]
+
+    def menus(self):
+        return {day: (option_1 - self.dishes[0].id, option_2 - self.dishes[0].id)
+                for day, option_1, option_2 in DailyMenu.objects.values_list('date', 'option_1', 'option_2')}
+
+    def test_rotation_skips_weekends_and_holidays(self):
+        rotation = rotation_from_menus(self.template)
+        date_from, date_to = date(2026, 1, 5), date(2026, 1, 31)
+
+        with self.assertNumQueries(4):  # существующие даты, вставка и точка сохранения
+            result = plan_menus(rotation, date_from, date_to, holidays=parse_holidays(['2026-01-19..2026-01-20']))
+
+        # 19-20 января - каникулы, но ротация идёт по календарным неделям и не сдвигается
+        self.assertEqual(result, {'created': 4, 'updated': 0, 'skipped': 0})
+        self.assertEqual({day: options for day, options in self.menus().items() if day >= date_from}, {
+            date(2026, 1, 5): (0, 1), date(2026, 1, 6): (1, 2),
+            date(2026, 1, 12): (2, 3),
+            date(2026, 1, 26): (2, 3),
+        })
+
+    def test_conflicts_skip_or_overwrite(self):
+        rotation = [{0: (self.dishes[3].id, self.dishes[2].id)}]
+        period = (WEEK_START, WEEK_START + timedelta(days=13))
+
+        self.assertEqual(plan_menus(rotation, *period), {'created': 0, 'updated': 0, 'skipped': 2})
+        self.assertEqual(self.menus()[WEEK_START], (0, 1))
+        self.assertEqual(plan_menus(rotation, *period, conflicts=OVERWRITE),
+                         {'created': 0, 'updated': 2, 'skipped': 0})
+        self.assertEqual(self.menus()[WEEK_START], (3, 2))
+        self.assertEqual(DailyMenu.objects.count(), 3)
+
+    def test_admin_action(self):
+        self.client.force_login(self.admin)
+        url = reverse('admin:pupils_dailymenu_changelist')
+        data = {'action': 'plan_term', helpers.ACTION_CHECKBOX_NAME: [menu.pk for menu in self.template[:2]]}
+
+        self.assertContains(self.client.post(url, data), 'Планирование меню по ротации')
+        response = self.client.post(url, data | {'apply': '1', 'date_from': '2026-03-02', 'date_to': '2026-03-31',
+                                                 'holidays': '2026-03-09', 'conflicts': 'skip'})
+
+        self.assertRedirects(response, url)
+        self.assertEqual(DailyMenu.objects.filter(date__month=3).count(), 9)  # 5 понедельников и 5 вторников без 9-го
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('plan_menus', '--from', '2026-01-05', '--to', '2026-01-16', '--rotation-start', '2025-12-03',
+                     '--rotation-weeks', '2', '--dry-run', stdout=out)
+
+        self.assertIn('Создано 3', out.getvalue())
+        self.assertEqual(DailyMenu.objects.count(), 3)
+
+
+class LiveEventsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.dishes = [
+            Dish.objects.create(short_name='Каша', name='Каша овсяная'),
+            Dish.objects.create(short_name='Омлет', name='Омлет с сыром'),
+        ]
+        cls.class_obj = create_class_with_choices('5А', 2, cls.dishes, week_start=current_week_start())
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_publisher_fans_out_from_other_threads(self):
+        with publisher.subscribe() as first, publisher.subscribe() as second:
+            thread = threading.Thread(target=publisher.publish, args=({'n': 1},))
+            thread.start()
+            thread.join()
+
+            self.assertEqual(await asyncio.wait_for(first.get(), 1), {'n': 1})
+            self.assertEqual(await asyncio.wait_for(second.get(), 1), {'n': 1})
+        self.assertEqual(publisher.subscriber_count, 0)
+
+    def test_deltas_are_published_after_commit(self):
+        weekly = WeeklyBreakfasts.objects.select_related('pupil').first()
+        with patch.object(publisher, 'publish') as publish, patch.object(Publisher, 'subscriber_count', 1):
+            with self.captureOnCommitCallbacks() as callbacks:
+                weekly.wednesday = self.dishes[1]
+                weekly.save()
+            publish.assert_not_called()
+            for callback in callbacks:
+                callback()
+
+        publish.assert_called_once_with({
+            'week_start': str(current_week_start()), 'class_id': self.class_obj.id,
+            'deltas': [{'day': 'wednesday', 'dish_id': self.dishes[1].id, 'delta': 1}],
+        })
+
+    async def test_stream_sends_snapshot_then_deltas(self):
+        await self.async_client.aforce_login(self.admin)
+        response = await self.async_client.get(reverse('live_events'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+
+        snapshot = (await anext(stream)).decode()
+        self.assertTrue(snapshot.startswith('event: snapshot\n'))
+        monday = json.loads(snapshot.split('data: ', 1)[1])['days'][0]
+        self.assertEqual(monday['classes'][0]['dishes'], {'Каша': 1, 'Омлет': 1})
+
+        publish_choice_deltas(current_week_start() - timedelta(weeks=1), self.class_obj.id, {('monday', 1): 1})
+        publish_choice_deltas(current_week_start(), self.class_obj.id, {('monday', self.dishes[0].id): -1})
+        delta = (await asyncio.wait_for(anext(stream), 1)).decode()
+        self.assertIn('"delta": -1', delta)
+        await stream.aclose()
+
+    def test_stream_requires_asgi(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('live_events'))
+        self.assertEqual(response.status_code, 501)
+
+    def test_dashboard_page(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('admin:pupils_weeklybreakfasts_live'))
+
+        self.assertContains(response, reverse('live_events'))
+        self.assertEqual(response.context['class_names'], {self.class_obj.id: '5А'})
+
+    async def test_stream_is_staff_only(self):
+        response = await self.async_client.get(reverse('live_events'))
+        self.assertEqual(response.status_code, 302)
+
+
+class PoolPageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.porridge = Dish.objects.create(short_name='Каша', name='Каша овсяная')
+        cls.omelette = Dish.objects.create(short_name='Омлет', name='Омлет с сыром')
+        cls.class_obj = Class.objects.create(name='5А')
+
+    def setUp(self):
+        cache.clear()
+
+    def create_menus(self):
+        monday = current_week_start() + timedelta(days=7)
+        for i in range(-7, 5):
+            DailyMenu.objects.create(date=monday + timedelta(days=i), option_1=self.porridge,
+                                     option_2=self.omelette)
+
+    def test_menus_and_classes_are_loaded_once(self):
+        self.create_menus()
+
+        with self.assertNumQueries(2):
+            response = self.client.get('/pool/')
+        with self.assertNumQueries(0):
+            self.client.get('/pool/')
+
+        self.assertContains(response, 'Каша овсяная')
+        self.assertContains(response, '5А')
+        self.assertTrue(all(day['has_menu'] for day in response.context['week_data']))
+
+    def test_menu_change_invalidates_cache(self):
+        self.client.get('/pool/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_menus()
+
+        response = self.client.get('/pool/')
+
+        self.assertContains(response, 'Омлет с сыром')
+
+
+# На SQLite параллельные записи падают с «database is locked», а SELECT ... FOR UPDATE
+# не поддерживается, поэтому проверка имеет смысл только на PostgreSQL
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentPoolSubmissionTests(TransactionTestCase):
+    def test_parallel_submissions_for_same_pupil(self):
+        porridge = Dish.objects.create(short_name='Каша', name='Каша овсяная')
+        omelette = Dish.objects.create(short_name='Омлет', name='Омлет с сыром')
+        class_obj = Class.objects.create(name='5А')
+        Pupil.objects.create(first_name='Анна', last_name='Иванова', class_group=class_obj)
+        DailyMenu.objects.create(date=WEEK_START, option_1=porridge, option_2=omelette)
+
+        barrier = threading.Barrier(8)
+        results = []
+
+        def submit(dish):
+            try:
+                barrier.wait()
+                # pooling перехватывает ошибки и показывает их сообщением, поэтому проверяем сообщения
+                response = self.client_class().post('/pool/', {
+                    'first_name': 'Анна', 'last_name': 'Иванова', 'class_name': class_obj.id,
+                    f'breakfast_{WEEK_START}': dish.id,
+                }, follow=True)
+                results.append((response.redirect_chain, [str(message) for message in response.context['messages']]))
+            except Exception as e:
+                results.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=submit, args=([porridge, omelette][i % 2],)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [([('/pool/', 302)], ['Сохранены выборы для Анна!'])] * 8)
+        breakfast = WeeklyBreakfasts.objects.get()
+        self.assertIn(breakfast.monday_id, {porridge.id, omelette.id})
+        self.assertEqual(
+            list(WeeklyDishCounter.objects.filter(count__gt=0).values_list('weekday', 'dish_id', 'count')),
+            [('monday', breakfast.monday_id, 1)]
+        )
+
+
+class WeeklyBreakfastChangelistTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.dishes = [
+            Dish.objects.create(short_name='Каша', name='Каша овсяная'),
+            Dish.objects.create(short_name='Омлет', name='Омлет с сыром'),
+        ]
+
+    def test_changelist_query_count_does_not_grow_with_rows(self):
+        self.client.force_login(self.admin)
+        url = reverse('admin:pupils_weeklybreakfasts_changelist')
+        create_class_with_choices('1А', 2, self.dishes)
+
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+        for i in range(5):
+            create_class_with_choices(f'{i + 2}А', 10, self.dishes)
+        with self.assertNumQueries(len(small.captured_queries)):
+            response = self.client.get(url)
+
+        self.assertContains(response, '4/5')
+
+    def test_sort_by_choices_count(self):
+        self.client.force_login(self.admin)
+        create_class_with_choices('1А', 1, self.dishes)
+        pupil = Pupil.objects.create(first_name='Анна', last_name='Иванова', class_group=Class.objects.get())
+        WeeklyBreakfasts.objects.create(pupil=pupil, week_start_date=WEEK_START, monday=self.dishes[0])
+
+        list_display = WeeklyBreakfastAdmin.list_display
+        response = self.client.get(reverse('admin:pupils_weeklybreakfasts_changelist'),
+                                   {'o': str(list_display.index('choices_count') + 1)})
+
+        self.assertEqual([obj.choices_total for obj in response.context['cl'].result_list], [1, 4])
+
+    def test_changing_week_in_admin_moves_daily_choices(self):
+        self.client.force_login(self.admin)
+        pupil = Pupil.objects.create(first_name='Анна', last_name='Иванова', class_group=Class.objects.create(name='1А'))
+        breakfast = save_weekly_choices(pupil, WEEK_START, {'monday': self.dishes[0].id})
+        next_week = WEEK_START + timedelta(days=7)
+
+        response = self.client.post(reverse('admin:pupils_weeklybreakfasts_change', args=[breakfast.pk]), {
+            'pupil': pupil.pk, 'monday': self.dishes[0].pk, 'tuesday': '', 'wednesday': '', 'thursday': '',
+            'friday': '', 'week_start_date': str(next_week),
+        })
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(list(BreakfastChoice.objects.values_list('date', flat=True)), [next_week])
+        for week_start in (WEEK_START, next_week):
+            counters = WeeklyDishCounter.objects.filter(week_start_date=week_start, count__gt=0)
+            self.assertEqual({(counter.class_group_id, counter.weekday, counter.dish_id): counter.count
+                              for counter in counters}, compute_weekly_counts(week_start))
+        self.assertEqual(compute_weekly_counts(WEEK_START), {})
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        group = Class.objects.create(name='1А')
+        for first_name in ('Анна', 'Борис', 'Вера'):
+            Pupil.objects.create(first_name=first_name, last_name='Иванова', class_group=group)
+
+    def paginator_count(self, queryset, vendor='postgresql', reltuples=None):
+        """Число строк при подменённом соединении с заданной оценкой из pg_class"""
+        fake = MagicMock(vendor=vendor)
+        cursor = fake.cursor.return_value.__enter__.return_value
+        cursor.fetchone.return_value = None if reltuples is None else (reltuples,)
+        with patch('pupils.paginators.connections', {queryset.db: fake}):
+            count = EstimatedCountPaginator(queryset, 25).count
+        return count, cursor
+
+    def test_large_unfiltered_table_uses_estimate(self):
+        with self.assertNumQueries(0):
+            count, cursor = self.paginator_count(Pupil.objects.order_by('pk'), reltuples=ESTIMATE_THRESHOLD * 5.0)
+
+        self.assertEqual(count, ESTIMATE_THRESHOLD * 5)
+        cursor.execute.assert_called_once_with('SELECT reltuples FROM pg_class WHERE relname = %s',
+                                               [Pupil._meta.db_table])
+
+    def test_small_or_unknown_estimate_falls_back_to_exact_count(self):
+        for reltuples in (ESTIMATE_THRESHOLD - 1.0, -1.0, None):
+            with self.subTest(reltuples=reltuples), self.assertNumQueries(1):
+                count, cursor = self.paginator_count(Pupil.objects.order_by('pk'), reltuples=reltuples)
+                self.assertEqual(count, 3)
+                cursor.execute.assert_called_once()
+
+    def test_filtered_queryset_uses_exact_count(self):
+        with self.assertNumQueries(1):
+            count, cursor = self.paginator_count(Pupil.objects.filter(first_name='Борис').order_by('pk'),
+                                                 reltuples=ESTIMATE_THRESHOLD * 5.0)
+
+        self.assertEqual(count, 1)
+        cursor.execute.assert_not_called()
+
+    def test_other_databases_use_exact_count(self):
+        with self.assertNumQueries(1):
+            count, cursor = self.paginator_count(Pupil.objects.order_by('pk'), vendor='sqlite',
+                                                 reltuples=ESTIMATE_THRESHOLD * 5.0)
+
+        self.assertEqual(count, 3)
+        cursor.execute.assert_not_called()
+
+
+class SeedSchoolTests(TestCase):
+    def test_seed_school(self):
+        result = seed_school(classes=3, pupils_per_class=4, weeks=2, choice_rate=1, start=WEEK_START, seed=1)
+
+        self.assertEqual(result['pupils'], 12)
+        self.assertEqual(result['choices'], 12 * 5 * 2)
+        self.assertEqual(DailyMenu.objects.count(), 10)
+        stats = get_weekly_statistics(WEEK_START)
+        self.assertTrue(all(day['chosen'] == 4 for class_stat in stats['classes_stats']
+                            for day in class_stat['day_stats'].values()))
+
+
+@modify_settings(MIDDLEWARE={'prepend': 'pupils.middleware.RequestMetricsMiddleware'})
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        cache.clear()
+
+    def test_server_timing_and_histograms(self):
+        Class.objects.create(name='5А')
+
+        response = self.client.get('/pool/')
+
+        self.assertRegex(response['Server-Timing'], r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="2 queries"$')
+        stats = registry.snapshot()['pool']
+        self.assertEqual((stats['count'], stats['queries_sum']), (1, 2))
+
+    def test_metrics_endpoint_is_staff_only(self):
+        self.client.get('/pool/')
+        self.assertEqual(self.client.get('/metrics/').status_code, 302)
+
+        staff = get_user_model().objects.create_user('staff', password='password', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get('/metrics/')
+
+        self.assertContains(response, 'pupils_request_duration_seconds_bucket{view="pool",le="+Inf"} 1')
+        self.assertContains(response, 'pupils_request_sql_queries_total{view="pool"} 2')
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0.001)
+    def test_slow_queries_are_logged(self):
+        with self.assertLogs('pupils.sql', level='WARNING') as logs:
+            self.client.get('/pool/')
+        self.assertEqual(len(logs.output), 2)
+        self.assertTrue(any('FROM "pupils_dailymenu"' in line for line in logs.output))
+
+
+@modify_settings(MIDDLEWARE={'append': 'pupils.middleware.ProfilingMiddleware'})
+class ProfilingMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        Class.objects.create(name='5А')
+
+    def setUp(self):
+        cache.clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+
+    def test_staff_query_param_captures_profile(self):
+        self.client.get('/pool/', {'_profile': '1'})
+        self.assertFalse(RequestProfile.objects.exists())
+
+        cache.clear()
+        self.client.force_login(self.admin)
+        response = self.client.get('/pool/', {'_profile': '1'})
+
+        profile = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual((profile.view_name, profile.trigger, profile.user), ('pool', RequestProfile.PARAM, self.admin))
+        self.assertEqual(profile.sql_count, len(profile.queries))
+        self.assertTrue(any('pupils_dailymenu' in query['sql'] for query in profile.queries))
+        self.assertTrue(any('pooling' in row['function'] for row in profile.top_functions))
+
+        response = self.client.get(reverse('admin:pupils_requestprofile_change', args=[profile.pk]))
+        self.assertContains(response, 'pupils_dailymenu')
+        response = self.client.get(reverse('admin:pupils_requestprofile_download', args=[profile.pk]))
+        self.assertIn('pooling', str(marshal.loads(b''.join(response.streaming_content))))
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_failed_save_keeps_response(self):
+        with patch('pupils.middleware.save_profile', side_effect=OSError('диск переполнен')), \
+                self.assertLogs('pupils.middleware', 'ERROR'):
+            response = self.client.get('/pool/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+
+    def test_signed_header_and_sampling(self):
+        self.client.get('/pool/', HTTP_X_PROFILE_TOKEN='profile:forged')
+        self.assertFalse(RequestProfile.objects.exists())
+
+        self.client.get('/pool/', HTTP_X_PROFILE_TOKEN=make_profiling_token())
+        with override_settings(PROFILING_SAMPLE_RATE=1):
+            self.client.get('/')
+
+        self.assertEqual(list(RequestProfile.objects.order_by('id').values_list('view_name', 'trigger')),
+                         [('pool', RequestProfile.HEADER), ('index', RequestProfile.SAMPLE)])
+
+
+    @override_settings(PROFILING_SAMPLE_RATE=1, PROFILING_MAX_PROFILES=2)
+    def test_old_profiles_are_pruned(self):
+        first = RequestProfile.objects.get(pk=self.client.get('/')['X-Profile-Id'])
+        profile_ids = [int(self.client.get('/')['X-Profile-Id']) for _ in range(2)]
+
+        self.assertEqual(list(RequestProfile.objects.order_by('id').values_list('id', flat=True)), profile_ids)
+        self.assertFalse(first.stats_file.storage.exists(first.stats_file.name))
+
+
+class SharedCacheCheckTests(TestCase):
+    def test_locmem_with_several_workers_is_an_error(self):
+        self.assertEqual(check_shared_cache(None), [])
+        with override_settings(WEB_CONCURRENCY=4):
+            self.assertEqual([error.id for error in check_shared_cache(None)], ['pupils.E001'])
+        with override_settings(WEB_CONCURRENCY=4, CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tempfile.gettempdir(),
+        }}):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+class KitchenTotalsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.dishes = [
+            Dish.objects.create(short_name='Каша', name='Каша овсяная'),
+            Dish.objects.create(short_name='Омлет', name='Омлет с сыром'),
+        ]
+        create_class_with_choices('5А', 3, cls.dishes)
+        create_class_with_choices('6Б', 2, cls.dishes)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_totals(self):
+        data = self.client.get(reverse('kitchen_totals'), {'week': '2025-12-03'}).json()
+
+        self.assertEqual(data['week_start'], '2025-12-01')
+        monday = data['days'][0]
+        self.assertEqual((monday['day'], monday['date'], monday['total']), ('monday', '2025-12-01', 5))
+        self.assertEqual([(dish['short_name'], dish['total']) for dish in monday['dishes']],
+                         [('Каша', 3), ('Омлет', 2)])
+        self.assertEqual(data['days'][2]['total'], 0)
+        self.assertNotIn('classes', monday)
+
+    def test_per_class(self):
+        data = self.client.get(reverse('kitchen_totals'), {'week': str(WEEK_START), 'per_class': '1'}).json()
+
+        self.assertEqual(data['days'][0]['classes'], [
+            {'id': Class.objects.get(name='5А').id, 'name': '5А', 'total': 3, 'dishes': {'Каша': 2, 'Омлет': 1}},
+            {'id': Class.objects.get(name='6Б').id, 'name': '6Б', 'total': 2, 'dishes': {'Каша': 1, 'Омлет': 1}},
+        ])
+
+    def test_not_modified_until_data_changes(self):
+        url = reverse('kitchen_totals')
+        response = self.client.get(url, {'week': str(WEEK_START)})
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'week': str(WEEK_START)}, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_class_with_choices('7В', 1, self.dishes)
+        response = self.client.get(url, {'week': str(WEEK_START)}, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['days'][0]['total'], 6)
+
+    def test_invalid_week(self):
+        self.assertEqual(self.client.get(reverse('kitchen_totals'), {'week': 'завтра'}).status_code, 400)
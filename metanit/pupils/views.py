@@ -1,12 +1,28 @@
-from django.db.models import Count
+import asyncio
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect
-from datetime import datetime, timedelta
-from django.http import HttpRequest, JsonResponse
-from django.shortcuts import render
+from datetime import date, datetime, timedelta, timezone
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIRequest
+from django.http import (FileResponse, Http404, HttpRequest, HttpResponse, HttpResponseBadRequest, JsonResponse,
+                         StreamingHttpResponse)
+from django.conf import settings
 from django.contrib import messages
+from django.views.decorators.http import condition, require_GET
 
-from .models import Class, Pupil, Dish, DailyMenu, WeeklyBreakfasts
-from django.contrib.auth.decorators import login_required
+from .cache import (cached_pool_context, cached_kitchen_totals, cached_pupil_names, cached_snapshot,
+                    get_data_changed_at, get_data_version)
+from .choices import save_submission
+from .excel import XLSX_CONTENT_TYPE
+from .exports import request_export
+from .live import publisher, sse_message
+from .metrics import registry, render_write_behind
+from .models import normalize_name
+from .snapshots import (IMMUTABLE_CACHE_CONTROL, STATISTICS_SUFFIX, WORKBOOK_SUFFIX, dump_statistics,
+                        snapshot_name, snapshot_week, statistics_document)
+from .writebehind import enqueue_submission, queue_stats
+from django.contrib.admin.views.decorators import staff_member_required
 
 
 def pooling(request: HttpRequest):
@@ -16,52 +32,10 @@ def pooling(request: HttpRequest):
             last_name = request.POST.get('last_name')
             class_id = request.POST.get('class_name')
 
-            pupil, created = Pupil.objects.get_or_create(
-                first_name=first_name,
-                last_name=last_name,
-                class_group_id=class_id
-            )
-
-            week_start_date = datetime.now() - timedelta(days=datetime.now().weekday())
-
-            weekly_breakfast, created = WeeklyBreakfasts.objects.get_or_create(
-                pupil=pupil,
-                week_start_date=week_start_date
-            )
-
-            for key, value in request.POST.items():
-                if key.startswith('breakfast_'):
-                    date_str = key.replace('breakfast_', '')
-                    date = datetime.strptime(date_str, '%Y-%m-%d').date()
-
-                    weekday = date.weekday()
-
-                    if value and value != "none" and value != "":
-                        dish = Dish.objects.get(id=value)
-                        if weekday == 0:  # Понедельник
-                            weekly_breakfast.monday = dish
-                        elif weekday == 1:  # Вторник
-                            weekly_breakfast.tuesday = dish
-                        elif weekday == 2:  # Среда
-                            weekly_breakfast.wednesday = dish
-                        elif weekday == 3:  # Четверг
-                            weekly_breakfast.thursday = dish
-                        elif weekday == 4:  # Пятница
-                            weekly_breakfast.friday = dish
-                    else:
-                        # Сбрасываем выбор если "ничего"
-                        if weekday == 0:
-                            weekly_breakfast.monday = None
-                        elif weekday == 1:
-                            weekly_breakfast.tuesday = None
-                        elif weekday == 2:
-                            weekly_breakfast.wednesday = None
-                        elif weekday == 3:
-                            weekly_breakfast.thursday = None
-                        elif weekday == 4:
-                            weekly_breakfast.friday = None
-
-            weekly_breakfast.save()
+            if settings.POOL_WRITE_BEHIND:
+                enqueue_submission(first_name, last_name, class_id, request.POST)
+            else:
+                save_submission(first_name, last_name, class_id, request.POST)
 
             messages.success(request, f'Сохранены выборы для {first_name}!')
             return redirect('/pool/')
@@ -71,9 +45,6 @@ def pooling(request: HttpRequest):
             return redirect('/pool/')
 
     else:
-        dishes = Dish.objects.all().order_by('name')
-        classes = Class.objects.all().order_by('name')
-
         today = datetime.now().date()
         current_weekday = today.weekday()
         if current_weekday >= 4:
@@ -83,25 +54,21 @@ def pooling(request: HttpRequest):
         else:
             week_dates = [today + timedelta(days=i - current_weekday) for i in range(current_weekday + 1, 5)]
 
+        pool_context = cached_pool_context(week_dates)
+        menus = pool_context['menus']
+
         week_data = []
         for date in week_dates:
-            try:
-                menu = DailyMenu.objects.get(date=date)
-                week_data.append({
-                    'date': date,
-                    'menu': menu,
-                    'has_menu': True
-                })
-            except DailyMenu.DoesNotExist:
-                week_data.append({
-                    'date': date,
-                    'menu': None,
-                    'has_menu': False
-                })
+            menu = menus.get(date)
+            week_data.append({
+                'date': date,
+                'menu': menu,
+                'has_menu': menu is not None
+            })
 
         context = {
             'today': today,
-            'classes': classes,
+            'classes': pool_context['classes'],
             'week_data': week_data,
             'week_dates': week_dates
         }
@@ -111,3 +78,207 @@ def pooling(request: HttpRequest):
 
 def index(request: HttpRequest):
     return render(request, 'index.html')
+
+
+@staff_member_required
+def metrics(request: HttpRequest):
+    """Гистограммы RequestMetricsMiddleware и очередь отложенной записи в формате Prometheus"""
+    body = registry.render_prometheus() + render_write_behind(queue_stats())
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _kitchen_params(request):
+    """Неделя (понедельник) и флаг разбивки по классам из параметров запроса"""
+    try:
+        day = date.fromisoformat(request.GET['week']) if 'week' in request.GET else datetime.now().date()
+    except ValueError:
+        return None, False
+    return day - timedelta(days=day.weekday()), request.GET.get('per_class') in ('1', 'true')
+
+
+def _kitchen_etag(request, *args, **kwargs):
+    week_start, per_class = _kitchen_params(request)
+    if week_start is None:
+        return None
+    return f'kitchen-{week_start}-{int(per_class)}-v{get_data_version()}'
+
+
+def _kitchen_last_modified(request, *args, **kwargs):
+    if _kitchen_params(request)[0] is None:
+        return None
+    return datetime.fromtimestamp(get_data_changed_at(), tz=timezone.utc)
+
+
+@require_GET
+@condition(etag_func=_kitchen_etag, last_modified_func=_kitchen_last_modified)
+def kitchen_totals(request: HttpRequest):
+    """Порции по дням и блюдам на неделю для кухни.
+
+    ETag и Last-Modified считаются по версии данных без запросов к БД,
+    поэтому опрашивающие экраны получают 304, пока никто не сохранил выбор.
+    """
+    week_start, per_class = _kitchen_params(request)
+    if week_start is None:
+        return HttpResponseBadRequest('Неверная дата недели, ожидается ГГГГ-ММ-ДД')
+
+    response = JsonResponse({
+        'week_start': week_start,
+        'week_end': week_start + timedelta(days=4),
+        'days': cached_kitchen_totals(week_start, per_class=per_class),
+    }, json_dumps_params={'ensure_ascii': False})
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _week_start(week):
+    try:
+        day = date.fromisoformat(week)
+    except ValueError:
+        return None
+    return day - timedelta(days=day.weekday())
+
+
+def _week_statistics_etag(request, week):
+    week_start = _week_start(week)
+    if week_start is None:
+        return None
+    snapshot = cached_snapshot(week_start)
+    if snapshot:
+        return snapshot[0]
+    return f'statistics-{week_start}-v{get_data_version()}'
+
+
+def _week_workbook_etag(request, week):
+    week_start = _week_start(week)
+    snapshot = cached_snapshot(week_start) if week_start else None
+    return snapshot[1] if snapshot else None
+
+
+@staff_member_required
+@require_GET
+@condition(etag_func=_week_statistics_etag)
+def week_statistics(request: HttpRequest, week):
+    """Статистика недели в JSON.
+
+    Замороженная неделя перенаправляется на файл снимка по хэшу содержимого,
+    который кэшируется как неизменяемый. Сам адрес недели всегда
+    перепроверяется по ETag: после разморозки он отдаёт уже пересчитанную
+    статистику.
+    """
+    week_start = _week_start(week)
+    if week_start is None:
+        return HttpResponseBadRequest('Неверная дата недели, ожидается ГГГГ-ММ-ДД')
+
+    snapshot = cached_snapshot(week_start)
+    if snapshot:
+        response = redirect('snapshot_file', sha256=snapshot[0], suffix=STATISTICS_SUFFIX)
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    response = HttpResponse(dump_statistics(statistics_document(week_start)), content_type='application/json')
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+@staff_member_required
+@require_GET
+@condition(etag_func=_week_workbook_etag)
+def week_workbook(request: HttpRequest, week):
+    """Книга Excel за неделю: файл снимка по хэшу для замороженной недели, иначе фоновая выгрузка"""
+    week_start = _week_start(week)
+    if week_start is None:
+        return HttpResponseBadRequest('Неверная дата недели, ожидается ГГГГ-ММ-ДД')
+
+    snapshot = cached_snapshot(week_start)
+    if not snapshot:
+        job = request_export(week_start, request.user)
+        return redirect('admin:pupils_exportjob_status', job.pk)
+
+    response = redirect('snapshot_file', sha256=snapshot[1], suffix=WORKBOOK_SUFFIX)
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+@staff_member_required
+@require_GET
+@condition(etag_func=lambda request, sha256, suffix: sha256)
+def snapshot_file(request: HttpRequest, sha256, suffix):
+    """Файл снимка по хэшу содержимого: адрес не меняет содержимое, поэтому ответ неизменяемый"""
+    week_start = snapshot_week(sha256, suffix)
+    if week_start is None:
+        raise Http404('Снимок не найден')
+
+    if suffix == STATISTICS_SUFFIX:
+        response = FileResponse(default_storage.open(snapshot_name(sha256, suffix)), content_type='application/json')
+    else:
+        response = FileResponse(default_storage.open(snapshot_name(sha256, suffix)), as_attachment=True,
+                                filename=f'завтраки_{week_start}.xlsx', content_type=XLSX_CONTENT_TYPE)
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+PUPIL_NAMES_LIMIT = 10
+# По одной букве подходит полкласса, такие запросы не ищем
+PUPIL_NAMES_MIN_QUERY = 2
+
+
+@require_GET
+def pupil_names(request: HttpRequest):
+    """Подсказка имени для формы /pool/: ученики класса, у которых фамилия или имя начинается с q"""
+    class_id = request.GET.get('class', '')
+    if not class_id.isdigit():
+        return HttpResponseBadRequest('Не указан класс')
+
+    query = normalize_name(request.GET.get('q', ''), '').strip()
+    names = []
+    if len(query) < PUPIL_NAMES_MIN_QUERY:
+        return JsonResponse({'pupils': names})
+    for name_key, last_name, first_name in cached_pupil_names(int(class_id)):
+        if name_key.startswith(query) or f' {query}' in f' {name_key}':
+            names.append({'last_name': last_name, 'first_name': first_name})
+            if len(names) == PUPIL_NAMES_LIMIT:
+                break
+
+    response = JsonResponse({'pupils': names}, json_dumps_params={'ensure_ascii': False})
+    response['Cache-Control'] = 'private, max-age=60'
+    return response
+
+
+# Комментарий-пинг раз в столько секунд, чтобы прокси не закрывали молчащее соединение
+LIVE_HEARTBEAT_SECONDS = 15
+
+
+@staff_member_required
+async def live_events(request: HttpRequest):
+    """SSE-поток для живой панели: снимок итогов недели, затем изменения счётчиков по мере отправок.
+
+    Асинхронный view: под ASGI ожидающие клиенты не занимают потоки. События
+    приходят от publisher этого процесса, поэтому /pool/ и поток должен
+    обслуживать один и тот же ASGI-процесс. Под WSGI бесконечный поток
+    вычитывается целиком до отправки и навсегда занимает воркер, поэтому там
+    view сразу отвечает 501 (запуск под ASGI - в metanit/asgi.py).
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse('Живая панель работает только под ASGI-сервером', status=501)
+    week_start, _ = _kitchen_params(request)
+    if week_start is None:
+        return HttpResponseBadRequest('Неверная дата недели, ожидается ГГГГ-ММ-ДД')
+
+    async def stream():
+        # Подписываемся до снимка, чтобы не потерять изменения между ними
+        with publisher.subscribe() as queue:
+            days = await sync_to_async(cached_kitchen_totals)(week_start, per_class=True)
+            yield sse_message({'week_start': week_start, 'days': days}, event='snapshot')
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=LIVE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ': ping\n\n'
+                    continue
+                if event['week_start'] == str(week_start):
+                    yield sse_message(event, event='delta')
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
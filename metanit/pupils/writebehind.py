@@ -0,0 +1,118 @@
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from .choices import ChoiceError, apply_submission, clean_submission
+from .models import Class, PendingSubmission, normalize_name
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_submission(first_name, last_name, class_id, data):
+    """Проверяет отправку формы /pool/ и кладёт её в очередь вместо сохранения.
+
+    Проверка та же, что у save_submission, но вместо поиска ученика и записи
+    выбора - одна вставка в PendingSubmission.
+    """
+    first_name, last_name, week_start, choices = clean_submission(first_name, last_name, data)
+    try:
+        class_exists = Class.objects.filter(pk=class_id).exists()
+    except (TypeError, ValueError):
+        class_exists = False
+    if not class_exists:
+        raise ChoiceError('Выберите класс')
+
+    return PendingSubmission.objects.create(
+        first_name=first_name,
+        last_name=last_name,
+        class_group_id=class_id,
+        week_start_date=week_start,
+        choices=choices,
+    )
+
+
+def coalesce_submissions(submissions):
+    """Схлопывает отправки одного ученика за одну неделю.
+
+    Отправки просматриваются в порядке поступления, поэтому по каждому дню
+    побеждает последняя; имя берётся из последней отправки.
+    """
+    groups = {}
+    for submission in submissions:
+        key = (submission.class_group_id, normalize_name(submission.first_name, submission.last_name),
+               submission.week_start_date)
+        group = groups.setdefault(key, {'choices': {}, 'ids': []})
+        group['ids'].append(submission.id)
+        group['first_name'] = submission.first_name
+        group['last_name'] = submission.last_name
+        group['choices'].update(submission.choices)
+    return [
+        {'class_id': class_id, 'week_start': week_start, **group}
+        for (class_id, name_key, week_start), group in groups.items()
+    ]
+
+
+def drain_submissions(batch_size=None):
+    """Применяет пачку отправок из очереди в одной транзакции.
+
+    Строки очереди удаляются в той же транзакции, в которой применён выбор:
+    если процесс упадёт посередине, пачка откатится целиком и будет
+    прочитана заново.
+
+    Пачки применяются строго по порядку: «последняя запись побеждает» держится
+    только на порядке id. Рассчитан один обработчик; второй, запущенный по
+    ошибке, ждёт блокировки строк (FOR UPDATE без SKIP LOCKED) и не может
+    применить более старую отправку после более новой.
+
+    Группа, которую не удалось применить, остаётся в очереди с ошибкой и
+    больше не читается: повторять её после более новых отправок нельзя.
+    """
+    batch_size = batch_size or settings.WRITE_BEHIND_BATCH_SIZE
+    with transaction.atomic():
+        submissions = list(
+            PendingSubmission.objects.select_for_update().filter(error='').order_by('id')[:batch_size]
+        )
+        if not submissions:
+            return {'submissions': 0, 'applied': 0, 'failed': 0}
+
+        groups = coalesce_submissions(submissions)
+        failed_ids = []
+        failed = 0
+        for group in groups:
+            try:
+                with transaction.atomic():
+                    apply_submission(group['first_name'], group['last_name'], group['class_id'],
+                                     group['week_start'], group['choices'])
+            except Exception as e:
+                # Ошибочная отправка не должна останавливать очередь
+                logger.exception('Не удалось применить отправку из очереди: %r', group)
+                failed += 1
+                failed_ids += group['ids']
+                PendingSubmission.objects.filter(id__in=group['ids']).update(
+                    error=str(e) or e.__class__.__name__, attempts=F('attempts') + 1
+                )
+
+        PendingSubmission.objects.filter(
+            id__in=[submission.id for submission in submissions if submission.id not in failed_ids]
+        ).delete()
+
+    return {'submissions': len(submissions), 'applied': len(groups) - failed, 'failed': failed}
+
+
+def requeue_failed(queryset):
+    """Возвращает отправки с ошибкой в очередь - применятся поверх более новых"""
+    return queryset.exclude(error='').update(error='')
+
+
+def queue_stats():
+    """Глубина очереди, возраст самой старой ожидающей отправки в секундах и число отправок с ошибкой"""
+    stats = PendingSubmission.objects.aggregate(
+        depth=Count('id', filter=Q(error='')),
+        oldest=Min('received_at', filter=Q(error='')),
+        failed=Count('id', filter=~Q(error='')),
+    )
+    lag = (timezone.now() - stats['oldest']).total_seconds() if stats['oldest'] else 0.0
+    return {'depth': stats['depth'], 'lag_seconds': max(lag, 0.0), 'failed': stats['failed']}